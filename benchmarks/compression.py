@@ -0,0 +1,145 @@
+"""
+Wire compression benchmark against a local mongod: the schedules and
+bookings reconciliation of benchmarks.reconciliation runs once per
+compressor (and once without), and the bytes on the wire are read from the
+serverStatus network counters (physical: compressed, logical: uncompressed).
+
+    uv run python -m benchmarks.compression --scale=1
+    uv run python -m benchmarks.compression --uri=mongodb://localhost:27017
+
+The mongod should be idle, its counters include the other connections. zstd
+and snappy are only measured with the pymongo[zstd] and pymongo[snappy]
+extras installed:
+
+    uv run --with "pymongo[zstd,snappy]" python -m benchmarks.compression
+"""
+
+import contextlib
+import io
+import json
+import time
+
+import fire
+from pymongo import MongoClient
+
+import db_sync
+from benchmarks.reconciliation import generate, schedules, setup_db, setup_rooms
+from db_utils import COMPRESSOR_MODULES, RunContext, available_compressors, init
+
+# (name, stage): the stages run in order, the bytes of each are measured
+STAGES = [
+    (
+        "update_schedules",
+        lambda db, data: db_sync.update_schedules(
+            db, schedules(db, data), RunContext(db)
+        ),
+    ),
+    (
+        "create_courses_bookings",
+        lambda db, data: db_sync.create_courses_bookings(
+            db, schedules(db, data), RunContext(db)
+        ),
+    ),
+    (
+        "read_back",
+        lambda db, data: [
+            len(list(db[collection].find()))
+            for collection in ("course_schedules", "course_bookings")
+        ],
+    ),
+]
+
+
+def network_bytes(client):
+    """
+    Output:
+        - counters: physical and logical bytes in and out of the server
+    """
+    network = client.admin.command("serverStatus")["network"]
+    return {
+        "physical_in": network.get("physicalBytesIn", network["bytesIn"]),
+        "physical_out": network.get("physicalBytesOut", network["bytesOut"]),
+        "logical_in": network["bytesIn"],
+        "logical_out": network["bytesOut"],
+    }
+
+
+def run_compressor(uri, compressor, scale, db_name="occupancy_compression"):
+    options = {"compressors": [compressor]} if compressor != "none" else {}
+    client = MongoClient(uri, **options)
+    # Counters read by another client, not compressed
+    monitor = MongoClient(uri)
+
+    client.drop_database(db_name)
+    db = client.get_database(db_name)
+    data = generate(scale)
+    with (
+        contextlib.redirect_stdout(io.StringIO()),
+        contextlib.redirect_stderr(io.StringIO()),
+    ):
+        init(db)
+        setup_db(db)
+        setup_rooms(db, data)
+        db_sync.sync_courses(db, data["courses"], RunContext(db))
+    schedules(db, data)
+
+    results = {}
+    for name, stage in STAGES:
+        before = network_bytes(monitor)
+        start = time.perf_counter()
+        with (
+            contextlib.redirect_stdout(io.StringIO()),
+            contextlib.redirect_stderr(io.StringIO()),
+        ):
+            stage(db, data)
+        wall = time.perf_counter() - start
+        after = network_bytes(monitor)
+        results[name] = {
+            key: round((after[key] - before[key]) / 1024**2, 2) for key in after
+        } | {"wall_s": round(wall, 3)}
+
+    client.drop_database(db_name)
+    client.close()
+    monitor.close()
+    return results
+
+
+def main(
+    scale: float = 1.0,
+    uri: str = "mongodb://localhost:27017",
+    output: str | None = None,
+) -> None:
+    """
+    Args:
+        scale: multiple of today's volume (see benchmarks.reconciliation)
+        uri: the local mongod to run against
+        output: write the report as JSON to this path
+    """
+    compressors = ["none", *available_compressors(",".join(COMPRESSOR_MODULES))]
+    report = {}
+    for compressor in compressors:
+        print(f"Running {compressor}...")
+        report[compressor] = run_compressor(uri, compressor, scale)
+
+    print(
+        f"{'stage':<26}{'compressor':>11}{'wire in MB':>12}{'wire out MB':>13}"
+        f"{'ratio':>7}{'wall s':>9}"
+    )
+    for compressor, results in report.items():
+        for stage, result in results.items():
+            logical = result["logical_in"] + result["logical_out"]
+            physical = result["physical_in"] + result["physical_out"]
+            ratio = physical / logical if logical else 1.0
+            print(
+                f"{stage:<26}{compressor:>11}{result['physical_in']:>12.2f}"
+                f"{result['physical_out']:>13.2f}{ratio:>7.2f}"
+                f"{result['wall_s']:>9.2f}"
+            )
+
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
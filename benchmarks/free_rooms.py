@@ -0,0 +1,224 @@
+"""
+Free rooms query benchmark against a local mongod: the synthetic semester of
+benchmarks.reconciliation (courses schedules, bookings and events) is
+reconciled in DB, then the same random "rooms free from A to B" queries are
+answered by the in-process FreeRoomsIndex and by the equivalent Mongo
+aggregation ($lookup of the overlapping bookings of each room), and their
+answers are compared.
+
+    uv run python -m benchmarks.free_rooms --scale=1 --queries=200
+    uv run python -m benchmarks.free_rooms --uri=mongodb://localhost:27017
+
+The aggregation uses the $lookup localField with a pipeline (MongoDB 5.0+).
+"""
+
+import contextlib
+import io
+import json
+import random
+import statistics
+import time
+from datetime import timedelta
+
+import fire
+from pymongo import MongoClient
+
+import db_sync
+import ewa
+from benchmarks.reconciliation import (
+    events,
+    generate,
+    schedules,
+    setup_db,
+    setup_rooms,
+)
+from db_utils import RunContext, init
+from free_rooms import FreeRoomsIndex
+
+BUILDINGS = ["BC", "CM", "CE", "INM", "MA"]
+CAPACITIES = [None, 20, 40, 80, 150, 300]
+
+
+def overlapping(start, end):
+    return {
+        "available": True,
+        "start_datetime": {"$lt": end},
+        "end_datetime": {"$gt": start},
+    }
+
+
+def free_rooms_pipeline(start, end, min_capacity=None, building=None):
+    """
+    Output:
+        - pipeline: the aggregation on rooms equivalent to
+        FreeRoomsIndex.find_free_rooms
+    """
+    match = {"available": True}
+    if min_capacity is not None:
+        match["capacity"] = {"$gte": min_capacity}
+    if building is not None:
+        match["building"] = building
+    return [
+        {"$match": match},
+        {
+            "$lookup": {
+                "from": "course_bookings",
+                "localField": "_id",
+                "foreignField": "room_id",
+                "pipeline": [
+                    {"$match": {"available": True}},
+                    {
+                        "$lookup": {
+                            "from": "course_schedules",
+                            "localField": "schedule_id",
+                            "foreignField": "_id",
+                            "pipeline": [
+                                {"$match": overlapping(start, end)},
+                                {"$limit": 1},
+                            ],
+                            "as": "schedules",
+                        }
+                    },
+                    {"$match": {"schedules": {"$ne": []}}},
+                    {"$limit": 1},
+                ],
+                "as": "courses",
+            }
+        },
+        {
+            "$lookup": {
+                "from": "event_bookings",
+                "localField": "_id",
+                "foreignField": "room_id",
+                "pipeline": [{"$match": overlapping(start, end)}, {"$limit": 1}],
+                "as": "events",
+            }
+        },
+        {"$match": {"courses": [], "events": []}},
+        {"$project": {"name": 1}},
+    ]
+
+
+def setup_semester(db, data, rng):
+    """
+    The synthetic rooms (with a capacity and a building), courses, schedules,
+    bookings and events in DB
+    """
+    with (
+        contextlib.redirect_stdout(io.StringIO()),
+        contextlib.redirect_stderr(io.StringIO()),
+    ):
+        init(db)
+        setup_db(db)
+        setup_rooms(db, data)
+        for name in data["rooms"]:
+            capacity = rng.choice(CAPACITIES)
+            db.rooms.update_one(
+                {"name": name},
+                {
+                    "$set": {"building": rng.choice(BUILDINGS)}
+                    | ({"capacity": capacity} if capacity is not None else {})
+                },
+            )
+        ctx = RunContext(db)
+        db_sync.sync_courses(db, data["courses"], ctx)
+        db_sync.update_schedules(db, schedules(db, data), ctx)
+        db_sync.create_courses_bookings(db, schedules(db, data), ctx)
+        ewa.create_event_bookings(db, events(db, data))
+
+
+def random_queries(db, rng, count):
+    """
+    Output:
+        - queries: (start, end, min_capacity, building) in the semester
+    """
+    semester = db.semesters.find_one({"name": "Bench fall"})
+    days = (semester["end_date"] - semester["start_date"]).days
+    queries = []
+    for _ in range(count):
+        start = semester["start_date"] + timedelta(
+            days=rng.randrange(days), hours=rng.randrange(8, 19)
+        )
+        queries.append(
+            (
+                start,
+                start + timedelta(hours=rng.randint(1, 3)),
+                rng.choice([None, 50, 100]),
+                rng.choice([None, *BUILDINGS]),
+            )
+        )
+    return queries
+
+
+def latencies_ms(function, queries):
+    latencies = []
+    answers = []
+    for query in queries:
+        start = time.perf_counter()
+        answers.append(sorted(room["name"] for room in function(*query)))
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "p50_ms": round(statistics.median(latencies), 4),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)], 4),
+    }, answers
+
+
+def main(
+    scale: float = 1.0,
+    queries: int = 200,
+    uri: str = "mongodb://localhost:27017",
+    output: str | None = None,
+    db_name: str = "occupancy_free_rooms",
+) -> None:
+    """
+    Args:
+        scale: multiple of today's volume (see benchmarks.reconciliation)
+        queries: number of random queries
+        uri: the local mongod to run against
+        output: write the report as JSON to this path
+        db_name: the benchmark database, dropped before and after
+    """
+    rng = random.Random(0)
+    client = MongoClient(uri)
+    client.drop_database(db_name)
+    db = client.get_database(db_name)
+
+    print("Setting up the semester...")
+    setup_semester(db, generate(scale), rng)
+    samples = random_queries(db, rng, queries)
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        index = FreeRoomsIndex.load(db)
+    load_s = time.perf_counter() - start
+
+    print("Running the queries...")
+    report = {"load_s": round(load_s, 3), "rooms": len(index.rooms)}
+    report["index"], index_answers = latencies_ms(index.find_free_rooms, samples)
+    report["aggregation"], aggregation_answers = latencies_ms(
+        lambda *query: db.rooms.aggregate(free_rooms_pipeline(*query)), samples
+    )
+    report["mismatches"] = sum(
+        index_answer != aggregation_answer
+        for index_answer, aggregation_answer in zip(
+            index_answers, aggregation_answers, strict=True
+        )
+    )
+    client.drop_database(db_name)
+
+    print(f"Index of {report['rooms']} rooms loaded in {report['load_s']:.2f} s")
+    print(f"{'query':<14}{'p50 ms':>10}{'p99 ms':>10}")
+    for name in ("index", "aggregation"):
+        print(
+            f"{name:<14}{report[name]['p50_ms']:>10.3f}{report[name]['p99_ms']:>10.3f}"
+        )
+    print(f"{report['mismatches']} answers differ out of {queries}")
+
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -0,0 +1,201 @@
+"""
+Microbenchmark of the parsers on the checked-in corpus of edu, EDOC, EWA and
+WFS payloads (benchmarks/corpus), with the edge cases the scraper has to
+handle (BC07-08 rooms mapping, missing course summary, 5b semesters).
+
+Reports the throughput of every parser in pages/s and MB/s, and exits with
+an error when a parser gives an unexpected result on the corpus or when its
+throughput drops below the checked-in floors (parsers_thresholds.json) or by
+more than max_drop against a previous report:
+
+    uv run python -m benchmarks.parsers --output=parsers.json
+    uv run python -m benchmarks.parsers --baseline=parsers.json --max_drop=0.2
+"""
+
+import contextlib
+import io
+import json
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import fire
+
+import edu
+import ewa
+import plan_rooms
+import schedule_parser
+from db_sync import parse_studyplan_semester
+
+CORPUS_DIR = Path(__file__).parent / "corpus"
+THRESHOLDS_PATH = Path(__file__).parent / "parsers_thresholds.json"
+
+EDU_WEEKLY = ["cs-101_weekly.html", "ee-535_5b.html", "ar-201_year.html"]
+EDU_EDOC = ("edoc_ed-501.html", "phys-731_iframe.html")
+
+
+def read(path):
+    return (CORPUS_DIR / path).read_bytes()
+
+
+def parse_rooms(level_text):
+    level = plan_rooms.parse_plan_level(level_text)
+    return [plan_rooms.parse_plan_room(room_xml) for room_xml in level or []]
+
+
+# Parser: (payloads, parse). A payload is the tuple of the fetched contents
+# given to parse.
+def parsers():
+    return {
+        "parse_course": (
+            [(read(f"edu/{path.name}"),) for path in sorted(CORPUS_DIR.glob("edu/*"))],
+            lambda content: edu.parse_course_content(content, ""),
+        ),
+        "parse_schedule": (
+            [(read(f"edu/{name}"),) for name in EDU_WEEKLY],
+            schedule_parser.parse_course_page,
+        ),
+        "parse_schedule_EDOC": (
+            [(read(f"edu/{EDU_EDOC[0]}"), read(f"edoc/{EDU_EDOC[1]}"))],
+            schedule_parser.parse_course_page,
+        ),
+        "parse_events": (
+            [(read(f"ewa/{path.name}"),) for path in sorted(CORPUS_DIR.glob("ewa/*"))],
+            lambda content: ewa.parse_events(SimpleNamespace(text=content.decode())),
+        ),
+        "parse_room": (
+            [(read(f"wfs/{path.name}"),) for path in sorted(CORPUS_DIR.glob("wfs/*"))],
+            parse_rooms,
+        ),
+    }
+
+
+### CHECKS ###
+def check_corpus():
+    """
+    Output:
+        - errors: the unexpected results of the parsers on the edge cases
+    """
+    errors = []
+
+    def expect(condition, message):
+        if not condition:
+            errors.append(message)
+
+    course = edu.parse_course_content(read("edu/cs-101_weekly.html"), "")
+    expect(course["code"] == "CS-101" and course["credits"] == 4, "CS-101 summary")
+    schedule, edoc = schedule_parser.parse_course_page(read("edu/cs-101_weekly.html"))
+    expect(not edoc and len(schedule) == 3, "CS-101 weekly schedule")
+    expect(schedule[0]["rooms"] == ["BC07", "BC08"], "BC07-08 mapped to BC07, BC08")
+
+    expect(
+        edu.parse_course_content(read("edu/missing_summary.html"), "") is None,
+        "missing course summary gives no course",
+    )
+
+    course = edu.parse_course_content(read("edu/ee-535_5b.html"), "")
+    studyplan = course["studyplans"][0]
+    unit_name, _, semester_type = parse_studyplan_semester(
+        studyplan["section"], studyplan["semester"]
+    )
+    expect(
+        unit_name.endswith("Bachelor semestre 5b") and semester_type == "fall",
+        "5b semester unit",
+    )
+    schedule, _ = schedule_parser.parse_course_page(read("edu/ee-535_5b.html"))
+    expect(schedule[1]["rooms"] == [], "slot without room")
+
+    _, edoc = schedule_parser.parse_course_page(
+        read(f"edu/{EDU_EDOC[0]}"), read(f"edoc/{EDU_EDOC[1]}")
+    )
+    expect(edoc, "EDOC page detected")
+
+    events = ewa.parse_events(SimpleNamespace(text=read("ewa/bc01_week.txt").decode()))
+    expect(
+        len(events) > 0 and set(events[0]) == {"Text", "Start", "End"},
+        "EWA events filtered",
+    )
+
+    rooms = parse_rooms(read("wfs/level_0.xml"))
+    expect(rooms[-1]["name"] == "BC07-08", "WFS room name")
+    expect(parse_rooms(read("wfs/level_empty.xml")) == [], "empty WFS level")
+    return errors
+
+
+### MEASURES ###
+def measure(payloads, parse, min_time):
+    """
+    Parse the payloads in a loop for at least min_time seconds
+    Output:
+        - result: pages/s and MB/s
+    """
+    pages = 0
+    size = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_time:
+        for payload in payloads:
+            parse(*payload)
+            pages += 1
+            size += sum(len(content) for content in payload)
+    elapsed = time.perf_counter() - start
+    return {
+        "pages_s": round(pages / elapsed, 1),
+        "mb_s": round(size / elapsed / 1024**2, 3),
+    }
+
+
+def main(
+    min_time: float = 1.0,
+    output: str | None = None,
+    baseline: str | None = None,
+    max_drop: float = 0.25,
+) -> None:
+    """
+    Args:
+        min_time: seconds spent on each parser
+        output: write the report as JSON to this path
+        baseline: a previous JSON report to compare the throughputs with
+        max_drop: the accepted throughput drop against the baseline
+    """
+    failures = []
+    # The parsers print their warnings (missing summary, raw EWA answers)
+    with contextlib.redirect_stdout(io.StringIO()):
+        failures += check_corpus()
+        report = {
+            name: measure(payloads, parse, min_time)
+            for name, (payloads, parse) in parsers().items()
+        }
+
+    thresholds = json.loads(THRESHOLDS_PATH.read_text())
+    previous = {}
+    if baseline is not None:
+        with open(baseline) as f:
+            previous = json.load(f)
+
+    print(f"{'parser':<24}{'pages/s':>10}{'MB/s':>10}")
+    for name, result in report.items():
+        line = f"{name:<24}{result['pages_s']:>10.1f}{result['mb_s']:>10.2f}"
+        floor = thresholds.get(name, {}).get("pages_s")
+        if floor is not None and result["pages_s"] < floor:
+            failures.append(f"{name}: {result['pages_s']} pages/s < {floor}")
+        if name in previous:
+            ratio = result["pages_s"] / previous[name]["pages_s"]
+            line += f"  {ratio:.2f}x"
+            if ratio < 1 - max_drop:
+                failures.append(f"{name}: {ratio:.2f}x of the baseline throughput")
+        print(line)
+
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if failures:
+        print("FAILED:")
+        for failure in failures:
+            print(f"- {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -0,0 +1,410 @@
+"""
+Synthetic-scale benchmark of the DB reconciliation stages: a generator
+creates courses, studyplans, rooms, schedules and event bookings shaped like
+the models.py schema at multiples of today's volume, runs the stages twice
+(first run on an empty DB, then the same input again like the weekly runs)
+and records wall time, DB round trips and peak Python memory per stage.
+
+The round trips of every stage are checked against the budgets of
+reconciliation_budgets.json (a fixed number plus an allowance per thousand
+input items for the batches and cursors): a stage going back to one query
+per document exceeds its budget and the benchmark exits with an error.
+
+    uv run python -m benchmarks.reconciliation --scales=1,10
+    uv run python -m benchmarks.reconciliation --mock --output=report.json
+    uv run python -m benchmarks.reconciliation --baseline=report.json
+
+Runs against a local mongod by default, or in process with mongomock (not a
+dependency of the scraper, install it for --mock). mongomock has no indexes,
+so its upserts scan the collection: only its round trips compare with mongod,
+the wall times and memory do not.
+"""
+
+import contextlib
+import io
+import json
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import fire
+from pymongo import MongoClient
+
+import db_sync
+import ewa
+from config import local_today
+from db_utils import RunContext, init
+from instrumentation import (
+    RoundTripBudgetExceeded,
+    command_listener,
+    current_stage,
+    round_trip_budget,
+)
+from occurrences import OccurrenceStore
+
+BUDGETS_PATH = Path(__file__).parent / "reconciliation_budgets.json"
+
+# Today's volume (1x)
+BASE_VOLUME = {
+    "courses": 2500,
+    "teachers": 1500,
+    "rooms": 600,
+    "events": 2000,
+}
+
+SECTIONS = [
+    "Génie mécanique",
+    "Architecture",
+    "Chimie et génie chimique",
+    "Informatique",
+    "Mathématiques",
+    "Physique",
+    "Génie civil",
+    "Microtechnique",
+]
+SEMESTERS = [
+    "Bachelor semestre 1",
+    "Bachelor semestre 3",
+    "Bachelor semestre 5",
+    "Master semestre 1",
+    "Master semestre 3",
+]
+
+# (name, inputs, stage): the inputs are prepared outside of the measures
+STAGES = [
+    ("sync_courses", lambda db, data: data["courses"], db_sync.sync_courses),
+    ("sync_teachers", lambda db, data: data["courses"], db_sync.sync_teachers),
+    ("create_units", lambda db, data: data["courses"], db_sync.create_units),
+    ("create_studyplans", lambda db, data: data["courses"], db_sync.create_studyplans),
+    ("create_planned_in", lambda db, data: data["courses"], db_sync.create_planned_in),
+    (
+        "update_schedules",
+        lambda db, data: schedules(db, data),
+        db_sync.update_schedules,
+    ),
+    (
+        "create_courses_bookings",
+        lambda db, data: schedules(db, data),
+        db_sync.create_courses_bookings,
+    ),
+    (
+        "create_event_bookings",
+        lambda db, data: events(db, data),
+        lambda db, parsed_events, ctx: ewa.create_event_bookings(db, parsed_events),
+    ),
+]
+
+
+### SYNTHETIC DATA ###
+def generate(scale, seed=0):
+    """
+    Output:
+        - data: the parsed courses, weekly schedules by course code, rooms
+        and events at scale times today's volume
+    """
+    rng = random.Random(seed)
+    volume = {k: int(v * scale) for k, v in BASE_VOLUME.items()}
+    year = local_today().year
+    years = f"{year}-{year + 1}"
+
+    teachers = [
+        (f"Teacher {i}", f"https://people.epfl.ch/bench.{i}")
+        for i in range(volume["teachers"])
+    ]
+    rooms = [f"BENCH {i:05d}" for i in range(volume["rooms"])]
+
+    courses = []
+    weekly = {}
+    for i in range(volume["courses"]):
+        code = f"BENCH-{i:06d}"
+        courses.append(
+            {
+                "name": f"Course {i}",
+                "code": code,
+                "credits": rng.randint(2, 8),
+                "studyplans": [
+                    {
+                        "section": rng.choice(SECTIONS),
+                        "semester": f"{years} {rng.choice(SEMESTERS)}",
+                    }
+                    for _ in range(rng.randint(1, 3))
+                ],
+                "teachers": rng.sample(teachers, rng.randint(1, 3)),
+                "edu_url": f"https://edu.epfl.ch/coursebook/en/bench-{i}",
+                "language": rng.choice(["English", "Français"]),
+            }
+        )
+        weekly[code] = [
+            {
+                "day": rng.randrange(5),
+                "start_hour": rng.randrange(8, 18),
+                "duration": rng.randint(1, 2),
+                "label": rng.choice(["cours", "exercice", "projet"]),
+                "rooms": rng.sample(rooms, rng.randint(1, 2)),
+            }
+            for _ in range(rng.randint(1, 3))
+        ]
+
+    events = [
+        {
+            "room": rng.choice(rooms),
+            "start_datetime": datetime(year, 10, 1, 8)
+            + timedelta(days=rng.randrange(90), hours=rng.randrange(10)),
+            "duration": rng.randint(1, 4),
+            "name": f"Event {i}",
+        }
+        for i in range(volume["events"])
+    ]
+    return {"courses": courses, "weekly": weekly, "rooms": rooms, "events": events}
+
+
+def setup_db(db):
+    """
+    The semesters around today, like create_new_semester in update_courses
+    """
+    today = local_today()
+    for semester_type in ("fall", "spring", "year"):
+        db_sync.create_new_semester(
+            db,
+            name=f"Bench {semester_type}",
+            start_date=today - timedelta(days=30),
+            end_date=today + timedelta(days=70),
+            type=semester_type,
+            available=True,
+            skip_dates=[today + timedelta(days=7)],
+        )
+
+
+def setup_rooms(db, data):
+    # create_rooms needs plan.epfl.ch, the synthetic rooms are inserted
+    if db.rooms.count_documents({"name": {"$in": data["rooms"][:1]}}) == 0:
+        db.rooms.insert_many(
+            [
+                {"name": name, "type": "Salle de cours", "available": True}
+                for name in data["rooms"]
+            ]
+        )
+
+
+def schedules(db, data):
+    """
+    The incoming schedules of the semester, expanded from the weekly ones
+    """
+    if "schedules" not in data:
+        semester = db.semesters.find_one({"name": "Bench fall"})
+        courses_ids = {
+            course["code"]: course["_id"]
+            for course in db.courses.find({"code": {"$regex": "^BENCH-"}})
+        }
+        data["schedules"] = OccurrenceStore.concatenate(
+            OccurrenceStore.from_weekly(weekly, semester, courses_ids[code])
+            for code, weekly in data["weekly"].items()
+        ).to_schedules()
+    return data["schedules"]
+
+
+def events(db, data):
+    if "parsed_events" not in data:
+        rooms_ids = {room["name"]: room["_id"] for room in db.rooms.find()}
+        data["parsed_events"] = [
+            {
+                "room": rooms_ids[event["room"]],
+                "start_datetime": event["start_datetime"],
+                "end_datetime": event["start_datetime"]
+                + timedelta(hours=event["duration"]),
+                "name": event["name"],
+                "label": "event",
+                "available": True,
+            }
+            for event in data["events"]
+        ]
+    return data["parsed_events"]
+
+
+### MEASURES ###
+# Collection methods counted as one round trip each with mongomock
+MOCK_COMMANDS = (
+    "find",
+    "find_one",
+    "insert_one",
+    "insert_many",
+    "update_one",
+    "update_many",
+    "bulk_write",
+    "aggregate",
+    "distinct",
+    "count_documents",
+)
+
+
+def mock_client():
+    import mongomock
+
+    # mongomock calls its own methods, only the outermost call is a command
+    depth = [0]
+
+    def counted(name, method):
+        def wrapper(collection, *args, **kwargs):
+            stage = current_stage()
+            if depth[0] == 0 and stage is not None:
+                stage.db[collection.name]["operations"] += 1
+                stage.commands[name] += 1
+            depth[0] += 1
+            try:
+                return method(collection, *args, **kwargs)
+            finally:
+                depth[0] -= 1
+
+        return wrapper
+
+    for name in MOCK_COMMANDS:
+        method = getattr(mongomock.collection.Collection, name)
+        if not hasattr(method, "__wrapped_by_benchmark__"):
+            wrapper = counted(name, method)
+            wrapper.__wrapped_by_benchmark__ = True
+            setattr(mongomock.collection.Collection, name, wrapper)
+    return mongomock.MongoClient()
+
+
+def round_trips_budget(budgets, name, items):
+    budget = budgets.get(name)
+    if budget is None:
+        return None
+    return int(budget["base"] + budget["per_1000_items"] * items / 1000)
+
+
+def measure(name, stage, db, ctx, inputs, budgets):
+    """
+    Output:
+        - result: wall time, round trips (and their budget) and peak memory
+    """
+    budget = round_trips_budget(budgets, name, len(inputs))
+    tracemalloc.start()
+    start = time.perf_counter()
+    exceeded = False
+    try:
+        with (
+            contextlib.redirect_stdout(io.StringIO()),
+            contextlib.redirect_stderr(io.StringIO()),
+            round_trip_budget(name, budget) as measures,
+        ):
+            stage(db, inputs, ctx)
+    except RoundTripBudgetExceeded:
+        exceeded = True
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "wall_s": round(wall, 3),
+        "round_trips": measures.round_trips,
+        "budget": budget,
+        "exceeded": exceeded,
+        "commands": dict(measures.commands),
+        "peak_mb": round(peak / 1024**2, 1),
+    }
+
+
+def run_scale(client, scale, budgets, db_name="occupancy_benchmark"):
+    client.drop_database(db_name)
+    db = client.get_database(db_name)
+    with (
+        contextlib.redirect_stdout(io.StringIO()),
+        contextlib.redirect_stderr(io.StringIO()),
+    ):
+        init(db)
+        setup_db(db)
+
+    data = generate(scale)
+    setup_rooms(db, data)
+    results = {}
+    for run in ("first", "rerun"):
+        # Each run has its own context, like the cron jobs
+        ctx = RunContext(db)
+        for name, inputs, stage in STAGES:
+            results[f"{name}/{run}"] = measure(
+                name, stage, db, ctx, inputs(db, data), budgets
+            )
+    client.drop_database(db_name)
+    return results
+
+
+def print_report(report, baseline=None):
+    print(
+        f"{'stage':<32}{'scale':>6}{'wall s':>10}{'trips':>9}{'budget':>8}"
+        f"{'peak MB':>9}"
+    )
+    for scale, results in report.items():
+        for stage, result in results.items():
+            budget = "" if result["budget"] is None else result["budget"]
+            line = (
+                f"{stage:<32}{scale:>6}{result['wall_s']:>10.2f}"
+                f"{result['round_trips']:>9}{budget:>8}{result['peak_mb']:>9.1f}"
+            )
+            previous = (baseline or {}).get(scale, {}).get(stage)
+            if previous is not None and previous["wall_s"] > 0:
+                line += f"  {result['wall_s'] / previous['wall_s']:.2f}x"
+                if result["round_trips"] > previous["round_trips"]:
+                    line += (
+                        f" (+{result['round_trips'] - previous['round_trips']} trips)"
+                    )
+            print(line)
+
+
+def main(
+    scales: str = "1,10,100",
+    uri: str = "mongodb://localhost:27017",
+    mock: bool = False,
+    output: str | None = None,
+    baseline: str | None = None,
+) -> None:
+    """
+    Args:
+        scales: comma separated multiples of today's volume
+        uri: the local mongod to run against
+        mock: run in process with mongomock instead of mongod
+        output: write the report as JSON to this path
+        baseline: a previous JSON report to compare the wall times with
+    """
+    client = (
+        mock_client() if mock else MongoClient(uri, event_listeners=[command_listener])
+    )
+    budgets = json.loads(BUDGETS_PATH.read_text())
+
+    # fire parses "1,10" as a tuple
+    if not isinstance(scales, (tuple, list)):
+        scales = str(scales).split(",")
+
+    report = {}
+    for scale in map(str, scales):
+        print(f"Running scale {scale}x...")
+        report[scale] = run_scale(client, float(scale), budgets)
+
+    previous = None
+    if baseline is not None:
+        with open(baseline) as f:
+            previous = json.load(f)
+    print_report(report, previous)
+
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    exceeded = [
+        f"{stage} at {scale}x: {result['round_trips']} round trips > "
+        f"{result['budget']} ({result['commands']})"
+        for scale, results in report.items()
+        for stage, result in results.items()
+        if result["exceeded"]
+    ]
+    if exceeded:
+        print("Round trip budgets exceeded:")
+        for failure in exceeded:
+            print(f"- {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
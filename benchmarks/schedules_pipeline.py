@@ -0,0 +1,241 @@
+"""
+Replay benchmark of the courses schedules scraping: the edu pages of the
+courses are recorded once in a corpus directory, then replayed with a fixed
+latency to compare the two stages pipeline (download threads + parse
+processes) with the previous single process pool, and the peak memory of the
+streaming reconciliation with the one of the batch flow (in a mongomock db).
+
+    uv run python -m benchmarks.schedules_pipeline record corpus/
+    uv run python -m benchmarks.schedules_pipeline replay corpus/ --latency=0.2
+    uv run python -m benchmarks.schedules_pipeline memory corpus/
+"""
+
+import concurrent.futures
+import contextlib
+import hashlib
+import io
+import json
+import multiprocessing
+import time
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+import fire
+from bson import ObjectId
+from dotenv import load_dotenv
+from tqdm import tqdm
+
+import schedule_parser
+from config import STREAM_CHUNK_SIZE
+from schedule_pipeline import schedule_courses
+
+
+def page_path(corpus_dir, url):
+    return Path(corpus_dir) / "pages" / f"{hashlib.sha1(url.encode()).hexdigest()}"
+
+
+def record(corpus_dir: str, limit: int | None = None) -> None:
+    """
+    Record the pages of the courses of the current or next semester
+
+    Args:
+        corpus_dir: directory of the corpus
+        limit: only record the first courses
+    """
+    from db_sync import find_semester_courses, get_run_semester
+    from db_utils import RunContext, init_and_connect
+    from settings import Settings
+
+    load_dotenv()
+    db = init_and_connect(Settings())
+    ctx = RunContext(db)
+
+    semester = get_run_semester(ctx)
+    db_courses_semester, db_courses_year, _ = find_semester_courses(db, ctx)
+    courses = (db_courses_semester + db_courses_year)[:limit]
+
+    (Path(corpus_dir) / "pages").mkdir(parents=True, exist_ok=True)
+    http_get = schedule_parser.http_get
+
+    def record_get(url):
+        response = http_get(url)
+        page_path(corpus_dir, url).write_bytes(
+            response.content if response.status_code != 404 else b""
+        )
+        return response
+
+    schedule_parser.http_get = record_get
+    for course in tqdm(courses, desc="Recording pages"):
+        if course.get("edu_url") is not None:
+            schedule_parser.fetch_course_pages(course["edu_url"])
+
+    corpus = {
+        "semester": {
+            "start_date": semester["start_date"].isoformat(),
+            "end_date": semester["end_date"].isoformat(),
+            "skip_dates": [d.isoformat() for d in semester.get("skip_dates") or []],
+        },
+        "semester_codes": [course.get("code") for course in db_courses_semester],
+        "courses": [
+            {"_id": str(c["_id"]), "code": c.get("code"), "edu_url": c.get("edu_url")}
+            for c in courses
+        ],
+    }
+    (Path(corpus_dir) / "corpus.json").write_text(json.dumps(corpus))
+    print(f"- {len(courses)} courses recorded in {corpus_dir}")
+
+
+def load_corpus(corpus_dir):
+    corpus = json.loads((Path(corpus_dir) / "corpus.json").read_text())
+    semester = corpus["semester"]
+    semester = {
+        "start_date": datetime.fromisoformat(semester["start_date"]),
+        "end_date": datetime.fromisoformat(semester["end_date"]),
+        "skip_dates": [datetime.fromisoformat(d) for d in semester["skip_dates"]],
+    }
+    return corpus["courses"], corpus["semester_codes"], semester
+
+
+def replay_get(corpus_dir, latency):
+    def get(url):
+        time.sleep(latency)
+        path = page_path(corpus_dir, url)
+        content = path.read_bytes() if path.exists() else b""
+        return SimpleNamespace(status_code=200 if content else 404, content=content)
+
+    return get
+
+
+def single_pool_task(args):
+    # Previous layout: download and parse in the same process, with the
+    # context pickled for every course
+    course, semester_codes, semester = args
+    schedule_parser.init_schedule_worker(semester_codes, semester)
+    if course.get("edu_url") is None:
+        return None
+    page, iframe_page = schedule_parser.fetch_course_pages(course["edu_url"])
+    if page is None:
+        return None
+    return schedule_parser.process_course_schedules(
+        course["_id"], course.get("code"), page, iframe_page
+    )
+
+
+def count_occurrences(stores):
+    return sum(len(store) for store in stores if store is not None)
+
+
+def replay(corpus_dir: str, latency: float = 0.2, io_threads: int | None = None):
+    """
+    Replay the corpus through both layouts and print the wall times
+
+    Args:
+        corpus_dir: directory of a recorded corpus
+        latency: seconds added to every request
+        io_threads: download threads of the pipeline (default 4 * cpu count)
+    """
+    courses, semester_codes, semester = load_corpus(corpus_dir)
+    schedule_parser.http_get = replay_get(corpus_dir, latency)
+    print(f"- {len(courses)} courses, {latency}s latency")
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(multiprocessing.cpu_count()) as pool:
+        stores = pool.map(
+            single_pool_task,
+            [(course, semester_codes, semester) for course in courses],
+        )
+    single_pool_time = time.perf_counter() - start
+    print(
+        f"Single pool: {single_pool_time:.1f}s, {count_occurrences(stores)} occurrences"
+    )
+
+    start = time.perf_counter()
+    stores = [
+        store
+        for _, store in schedule_courses(
+            courses, set(semester_codes), semester, io_threads=io_threads
+        )
+    ]
+    pipeline_time = time.perf_counter() - start
+    print(
+        f"Pipeline: {pipeline_time:.1f}s, {count_occurrences(stores)} occurrences "
+        f"({single_pool_time / pipeline_time:.1f}x)"
+    )
+
+
+def flow_peak_rss(corpus_dir, flow, chunk_size):
+    """
+    Scrape and reconcile the corpus in a mongomock db, like update_schedules
+    with --stream (streaming flow) or --no-stream --mode=diff (batch flow)
+    Output:
+        - peak_rss_mb: the peak RSS of the flow above the RSS at its start
+        - schedules: the number of schedules in db
+    """
+    import mongomock
+
+    from db_sync import create_courses_bookings, update_schedules
+    from db_utils import RunContext
+    from instrumentation import RunReport, current_rss_mb
+    from plan_rooms import create_rooms
+    from schedule_pipeline import find_courses_schedules, sync_courses_schedules
+
+    courses, semester_codes, semester = load_corpus(corpus_dir)
+    schedule_parser.http_get = replay_get(corpus_dir, 0)
+    courses = [{**course, "_id": ObjectId(course["_id"])} for course in courses]
+    semester_codes = set(semester_codes)
+
+    db = mongomock.MongoClient().get_database("schedules_pipeline")
+    semester["_id"] = db.semesters.insert_one(
+        {**semester, "name": "Corpus", "type": "fall", "available": True}
+    ).inserted_id
+    ctx = RunContext(db)
+    # The semester and courses of the corpus, no plan.epfl.ch
+    ctx.memo[("semester", None)] = semester
+    ctx.memo["semester_courses"] = (
+        [course for course in courses if course["code"] in semester_codes],
+        [course for course in courses if course["code"] not in semester_codes],
+        [],
+    )
+    ctx.memo["plan_rooms"] = []
+
+    run_report = RunReport(f"memory-{flow}")
+    start_rss = current_rss_mb()
+    with (
+        run_report.stage(flow) as stage,
+        contextlib.redirect_stdout(io.StringIO()),
+    ):
+        if flow == "streaming":
+            sync_courses_schedules(db, ctx, chunk_size=chunk_size)
+        else:
+            schedules = find_courses_schedules(db, ctx)
+            create_rooms(db, schedules, ctx=ctx)
+            update_schedules(db, schedules, ctx)
+            create_courses_bookings(db, schedules=schedules, ctx=ctx)
+    run_report.close()
+    return stage.peak_rss_mb - start_rss, db.course_schedules.count_documents({})
+
+
+def memory(corpus_dir: str, chunk_size: int = STREAM_CHUNK_SIZE) -> None:
+    """
+    Replay the corpus through the batch and the streaming flows, each in a new
+    process, and print their peak RSS
+
+    Args:
+        corpus_dir: directory of a recorded corpus
+        chunk_size: number of courses per chunk of the streaming flow
+    """
+    peaks = {}
+    for flow in ("batch", "streaming"):
+        with concurrent.futures.ProcessPoolExecutor(
+            1, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            peaks[flow], count = executor.submit(
+                flow_peak_rss, corpus_dir, flow, chunk_size
+            ).result()
+        print(f"{flow.capitalize()}: +{peaks[flow]:.0f} MB peak RSS, {count} schedules")
+    print(f"- {peaks['batch'] / max(peaks['streaming'], 1):.1f}x less with streaming")
+
+
+if __name__ == "__main__":
+    fire.Fire({"record": record, "replay": replay, "memory": memory})
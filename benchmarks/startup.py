@@ -0,0 +1,130 @@
+"""
+Startup benchmark of the entry points and of the schedule parse workers,
+from the `python -X importtime` report of their imports: total import time,
+heaviest top-level imports and which heavy dependencies get loaded.
+
+    uv run python -m benchmarks.startup --output=startup.json
+    uv run python -m benchmarks.startup --baseline=startup.json
+
+The parse workers started by spawn or forkserver import the main module
+again, then the module of their initializer (schedule_parser).
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import fire
+
+ROOT_DIR = Path(__file__).parent.parent
+
+# Target: the imports it runs
+TARGETS = {
+    "update_courses": "import update_courses",
+    "update_schedules": "import update_schedules",
+    "update_schedules run": (
+        "import update_schedules, db_sync, db_utils, instrumentation, plan_rooms, "
+        "schedule_pipeline, settings"
+    ),
+    "parse worker": "import update_schedules, schedule_parser",
+    "utils": "import utils",
+}
+
+HEAVY_MODULES = ("numpy", "pyproj", "pymongo", "requests", "bs4", "pydantic")
+
+
+def import_times(statement):
+    """
+    Output:
+        - modules: list of (name, self us, cumulative us, depth) in import
+        order, from the -X importtime report
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+def top_level_imports(modules):
+    """
+    The imports of the statement, without the ones of the interpreter startup
+    (site, encodings, ...)
+    """
+    return [
+        (name, cumulative)
+        for name, _, cumulative, depth in modules
+        if depth == 0 and name.split(".")[0] not in sys.stdlib_module_names
+    ]
+
+
+def measure(statement, repeat):
+    """
+    Output:
+        - result: the fastest of the runs, with its heaviest top-level imports
+        and the heavy dependencies it loaded
+    """
+    runs = [import_times(statement) for _ in range(repeat)]
+    modules = min(runs, key=lambda run: sum(us for _, us in top_level_imports(run)))
+    names = {name.split(".")[0] for name, *_ in modules}
+    top_level = sorted(top_level_imports(modules), key=lambda module: -module[1])
+    return {
+        "total_ms": round(sum(us for _, us in top_level) / 1000, 1),
+        "modules": len(modules),
+        "heaviest": {name: round(us / 1000, 1) for name, us in top_level[:5]},
+        "heavy_loaded": [name for name in HEAVY_MODULES if name in names],
+    }
+
+
+def main(
+    repeat: int = 5, output: str | None = None, baseline: str | None = None
+) -> None:
+    """
+    Args:
+        repeat: runs of each target, the fastest is kept
+        output: write the report as JSON to this path
+        baseline: a previous JSON report to compare the import times with
+    """
+    report = {
+        target: measure(statement, repeat) for target, statement in TARGETS.items()
+    }
+
+    previous = {}
+    if baseline is not None:
+        with open(baseline) as f:
+            previous = json.load(f)
+
+    print(f"{'target':<24}{'import ms':>10}{'modules':>9}  heavy dependencies")
+    for target, result in report.items():
+        line = (
+            f"{target:<24}{result['total_ms']:>10.1f}{result['modules']:>9}  "
+            f"{', '.join(result['heavy_loaded']) or '-'}"
+        )
+        if target in previous:
+            line += f"  {result['total_ms'] / previous[target]['total_ms']:.2f}x"
+        print(line)
+    print()
+    for target, result in report.items():
+        heaviest = ", ".join(
+            f"{name} {ms}ms" for name, ms in result["heaviest"].items()
+        )
+        print(f"{target}: {heaviest}")
+
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
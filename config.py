@@ -1,3 +1,6 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
 ROOMS_FILTER = [
     "POL.N3.E",
     "POL315.1",
@@ -220,3 +223,20 @@ MAP_SEMESTERS_LONG = {
     "Joint EPFL - ETH Zurich Doctoral Program in the Learning Sciences": "year",
     "Cours généraux et externes EDOC": "year",
 }
+
+# Number of courses reconciled at once by sync_courses_schedules
+STREAM_CHUNK_SIZE = 200
+
+# Time zone of the campus, the datetimes in DB are naive local times
+TIMEZONE = ZoneInfo("Europe/Zurich")
+
+
+def local_today():
+    """
+    Output:
+        - today: the current day at midnight in TIMEZONE, naive like the
+        datetimes in DB
+    """
+    return datetime.now(TIMEZONE).replace(
+        hour=0, minute=0, second=0, microsecond=0, tzinfo=None
+    )
@@ -0,0 +1,1211 @@
+import collections
+import functools
+import re
+from datetime import timedelta
+
+from bson import ObjectId
+from tqdm import tqdm
+
+from config import (
+    MAP_PROMOS_LONG,
+    MAP_SECTIONS,
+    MAP_SEMESTERS_LONG,
+    local_today,
+)
+from db_utils import (
+    BULK_CHUNK_SIZE,
+    BulkWriter,
+    RunContext,
+    chunks,
+    rebuild_collections,
+)
+
+### SYNC COURSES ###
+COURSE_FIELDS = ("name", "credits", "edu_url", "language")
+
+
+def sync_courses(db, courses, ctx=None):
+    """
+    Create the new courses in the db and update the fields that changed on
+    the existing ones
+    Input:
+        - courses: a list of parsed courses
+        - ctx: the RunContext of the run (optional)
+    Output:
+        - None
+    """
+    if ctx is None:
+        ctx = RunContext(db)
+
+    print("Getting courses from DB...")
+    db_courses = ctx.index("courses", "code")
+    print(f"- {len(db_courses)} courses found in DB")
+
+    print("Filtering courses...")
+    created = 0
+    for course in courses:
+        code = course.get("code")
+        db_course = db_courses.get(code)
+
+        if db_course is None:
+            new_course = {
+                "code": code,
+                "name": course.get("name"),
+                "credits": course.get("credits"),
+                "edu_url": course.get("edu_url"),
+                "available": True,
+            }
+            if course.get("language") is not None:
+                new_course["language"] = course.get("language")
+            ctx.upsert("courses", new_course)
+            created += 1
+            continue
+
+        # Only the fields that were parsed and differ from the db
+        changes = {
+            field: course.get(field)
+            for field in COURSE_FIELDS
+            if course.get(field) is not None
+            and course.get(field) != db_course.get(field)
+        }
+        if changes:
+            ctx.update("courses", db_course, changes)
+
+    pending = ctx.writer.pending("courses")
+    print(f"- {created} new courses, {pending - created} changed courses")
+    if pending == 0:
+        print("- No courses to create or update")
+        return
+
+    print("Syncing courses...")
+    counts = ctx.flush("courses")
+    print(
+        f"- {counts['inserted']} courses created, {counts['modified']} courses "
+        f"updated ({counts['failed']} failed)"
+    )
+
+    return
+
+
+### SYNC TEACHERS ###
+def sync_teachers(db, courses, ctx=None):
+    """
+    Create the missing teachers in the db and assign the teachers to the
+    courses, only writing the courses whose teachers changed
+    Input:
+        - courses: a list of parsed courses
+        - ctx: the RunContext of the run (optional)
+    Output:
+        - None
+    """
+    if ctx is None:
+        ctx = RunContext(db)
+
+    print("Getting teachers from DB...")
+    db_teachers = ctx.find("teachers", available=True)
+    print(f"- {len(db_teachers)} teachers found")
+
+    # Teachers without people page are only matched by name
+    teachers_by_url = {
+        teacher["people_url"]: teacher
+        for teacher in db_teachers
+        if teacher.get("people_url")
+    }
+    teachers_by_name = {teacher.get("name"): teacher for teacher in db_teachers}
+
+    def find_teacher(teacher_name, teacher_url):
+        teacher = teachers_by_url.get(teacher_url) if teacher_url else None
+        if teacher is None:
+            teacher = teachers_by_name.get(teacher_name)
+        return teacher
+
+    print("Filtering teachers...")
+    new_teachers = {}
+    for course in courses:
+        for teacher_name, teacher_url in course.get("teachers"):
+            teacher = find_teacher(teacher_name, teacher_url)
+            if teacher is None:
+                new_teachers.setdefault(
+                    teacher_name,
+                    {
+                        "name": teacher_name,
+                        "people_url": teacher_url,
+                        "available": True,
+                    },
+                )
+            elif teacher_url and teachers_by_url.get(teacher_url) is not teacher:
+                # Matched by name, the people page changed
+                ctx.update("teachers", teacher, {"people_url": teacher_url})
+                teachers_by_url[teacher_url] = teacher
+
+    print(f"- {len(new_teachers)} new teachers")
+    for new_teacher in new_teachers.values():
+        # The people page is also set on an unavailable teacher of the same name
+        ctx.upsert(
+            "teachers",
+            new_teacher,
+            set_fields=("people_url",) if new_teacher["people_url"] else (),
+        )
+    counts = ctx.flush("teachers")
+    print(
+        f"- {counts['inserted']} teachers created, {counts['modified']} updated "
+        f"({counts['failed']} failed)"
+    )
+
+    # The created teachers got their _id on flush, the ones matching an
+    # unavailable teacher are looked up
+    missing_names = [
+        name for name, teacher in new_teachers.items() if "_id" not in teacher
+    ]
+    if missing_names:
+        for teacher in db.teachers.find({"name": {"$in": missing_names}}, {"name": 1}):
+            new_teachers[teacher["name"]]["_id"] = teacher["_id"]
+    for teacher in new_teachers.values():
+        if "_id" not in teacher:
+            continue
+        if teacher.get("people_url"):
+            teachers_by_url[teacher["people_url"]] = teacher
+        teachers_by_name[teacher.get("name")] = teacher
+
+    db_courses = ctx.index("courses", "code", available=True)
+
+    print("Assigning teachers to courses...")
+    for course in courses:
+        db_course = db_courses.get(course.get("code"))
+        if db_course is None:
+            continue
+
+        course_teachers_ids = []
+        for teacher_name, teacher_url in course.get("teachers"):
+            teacher = find_teacher(teacher_name, teacher_url)
+            if teacher is not None and teacher["_id"] not in course_teachers_ids:
+                course_teachers_ids.append(teacher["_id"])
+
+        if db_course.get("teachers") == course_teachers_ids:
+            continue
+
+        ctx.update("courses", db_course, {"teachers": course_teachers_ids})
+
+    print(f"- {ctx.writer.pending('courses')} courses with changed teachers")
+    counts = ctx.flush("courses")
+    print(f"- {counts['modified']} courses updated ({counts['failed']} failed)")
+
+    return
+
+
+### CREATE NEW SEMESTER ###
+def create_new_semester(db, **kwargs):
+    name = kwargs.get("name")
+    if not name:
+        raise ValueError("create_new_semester requires a non-empty 'name'")
+
+    semester_payload = {
+        "start_date": kwargs.get("start_date"),
+        "end_date": kwargs.get("end_date"),
+        "type": kwargs.get("type"),
+        "available": kwargs.get("available", False),
+        "skip_dates": kwargs.get("skip_dates", []),
+    }
+
+    # Use upsert to avoid duplicate key errors when the semester already exists.
+    result = db.semesters.update_one(
+        {"name": name},
+        {"$set": semester_payload, "$setOnInsert": {"name": name}},
+        upsert=True,
+    )
+
+    if result.matched_count and not result.modified_count:
+        print(f"Semester '{name}' already up-to-date")
+
+
+### STUDYPLANS RESOLUTION ###
+SEMESTER_RE_PATTERN = r"(\d{4}-\d{4})"
+
+
+@functools.cache
+def parse_studyplan_semester(section, semester):
+    """
+    Parse a course studyplan (section, "xxxx-xxxx semester")
+    Output:
+        - unit_name: the name of the unit in the db
+        - semester_long: the semester without the years
+        - semester_type: fall, spring or year (None if unknown)
+    """
+    semester_long = re.split(SEMESTER_RE_PATTERN, semester)[2].strip()
+    unit_name = (
+        section + " - " + semester_long if semester_long in MAP_PROMOS_LONG else section
+    )
+    if semester_long in MAP_SEMESTERS_LONG:
+        semester_type = MAP_SEMESTERS_LONG[semester_long]
+    else:
+        semester_type = MAP_SEMESTERS_LONG.get(section)
+    return unit_name, semester_long, semester_type
+
+
+class StudyplanResolver:
+    """
+    Map a course studyplan (section, semester) to the db unit, semester and
+    studyplan ids of the current or next semesters, built once per run
+    """
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+
+        self.units = {
+            unit["name"]: unit["_id"] for unit in ctx.find("units", available=True)
+        }
+
+        self.semesters = {}
+        for semester_type in ("fall", "spring", "year"):
+            semester = get_run_semester(ctx, semester_type)
+            if semester is not None:
+                self.semesters[semester_type] = semester["_id"]
+
+        self.load_studyplans()
+
+    def load_studyplans(self):
+        semesters_ids = set(self.semesters.values())
+        self.studyplans = {
+            (studyplan["unit_id"], studyplan["semester_id"]): studyplan["_id"]
+            for studyplan in self.ctx.find("studyplans", available=True)
+            if studyplan["semester_id"] in semesters_ids
+        }
+        print(f"- {len(self.studyplans)} studyplans found")
+
+    def resolve(self, section, semester):
+        """
+        Output:
+            - (unit_id, semester_id, studyplan_id), each None if not found
+        """
+        unit_name, _, semester_type = parse_studyplan_semester(section, semester)
+        unit_id = self.units.get(unit_name)
+        semester_id = self.semesters.get(semester_type)
+        studyplan_id = self.studyplans.get((unit_id, semester_id))
+        return unit_id, semester_id, studyplan_id
+
+
+def list_units(courses):
+    units = []
+    unique_sections = set()
+    unique_promos = set()
+    for courses in courses:
+        for studyplan in courses["studyplans"]:
+            if studyplan["section"] not in unique_sections:
+                unique_sections.add(studyplan["section"])
+            if studyplan["semester"] not in unique_promos:
+                unique_promos.add(studyplan["semester"])
+            if (studyplan["section"], studyplan["semester"]) not in units:
+                units.append((studyplan["section"], studyplan["semester"]))
+
+    return units
+
+
+def create_units(db, courses, ctx=None):
+    if ctx is None:
+        ctx = RunContext(db)
+
+    units = list_units(courses)
+
+    print("Getting units from DB...")
+    db_units = ctx.find("units")
+    print(f"- {len(db_units)} units found")
+    db_units_names = {unit.get("name") for unit in db_units}
+
+    new_units = []
+    new_units_names = set()
+    print("Filtering units...")
+    for unit in tqdm(units):
+        unit_name, semester_long, _ = parse_studyplan_semester(unit[0], unit[1])
+        if unit_name not in db_units_names and unit_name not in new_units_names:
+            new_unit = dict()
+            promo = (
+                MAP_PROMOS_LONG[semester_long]
+                if semester_long in MAP_PROMOS_LONG
+                else None
+            )
+            if promo is not None:
+                new_unit["promo"] = promo
+            if unit[0] not in MAP_SECTIONS:
+                print("Section not found in MAP_SECTIONS", unit[0])
+                continue
+            code = (
+                MAP_SECTIONS[unit[0]] + "-" + promo
+                if promo is not None
+                else MAP_SECTIONS[unit[0]]
+            )
+            new_unit["code"] = code
+            new_unit["section"] = MAP_SECTIONS[unit[0]]
+            new_unit["name"] = unit_name
+            new_unit["available"] = True
+
+            new_units_names.add(unit_name)
+            new_units.append(new_unit)
+
+    print("Creating new units...")
+    if len(new_units) == 0:
+        print("- No units to create")
+        return
+
+    for new_unit in new_units:
+        ctx.upsert("units", new_unit)
+    counts = ctx.flush("units")
+    print(f"- {counts['inserted']} units created ({counts['failed']} failed)")
+
+    return
+
+
+def create_studyplans(db, courses, ctx=None):
+    if ctx is None:
+        ctx = RunContext(db)
+    resolver = get_run_resolver(ctx)
+
+    print(len(resolver.semesters), "db semesters found")
+
+    new_studyplans = {}
+    print("Filtering studyplans...")
+    for course in courses:
+        for studyplan in course["studyplans"]:
+            unit_id, semester_id, studyplan_id = resolver.resolve(
+                studyplan["section"], studyplan["semester"]
+            )
+            if unit_id is None:
+                unit_name, _, _ = parse_studyplan_semester(
+                    studyplan["section"], studyplan["semester"]
+                )
+                print("Unit not found", unit_name)
+                continue
+            if semester_id is None or studyplan_id is not None:
+                continue
+
+            new_studyplans[(unit_id, semester_id)] = {
+                "unit_id": unit_id,
+                "semester_id": semester_id,
+                "available": True,
+            }
+
+    print("Creating studyplans...")
+    if len(new_studyplans) == 0:
+        print("- No new studyplans to create")
+        return
+
+    for new_studyplan in new_studyplans.values():
+        ctx.upsert("studyplans", new_studyplan)
+    counts = ctx.flush("studyplans")
+    print(f"- {counts['inserted']} studyplans created ({counts['failed']} failed)")
+
+    resolver.load_studyplans()
+
+    return
+
+
+def create_planned_in(db, courses, ctx=None):
+    if ctx is None:
+        ctx = RunContext(db)
+    resolver = get_run_resolver(ctx)
+
+    db_courses_ids = {
+        code: course["_id"]
+        for code, course in ctx.index("courses", "code", available=True).items()
+    }
+
+    print("Getting planned_in from DB...")
+    # Only the planned_in of the studyplans of the run are cached
+    ctx.load(
+        "planned_in",
+        {"studyplan_id": {"$in": list(set(resolver.studyplans.values()))}},
+    )
+    db_planned_in = {
+        (planned_in["course_id"], planned_in["studyplan_id"])
+        for planned_in in ctx.find("planned_in", available=True)
+    }
+    print(f"- {len(db_planned_in)} planned_in found")
+
+    new_planned_ins = {}
+    print("Filtering planned_in...")
+    for course in tqdm(courses, total=len(courses)):
+        course_id = db_courses_ids.get(course["code"])
+        if course_id is None:
+            continue
+
+        for studyplan in course["studyplans"]:
+            unit_id, semester_id, studyplan_id = resolver.resolve(
+                studyplan["section"], studyplan["semester"]
+            )
+            if unit_id is None:
+                print("Unit not found")
+                continue
+            if semester_id is None:
+                continue
+            if studyplan_id is None:
+                print("Studyplan not found")
+                continue
+
+            key = (course_id, studyplan_id)
+            if key in db_planned_in or key in new_planned_ins:
+                continue
+
+            new_planned_ins[key] = {
+                "course_id": course_id,
+                "studyplan_id": studyplan_id,
+                "available": True,
+            }
+
+    print("Creating planned_in...")
+    if len(new_planned_ins) == 0:
+        print("- No new planned_in to create")
+        return
+
+    for new_planned_in in new_planned_ins.values():
+        ctx.upsert("planned_in", new_planned_in)
+    counts = ctx.flush("planned_in")
+    print(f"- {counts['inserted']} planned_in created ({counts['failed']} failed)")
+    return
+
+
+def get_current_or_next_semester(db, semester_type=None):
+    today = local_today()
+
+    # If semester_type is specified, get the current or next semester of this type
+    if semester_type is not None:
+        semester = db.semesters.find_one(
+            {"end_date": {"$gte": today}, "type": semester_type}, sort=[("end_date", 1)]
+        )
+
+        return semester
+
+    # Get the current semester
+    semester = db.semesters.find_one(
+        {
+            "start_date": {"$lte": today},
+            "end_date": {"$gte": today},
+            "type": {"$ne": "year"},
+        }
+    )
+
+    # If no current semester is found, get the first next semester
+    if not semester:
+        semester = db.semesters.find_one(
+            {"start_date": {"$gte": today}, "type": {"$ne": "year"}},
+            sort=[("start_date", 1)],
+        )
+
+    return semester
+
+
+def get_run_semester(ctx, semester_type=None):
+    """
+    get_current_or_next_semester, looked up once per run
+    """
+    key = ("semester", semester_type)
+    if key not in ctx.memo:
+        ctx.memo[key] = get_current_or_next_semester(ctx.db, semester_type)
+    return ctx.memo[key]
+
+
+def get_run_resolver(ctx):
+    if "resolver" not in ctx.memo:
+        ctx.memo["resolver"] = StudyplanResolver(ctx)
+    return ctx.memo["resolver"]
+
+
+def find_semester_courses(db, ctx=None):
+    """
+    Resolve the courses of the current or next semester in one aggregation
+    (studyplans -> planned_in -> courses), computed once per run
+    Output:
+        - semester_courses: the courses planned in the semester
+        - year_courses: the courses planned in the year but not in the semester
+        - man_courses_ids: the ids of the MAN courses of the spring semester
+        (courses are projected on _id, code and edu_url)
+    """
+    if ctx is None:
+        ctx = RunContext(db)
+    if "semester_courses" in ctx.memo:
+        return ctx.memo["semester_courses"]
+
+    semester = get_run_semester(ctx)
+    year = get_run_semester(ctx, "year")
+    spring = get_run_semester(ctx, "spring")
+
+    def semester_id(db_semester):
+        return db_semester["_id"] if db_semester is not None else None
+
+    def planned_during(db_semester):
+        return {
+            "$and": [
+                "$available",
+                "$planned_in.available",
+                {"$eq": ["$semester_id", semester_id(db_semester)]},
+            ]
+        }
+
+    pipeline = [
+        {
+            "$match": {
+                "semester_id": {
+                    "$in": [
+                        db_semester["_id"]
+                        for db_semester in (semester, year, spring)
+                        if db_semester is not None
+                    ]
+                }
+            }
+        },
+        {
+            "$lookup": {
+                "from": "units",
+                "localField": "unit_id",
+                "foreignField": "_id",
+                "as": "unit",
+            }
+        },
+        {
+            "$lookup": {
+                "from": "planned_in",
+                "localField": "_id",
+                "foreignField": "studyplan_id",
+                "as": "planned_in",
+            }
+        },
+        {"$unwind": "$planned_in"},
+        {
+            "$project": {
+                "course_id": "$planned_in.course_id",
+                "in_semester": planned_during(semester),
+                "in_year": planned_during(year),
+                "man": {
+                    "$and": [
+                        {"$eq": ["$semester_id", semester_id(spring)]},
+                        {"$in": ["MAN", "$unit.section"]},
+                    ]
+                },
+            }
+        },
+        {
+            "$group": {
+                "_id": "$course_id",
+                "in_semester": {"$max": "$in_semester"},
+                "in_year": {"$max": "$in_year"},
+                "man": {"$max": "$man"},
+            }
+        },
+        {
+            "$lookup": {
+                "from": "courses",
+                "localField": "_id",
+                "foreignField": "_id",
+                "as": "course",
+            }
+        },
+        {"$unwind": {"path": "$course", "preserveNullAndEmptyArrays": True}},
+        {
+            "$project": {
+                "code": "$course.code",
+                "edu_url": "$course.edu_url",
+                "in_semester": 1,
+                "in_year": 1,
+                "man": 1,
+            }
+        },
+    ]
+
+    print("Getting semester courses from DB...")
+    semester_courses = []
+    year_courses = []
+    man_courses_ids = []
+    for row in db.studyplans.aggregate(pipeline):
+        if row.get("man"):
+            man_courses_ids.append(row["_id"])
+        if row.get("code") is None:
+            continue
+        course = {"_id": row["_id"], "code": row["code"], "edu_url": row.get("edu_url")}
+        if row.get("in_semester"):
+            semester_courses.append(course)
+        elif row.get("in_year"):
+            year_courses.append(course)
+    print(
+        f"- {len(semester_courses)} semester courses, {len(year_courses)} year "
+        f"courses, {len(man_courses_ids)} MAN courses"
+    )
+
+    ctx.memo["semester_courses"] = (semester_courses, year_courses, man_courses_ids)
+    return ctx.memo["semester_courses"]
+
+
+### UPDATE SCHEDULES ###
+def schedule_key(schedule):
+    return (
+        schedule.get("course_id"),
+        schedule.get("start_datetime"),
+        schedule.get("end_datetime"),
+        schedule.get("label"),
+    )
+
+
+def reconciled_courses_ids(db, ctx=None, courses_ids=None):
+    """
+    Output:
+        - ids: the ids of the semester and year courses whose schedules are
+        reconciled with edu (the MAN courses and the ones that could not be
+        scraped are left untouched)
+    """
+    # Find courses planned in the current semester or year
+    db_courses_semester, db_courses_year, man_courses_ids = find_semester_courses(
+        db, ctx
+    )
+
+    # remove MAN courses and the courses that failed (see iter_courses_schedules)
+    skipped_ids = set(man_courses_ids)
+    if ctx is not None:
+        skipped_ids.update(ctx.memo.get("failed_courses_ids", ()))
+    db_planned_in_ids = [
+        course["_id"]
+        for course in db_courses_semester + db_courses_year
+        if course["_id"] not in skipped_ids
+    ]
+    if courses_ids is not None:
+        courses_ids = set(courses_ids)
+        db_planned_in_ids = [
+            course_id for course_id in db_planned_in_ids if course_id in courses_ids
+        ]
+    return db_planned_in_ids
+
+
+def plan_schedules(schedules, db_schedules):
+    """
+    Match the incoming schedules with the db ones
+    Input:
+        - schedules: the incoming schedules
+        - db_schedules: the db schedules of the reconciled courses
+    Output:
+        - to_remove: the db schedules not in the incoming ones
+        - to_remake_available: the unavailable db schedules back in edu
+        - new_schedules: the incoming schedules not in db
+    """
+    db_schedules = {
+        schedule_key(db_schedule): db_schedule for db_schedule in db_schedules
+    }
+
+    db_schedules_to_remake_available = []
+
+    print(f"Filtering {len(schedules)} schedules...")
+    new_schedules = []
+    for incoming_schedule in tqdm(schedules, total=len(schedules)):
+        db_schedule_found = db_schedules.pop(schedule_key(incoming_schedule), None)
+
+        if db_schedule_found is not None:
+            if not db_schedule_found.get("available"):
+                db_schedules_to_remake_available.append(db_schedule_found)
+            continue
+
+        new_schedules.append(
+            {
+                "course_id": incoming_schedule.get("course_id"),
+                "start_datetime": incoming_schedule.get("start_datetime"),
+                "end_datetime": incoming_schedule.get("end_datetime"),
+                "label": incoming_schedule.get("label"),
+                "available": True,
+            }
+        )
+
+    return list(db_schedules.values()), db_schedules_to_remake_available, new_schedules
+
+
+def update_schedules(db, schedules, ctx=None, courses_ids=None):
+    """
+    Reconcile the db schedules of the semester courses with the incoming ones
+    Input:
+        - schedules: the incoming schedules
+        - ctx: the RunContext of the run (optional)
+        - courses_ids: only reconcile the schedules of these courses
+    """
+    if ctx is None:
+        ctx = RunContext(db)
+
+    db_planned_in_ids = reconciled_courses_ids(db, ctx, courses_ids)
+
+    # Find schedules with course in the studyplans
+    print("Getting schedules from DB...")
+    db_schedules = [
+        db_schedule
+        for ids in chunks(db_planned_in_ids, BULK_CHUNK_SIZE)
+        for db_schedule in db.course_schedules.find({"course_id": {"$in": ids}})
+    ]
+    print(f"- {len(db_schedules)} schedules found")
+
+    to_remove, db_schedules_to_remake_available, new_schedules = plan_schedules(
+        schedules, db_schedules
+    )
+
+    writer = BulkWriter(db)
+
+    # delete remaining db_schedules
+    print("Deleting schedules not in incoming schedules...")
+    writer.set_fields(
+        "course_schedules",
+        [db_schedule.get("_id") for db_schedule in to_remove],
+        {"available": False},
+    )
+    counts = writer.flush()
+    print(f"- {counts['modified']} schedules deleted ({counts['failed']} failed)")
+
+    # remake available schedules
+    print("Remaking available schedules...")
+    writer.set_fields(
+        "course_schedules",
+        [db_schedule.get("_id") for db_schedule in db_schedules_to_remake_available],
+        {"available": True},
+    )
+    counts = writer.flush()
+    print(
+        f"- {counts['modified']} schedules remade available ({counts['failed']} failed)"
+    )
+
+    # insert new schedules
+    if len(new_schedules) == 0:
+        print("No new schedules to create")
+        return
+
+    print(f"Creating {len(new_schedules)} new schedules...")
+    for new_schedule in new_schedules:
+        writer.upsert("course_schedules", new_schedule)
+    counts = writer.flush()
+    print(f"- {counts['inserted']} schedules created ({counts['failed']} failed)")
+
+
+def get_man_courses_ids(db, ctx=None):
+    _, _, man_courses_ids = find_semester_courses(db, ctx)
+    return man_courses_ids
+
+
+def plan_courses_bookings(
+    schedules, db_rooms, db_schedules, db_bookings, db_unavailable_bookings
+):
+    """
+    Match the rooms of the incoming schedules with the db bookings
+    Input:
+        - schedules: the incoming schedules
+        - db_rooms: the available rooms by name
+        - db_schedules: the available db schedules
+        - db_bookings: the available db bookings
+        - db_unavailable_bookings: the unavailable db bookings
+    Output:
+        - to_remove: the bookings whose room or schedule is gone
+        - to_make_available: the unavailable bookings back in edu
+        - to_create: the new bookings
+    """
+    db_schedules_by_key = {
+        schedule_key(db_schedule): db_schedule for db_schedule in db_schedules
+    }
+    db_bookings_by_schedule = collections.defaultdict(list)
+    for db_booking in db_bookings:
+        db_bookings_by_schedule[db_booking.get("schedule_id")].append(db_booking)
+    db_unavailable_bookings_by_key = {
+        (booking.get("schedule_id"), booking.get("room_id")): booking
+        for booking in db_unavailable_bookings
+    }
+
+    print("Filtering bookings....")
+    new_bookings_candidates = []
+    bookings_to_remove = []
+    for schedule in tqdm(schedules, total=len(schedules)):
+        db_schedule = db_schedules_by_key.get(schedule_key(schedule))
+        if db_schedule is None:
+            continue
+
+        schedule_rooms_ids = [
+            db_rooms[room]["_id"] for room in schedule["rooms"] if room in db_rooms
+        ]
+
+        # check for rooms in db_rooms not in schedule['rooms'] (to remove)
+        db_schedule_bookings = db_bookings_by_schedule[db_schedule["_id"]]
+        db_schedule_rooms_ids = set()
+        for db_schedule_booking in db_schedule_bookings:
+            room_id = db_schedule_booking.get("room_id")
+            db_schedule_rooms_ids.add(room_id)
+            if room_id not in schedule_rooms_ids:
+                bookings_to_remove.append(db_schedule_booking)
+
+        for room_id in schedule_rooms_ids:
+            # Check if booking already exists
+            if room_id in db_schedule_rooms_ids:
+                continue
+
+            booking = {
+                "schedule_id": db_schedule["_id"],
+                "room_id": room_id,
+                "available": True,
+            }
+
+            new_bookings_candidates.append(booking)
+
+    print(
+        f" - {len(bookings_to_remove)} bookings changed (not the schedule) (to remove)"
+    )
+
+    # find bookings without a schedule_id in db_schedules
+    schedules_ids = {db_schedule["_id"] for db_schedule in db_schedules}
+    bookings_without_schedule = [
+        booking
+        for booking in db_bookings
+        if booking.get("schedule_id") not in schedules_ids
+    ]
+
+    # check if new booking is in db_unavailable_bookings and set it to available
+    to_make_available = []
+    to_create = []
+    for new_booking in new_bookings_candidates:
+        unavailable_booking = db_unavailable_bookings_by_key.get(
+            (new_booking.get("schedule_id"), new_booking.get("room_id"))
+        )
+        if unavailable_booking is not None:
+            to_make_available.append(unavailable_booking)
+        else:
+            to_create.append(new_booking)
+
+    return bookings_without_schedule + bookings_to_remove, to_make_available, to_create
+
+
+def create_courses_bookings(db, schedules, ctx=None, courses_ids=None):
+    """
+    Reconcile the db course bookings with the rooms of the incoming schedules
+    Input:
+        - schedules: the incoming schedules
+        - ctx: the RunContext of the run (optional)
+        - courses_ids: only reconcile the bookings of these courses
+    """
+    if ctx is None:
+        ctx = RunContext(db)
+
+    db_rooms = ctx.index("rooms", "name", available=True)
+
+    print("Getting DB bookings...")
+    if courses_ids is None:
+        db_schedules = list(db.course_schedules.find({"available": True}))
+        db_bookings = list(db.course_bookings.find({"available": True}))
+        db_unavailable_bookings = list(db.course_bookings.find({"available": False}))
+    else:
+        courses_schedules = [
+            db_schedule
+            for ids in chunks(courses_ids, BULK_CHUNK_SIZE)
+            for db_schedule in db.course_schedules.find({"course_id": {"$in": ids}})
+        ]
+        db_schedules = [
+            db_schedule
+            for db_schedule in courses_schedules
+            if db_schedule.get("available")
+        ]
+        courses_bookings = [
+            booking
+            for ids in chunks(
+                [db_schedule["_id"] for db_schedule in courses_schedules],
+                BULK_CHUNK_SIZE,
+            )
+            for booking in db.course_bookings.find({"schedule_id": {"$in": ids}})
+        ]
+        db_bookings = [
+            booking for booking in courses_bookings if booking.get("available")
+        ]
+        db_unavailable_bookings = [
+            booking for booking in courses_bookings if not booking.get("available")
+        ]
+    print(f"- {len(db_bookings)} bookings found in DB")
+
+    to_remove, to_make_available, to_create = plan_courses_bookings(
+        schedules, db_rooms, db_schedules, db_bookings, db_unavailable_bookings
+    )
+
+    writer = BulkWriter(db)
+
+    # remove bookings with a schedule_id not in db_schedules
+    print("Removing bookings without schedule...")
+    if len(to_remove) == 0:
+        print("- No bookings to remove")
+    else:
+        writer.set_fields(
+            "course_bookings",
+            [booking.get("_id") for booking in to_remove],
+            {"available": False},
+        )
+        counts = writer.flush()
+        print(f"- {counts['modified']} bookings removed ({counts['failed']} failed)")
+
+    print("Checking if new bookings are in unavailable bookings...")
+    if len(to_make_available) == 0:
+        print("- No bookings to (re)make available")
+    else:
+        writer.set_fields(
+            "course_bookings",
+            [booking.get("_id") for booking in to_make_available],
+            {"available": True},
+        )
+        counts = writer.flush()
+        print(f"- {counts['modified']} bookings (re)made available")
+
+    if len(to_create) == 0:
+        print("No bookings to create")
+        return
+
+    # insert new bookings
+    print(f"Creating {len(to_create)} new bookings...")
+    for booking in to_create:
+        writer.upsert("course_bookings", booking)
+    counts = writer.flush()
+    print(f"- {counts['inserted']} bookings created ({counts['failed']} failed)")
+
+
+### FULL REFRESH ###
+# Relative cost of writing one document, used by estimate_refresh_cost
+DIFF_WRITE_COST = 1.0  # bulk upsert/update, looked up in the unique index
+REBUILD_WRITE_COST = 0.2  # insert_many into an empty shadow collection
+REBUILD_INDEX_COST = 0.05  # index build after the bulk load
+REBUILD_COPY_COST = 0.05  # server side copy of the documents out of the window
+
+# Expected change ratio from which update_schedules.py scrapes the whole
+# semester first so that refresh_courses_schedules can rebuild
+REBUILD_CHANGE_RATIO = 0.5
+
+
+def estimate_refresh_cost(total_documents, changed_documents, kept_documents=0):
+    """
+    Relative cost of the two ways of writing a refresh, the reads are the
+    same for both
+    Input:
+        - total_documents: the number of documents of the refreshed window
+        - changed_documents: the number of documents to write in place
+        - kept_documents: the number of documents out of the window, copied
+        as they are by a rebuild
+    Output:
+        - costs: dict of the diff and rebuild costs
+    """
+    return {
+        "diff": changed_documents * DIFF_WRITE_COST,
+        "rebuild": total_documents * (REBUILD_WRITE_COST + REBUILD_INDEX_COST)
+        + kept_documents * (REBUILD_COPY_COST + REBUILD_INDEX_COST),
+    }
+
+
+def expected_change_ratio(db, ctx=None):
+    """
+    Expected share of the schedules changing before scraping: the share of
+    the reconciled courses scheduled before (with schedules in any semester)
+    without any available schedule in the semester (1 at the start of a
+    semester). The courses never scheduled (year-only, EDOC or project
+    courses) are left out, they would count as changing on every run.
+    Output:
+        - ratio: between 0 and 1, 0 without a current or next semester
+    """
+    if ctx is None:
+        ctx = RunContext(db)
+
+    semester = get_run_semester(ctx)
+    if semester is None:
+        return 0.0
+    courses_ids = reconciled_courses_ids(db, ctx)
+
+    scheduled_before_ids = set()
+    scheduled_courses_ids = set()
+    for ids in chunks(courses_ids, BULK_CHUNK_SIZE):
+        scheduled_before_ids.update(
+            db.course_schedules.distinct("course_id", {"course_id": {"$in": ids}})
+        )
+        scheduled_courses_ids.update(
+            db.course_schedules.distinct(
+                "course_id",
+                {
+                    "course_id": {"$in": ids},
+                    "available": True,
+                    "start_datetime": {
+                        "$gte": semester["start_date"],
+                        "$lte": semester["end_date"],
+                    },
+                },
+            )
+        )
+    if len(scheduled_before_ids) == 0:
+        return 0.0
+    return 1 - len(scheduled_courses_ids & scheduled_before_ids) / len(
+        scheduled_before_ids
+    )
+
+
+def refresh_window(semester, schedules):
+    """
+    Output:
+        - window: the start_datetime range of the semester days, extended to
+        the incoming schedules (e.g. EDOC courses out of the semester)
+    """
+    starts = [schedule["start_datetime"] for schedule in schedules]
+    return {
+        "$gte": min([semester["start_date"], *starts]),
+        "$lt": max(
+            [
+                semester["end_date"] + timedelta(days=1),
+                *(start + timedelta(minutes=1) for start in starts),
+            ]
+        ),
+    }
+
+
+def refresh_courses_schedules(db, schedules, ctx=None, mode="auto"):
+    """
+    Reconcile the course schedules and bookings of the semester (the ones
+    starting in its window, see refresh_window), either in place (like
+    update_schedules and create_courses_bookings) or by rebuilding both
+    collections in shadow collections swapped in at the end, the documents
+    out of the window being copied as they are. The changes are planned in
+    memory first, so the cost of both ways is known before writing.
+    Input:
+        - schedules: all the incoming schedules of the semester
+        - ctx: the RunContext of the run (optional)
+        - mode: "diff", "rebuild" or "auto" (the cheapest by estimate_refresh_cost)
+    """
+    if ctx is None:
+        ctx = RunContext(db)
+
+    semester = get_run_semester(ctx)
+    if semester is None:
+        print("No current or next semester, nothing to refresh")
+        return
+    window = refresh_window(semester, schedules)
+
+    print("Getting schedules and bookings of the semester from DB...")
+    db_schedules = {
+        doc["_id"]: doc for doc in db.course_schedules.find({"start_datetime": window})
+    }
+    db_bookings = {
+        doc["_id"]: doc
+        for ids in chunks(db_schedules, BULK_CHUNK_SIZE)
+        for doc in db.course_bookings.find({"schedule_id": {"$in": ids}})
+    }
+    print(f"- {len(db_schedules)} schedules, {len(db_bookings)} bookings found")
+
+    # Plan the schedules changes on copies of the reconciled courses schedules
+    courses_ids = set(reconciled_courses_ids(db, ctx))
+    schedules_changes = {}
+    to_remove, to_remake_available, new_schedules = plan_schedules(
+        schedules,
+        [
+            dict(doc)
+            for doc in db_schedules.values()
+            if doc.get("course_id") in courses_ids
+        ],
+    )
+    for doc in to_remove:
+        if doc.get("available"):
+            schedules_changes[doc["_id"]] = dict(doc, available=False)
+    for doc in to_remake_available:
+        schedules_changes[doc["_id"]] = dict(doc, available=True)
+
+    # The incoming schedules of the other courses (MAN) are only inserted if
+    # missing, like the upserts of update_schedules
+    db_keys = {schedule_key(doc) for doc in db_schedules.values()}
+    new_schedules = [doc for doc in new_schedules if schedule_key(doc) not in db_keys]
+    for doc in new_schedules:
+        doc["_id"] = ObjectId()
+
+    final_schedules = {**db_schedules, **schedules_changes}
+    final_schedules.update((doc["_id"], doc) for doc in new_schedules)
+
+    # Plan the bookings changes against the schedules after their changes
+    bookings_to_remove, bookings_to_make_available, new_bookings = (
+        plan_courses_bookings(
+            schedules,
+            ctx.index("rooms", "name", available=True),
+            [doc for doc in final_schedules.values() if doc.get("available")],
+            [doc for doc in db_bookings.values() if doc.get("available")],
+            [doc for doc in db_bookings.values() if not doc.get("available")],
+        )
+    )
+    bookings_changes = {}
+    for doc in bookings_to_remove:
+        bookings_changes[doc["_id"]] = dict(doc, available=False)
+    for doc in bookings_to_make_available:
+        bookings_changes[doc["_id"]] = dict(doc, available=True)
+    for doc in new_bookings:
+        doc["_id"] = ObjectId()
+
+    changed = (
+        len(schedules_changes)
+        + len(new_schedules)
+        + len(bookings_changes)
+        + len(new_bookings)
+    )
+    total = len(final_schedules) + len(db_bookings) + len(new_bookings)
+    kept = max(
+        db.course_schedules.estimated_document_count()
+        + db.course_bookings.estimated_document_count()
+        - len(db_schedules)
+        - len(db_bookings),
+        0,
+    )
+    costs = estimate_refresh_cost(total, changed, kept)
+    print(
+        f"- {changed} of {total} documents change "
+        f"({changed / max(total, 1):.0%}), "
+        f"cost diff {costs['diff']:.0f} / rebuild {costs['rebuild']:.0f}"
+    )
+    if mode == "auto":
+        mode = "rebuild" if costs["rebuild"] < costs["diff"] else "diff"
+
+    if mode == "rebuild":
+        print("Rebuilding schedules and bookings...")
+        final_bookings = {**db_bookings, **bookings_changes}
+        final_bookings.update((doc["_id"], doc) for doc in new_bookings)
+        swapped = rebuild_collections(
+            db,
+            {
+                "course_schedules": list(final_schedules.values()),
+                "course_bookings": list(final_bookings.values()),
+            },
+            {
+                "course_schedules": [
+                    {"$match": {"$nor": [{"start_datetime": window}]}}
+                ],
+                # The bookings of the schedules out of the window (the live
+                # ones, not swapped yet) and the ones without schedule
+                "course_bookings": [
+                    {
+                        "$lookup": {
+                            "from": "course_schedules",
+                            "localField": "schedule_id",
+                            "foreignField": "_id",
+                            "as": "schedule",
+                        }
+                    },
+                    {"$match": {"$nor": [{"schedule.start_datetime": window}]}},
+                    {"$project": {"schedule": 0}},
+                ],
+            },
+        )
+        if swapped:
+            print(
+                f"- {len(final_schedules)} schedules, {len(final_bookings)} "
+                "bookings of the semester rebuilt"
+            )
+            return
+        print("- Rebuild failed, reconciling in place")
+
+    print("Writing schedules and bookings changes...")
+    writer = BulkWriter(db)
+    for collection, changes, new_documents in (
+        ("course_schedules", schedules_changes, new_schedules),
+        ("course_bookings", bookings_changes, new_bookings),
+    ):
+        for available in (False, True):
+            writer.set_fields(
+                collection,
+                [
+                    _id
+                    for _id, doc in changes.items()
+                    if doc.get("available") == available
+                ],
+                {"available": available},
+            )
+        for doc in new_documents:
+            writer.upsert(collection, doc)
+        counts = writer.flush(collection)
+        print(
+            f"- {collection}: {counts['modified']} modified, "
+            f"{counts['inserted']} created ({counts['failed']} failed)"
+        )
@@ -1,15 +1,27 @@
-import pymongo
-from pymongo import MongoClient
+import functools
+import hashlib
+import importlib.util
+import json
+from datetime import datetime
+
+from pymongo import DeleteMany, MongoClient, UpdateMany, UpdateOne
 from pymongo.database import Database
-from pymongo.errors import ConnectionFailure
+from pymongo.errors import BulkWriteError, ConnectionFailure, OperationFailure
+from pymongo.write_concern import WriteConcern
 from tqdm import tqdm
 
+from indexes import INDEXES
+from instrumentation import command_listener
+from migrations import MIGRATIONS
 from models import (
+    building_geometry_validator,
     course_booking_validator,
     course_schedule_validator,
     course_validator,
     event_booking_validator,
     planned_in_validator,
+    room_geometry_validator,
+    room_occupancy_validator,
     room_validator,
     semester_validator,
     studyplan_validator,
@@ -18,215 +30,183 @@ from models import (
 )
 from settings import Settings
 
+# Fields of the unique index of each collection (see init), used as upsert keys
+UNIQUE_KEYS = {
+    "rooms": ("name",),
+    "teachers": ("name",),
+    "courses": ("code",),
+    "course_bookings": ("schedule_id", "room_id"),
+    "course_schedules": ("course_id", "start_datetime", "end_datetime", "label"),
+    "studyplans": ("unit_id", "semester_id"),
+    "units": ("name",),
+    "semesters": ("name",),
+    "planned_in": ("studyplan_id", "course_id"),
+    "event_bookings": ("room_id", "start_datetime", "end_datetime", "name"),
+    "room_occupancy": ("date", "room_id"),
+    "room_geometry": ("room_id",),
+    "building_geometry": ("building",),
+}
 
-### DB INIT ###
-def init(db: Database) -> None:
-    def init_rooms_collection():
-        try:
-            db.create_collection("rooms")
-            print("Created collection rooms")
-        except Exception as e:
-            if str(e) != "collection rooms already exists":
-                print(e)
+BULK_CHUNK_SIZE = 1000
 
-        try:
-            db.command("collMod", "rooms", validator=room_validator)
-            db.rooms.create_index(
-                [("name", pymongo.ASCENDING)], name="room_name", unique=True
-            )
-        except Exception as e:
-            print(e)
+# Python modules needed by the wire compressors
+COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
 
-    def init_teachers_collection():
-        try:
-            db.create_collection("teachers")
-            print("Created collection teachers")
-        except Exception as e:
-            if str(e) != "collection teachers already exists":
-                print(e)
+# Write concern of the bulk writes of the collections rederived by every run
+# (BulkWriter and shadow loads), set from the Settings by init_and_connect
+# (None: the one of the client)
+bulk_write_concern: WriteConcern | None = None
 
-        try:
-            db.command("collMod", "teachers", validator=teacher_validator)
-            db.teachers.create_index(
-                [("name", pymongo.ASCENDING)], name="teacher_unique", unique=True
-            )
-        except Exception as e:
-            print(e)
+# The reconciled schedules and bookings, written again by the next run, and
+# the occupancy materialized from them
+BULK_WRITE_CONCERN_COLLECTIONS = (
+    "course_schedules",
+    "course_bookings",
+    "event_bookings",
+    "room_occupancy",
+)
 
-    def init_courses_collection():
-        try:
-            db.create_collection("courses")
-            print("Created collection courses")
-        except Exception as e:
-            if str(e) != "collection courses already exists":
-                print(e)
-            return
 
-        try:
-            db.command("collMod", "courses", validator=course_validator)
-            db.courses.create_index(
-                [("code", pymongo.ASCENDING)], name="course_unique", unique=True
-            )
-        except Exception as e:
-            print(e)
+### DB INIT ###
+# Validator of each collection, applied by init with its indexes
+VALIDATORS = {
+    "rooms": room_validator,
+    # Course collections
+    "teachers": teacher_validator,
+    "courses": course_validator,
+    "course_bookings": course_booking_validator,
+    "course_schedules": course_schedule_validator,
+    "studyplans": studyplan_validator,
+    "units": unit_validator,
+    "semesters": semester_validator,
+    "planned_in": planned_in_validator,
+    # Event collections
+    "event_bookings": event_booking_validator,
+    # Materialized occupancy
+    "room_occupancy": room_occupancy_validator,
+    # Map geometry
+    "room_geometry": room_geometry_validator,
+    "building_geometry": building_geometry_validator,
+}
 
-    def init_course_bookings_collection():
-        try:
-            db.create_collection("course_bookings")
-            print("Created collection course_bookings")
-        except Exception as e:
-            if str(e) != "collection course_bookings already exists":
-                print(e)
-            return
+# Validator and indexes (keys, options) of each collection
+COLLECTIONS = {
+    name: (validator, INDEXES.get(name, [])) for name, validator in VALIDATORS.items()
+}
 
-        try:
-            db.command("collMod", "course_bookings", validator=course_booking_validator)
-            db.course_bookings.create_index(
-                [("schedule_id", pymongo.ASCENDING), ("room_id", pymongo.ASCENDING)],
-                name="booking_unique",
-                unique=True,
-            )
-        except Exception as e:
-            print(e)
+# Document of the schema_meta collection holding the hash of the validator and
+# indexes last applied to each collection
+SCHEMA_META_ID = "schema"
 
-    def init_course_schedules_collection():
-        try:
-            db.create_collection("course_schedules")
-            print("Created collection course_schedules")
-        except Exception as e:
-            if str(e) != "collection course_schedules already exists":
-                print(e)
-            return
 
-        try:
-            db.command(
-                "collMod", "course_schedules", validator=course_schedule_validator
-            )
-            db.course_schedules.create_index(
-                [
-                    ("course_id", pymongo.ASCENDING),
-                    ("start_datetime", pymongo.ASCENDING),
-                    ("end_datetime", pymongo.ASCENDING),
-                    ("label", pymongo.ASCENDING),
-                ],
-                name="schedule_unique",
-                unique=True,
-            )
-        except Exception as e:
-            print(e)
+def schema_hash(validator, indexes, migrations=()):
+    # The migrations are only hashed by name, and only when there are some so
+    # that the hashes of the other collections do not change
+    names = [migration.__name__ for migration in migrations]
+    spec = json.dumps(
+        [validator, indexes, *([names] if names else [])], sort_keys=True, default=str
+    )
+    return hashlib.sha256(spec.encode()).hexdigest()
 
-    def init_studyplans_collection():
-        try:
-            db.create_collection("studyplans")
-            print("Created collection studyplans")
-        except Exception as e:
-            if str(e) != "collection studyplans already exists":
-                print(e)
-            return
 
-        try:
-            db.command("collMod", "studyplans", validator=studyplan_validator)
-            db.studyplans.create_index(
-                [("unit_id", pymongo.ASCENDING), ("semester_id", pymongo.ASCENDING)],
-                name="studyplan_unique",
-                unique=True,
-            )
-        except Exception as e:
-            print(e)
+def init(db: Database, force: bool = False) -> None:
+    """
+    Create the collections, run their migrations (see migrations.py) and
+    apply their validator and indexes. This only runs for the collections
+    whose validator, indexes or migrations changed since the last init (see
+    schema_meta), or for all of them with force.
+    Input:
+        - db: the database
+        - force: run the DDL of all the collections
+    """
+    schema_meta = db.schema_meta.find_one({"_id": SCHEMA_META_ID}) or {}
+    applied = {} if force else schema_meta.get("collections", {})
+    hashes = {
+        name: schema_hash(validator, indexes, MIGRATIONS.get(name, ()))
+        for name, (validator, indexes) in COLLECTIONS.items()
+    }
+    changed = [name for name in COLLECTIONS if applied.get(name) != hashes[name]]
+    if not changed:
+        print("-- DB schema up to date --")
+        return
 
-    def init_units_collection():
+    def init_collection(name):
+        validator, indexes = COLLECTIONS[name]
         try:
-            db.create_collection("units")
-            print("Created collection units")
+            db.create_collection(name)
+            print(f"Created collection {name}")
         except Exception as e:
-            if str(e) != "collection units already exists":
+            if str(e) != f"collection {name} already exists":
                 print(e)
-            return
 
         try:
-            db.command("collMod", "units", validator=unit_validator)
-            db.units.create_index(
-                [("name", pymongo.ASCENDING)], name="unit_unique", unique=True
-            )
+            # Migrate the documents to the new schema first
+            for migration in MIGRATIONS.get(name, []):
+                migration(db)
+            db.command("collMod", name, validator=validator)
+            for keys, options in indexes:
+                db[name].create_index(keys, **options)
         except Exception as e:
             print(e)
+            return False
+        return True
 
-    def init_semesters_collection():
-        try:
-            db.create_collection("semesters")
-            print("Created collection semesters")
-        except Exception as e:
-            if str(e) != "collection semesters already exists":
-                print(e)
-            return
+    updated = 0
+    for name in tqdm(changed, desc="Initializing DB", leave=False):
+        if init_collection(name):
+            applied[name] = hashes[name]
+            updated += 1
 
-        try:
-            db.command("collMod", "semesters", validator=semester_validator)
-            db.semesters.create_index(
-                [("name", pymongo.ASCENDING)], name="semester_unique", unique=True
-            )
-        except Exception as e:
-            print(e)
+    db.schema_meta.update_one(
+        {"_id": SCHEMA_META_ID},
+        {"$set": {"collections": applied, "updated_at": datetime.now()}},
+        upsert=True,
+    )
+    print(f"-- DB initialized ({updated}/{len(changed)} collections updated) -- ")
 
-    def init_planned_in_collection():
-        try:
-            db.create_collection("planned_in")
-            print("Created collection planned_in")
-        except Exception as e:
-            if str(e) != "collection planned_in already exists":
-                print(e)
-            return
 
-        try:
-            db.command("collMod", "planned_in", validator=planned_in_validator)
-            db.planned_in.create_index(
-                [("studyplan_id", pymongo.ASCENDING), ("course_id", pymongo.ASCENDING)],
-                name="planned_in_unique",
-                unique=True,
-            )
-        except Exception as e:
-            print(e)
+def available_compressors(compressors):
+    return [
+        compressor
+        for compressor in compressors.split(",")
+        if compressor in COMPRESSOR_MODULES
+        and importlib.util.find_spec(COMPRESSOR_MODULES[compressor]) is not None
+    ]
 
-    def init_event_bookings_collection():
-        try:
-            db.create_collection("event_bookings")
-            print("Created collection event_bookings")
-        except Exception as e:
-            if str(e) != "collection event_bookings already exists":
-                print(e)
-            return
 
-        try:
-            db.command("collMod", "event_bookings", validator=event_booking_validator)
-        except Exception as e:
-            print(e)
+def parse_write_concern(w):
+    return WriteConcern(w=int(w) if w.isdigit() else w)
 
-    pbar = tqdm(total=10, desc="Initializing DB", leave=False)
-
-    inits = [
-        init_rooms_collection(),
-        # Course collections
-        init_teachers_collection(),
-        init_courses_collection(),
-        init_course_bookings_collection(),
-        init_course_schedules_collection(),
-        init_studyplans_collection(),
-        init_units_collection(),
-        init_semesters_collection(),
-        init_planned_in_collection(),
-        # Event collections
-        init_event_bookings_collection(),
-    ]
 
-    for init in inits:
-        init
-        pbar.update(1)
-    pbar.close()
-    print("-- DB initialized -- ")
+def client_options(settings: Settings) -> dict:
+    """
+    Output:
+        - options: the MongoClient options of the connection profile
+    """
+    options = {
+        "maxPoolSize": settings.DB_MAX_POOL_SIZE,
+        "minPoolSize": settings.DB_MIN_POOL_SIZE,
+        "readConcernLevel": settings.DB_READ_CONCERN,
+        "w": parse_write_concern(settings.DB_WRITE_CONCERN).document["w"],
+    }
+    compressors = available_compressors(settings.DB_COMPRESSORS)
+    if compressors:
+        options["compressors"] = compressors
+        if "zlib" in compressors:
+            options["zlibCompressionLevel"] = settings.DB_ZLIB_COMPRESSION_LEVEL
+    return options
 
 
-def init_and_connect(settings: Settings) -> Database:
-    client: MongoClient = MongoClient(settings.connection_string)
+def init_and_connect(settings: Settings, force_init: bool = False) -> Database:
+    global bulk_write_concern
+
+    # The commands are attributed to the stages of the run (see RunReport)
+    client: MongoClient = MongoClient(
+        settings.connection_string,
+        event_listeners=[command_listener],
+        **client_options(settings),
+    )
+    bulk_write_concern = parse_write_concern(settings.DB_BULK_WRITE_CONCERN)
     db = client.get_database(settings.DB_NAME)
 
     # if connected, print success message
@@ -236,6 +216,366 @@ def init_and_connect(settings: Settings) -> Database:
         print("Connected to MongoDB")
     except ConnectionFailure:
         print("Server not available")
-    init(db)
+    init(db, force=force_init)
 
     return db
+
+
+### BULK WRITES ###
+def bulk_collection(db, name, collection=None):
+    """
+    The collection, with the write concern of the bulk writes if it is one of
+    BULK_WRITE_CONCERN_COLLECTIONS
+    Input:
+        - db: the database
+        - name: the name of the collection
+        - collection: the collection whose write concern applies (default
+        name), e.g. the live collection of a shadow
+    """
+    if (
+        bulk_write_concern is None
+        or (collection or name) not in BULK_WRITE_CONCERN_COLLECTIONS
+    ):
+        return db[name]
+    return db.get_collection(name, write_concern=bulk_write_concern)
+
+
+def chunks(items, size):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+class BulkWriter:
+    """
+    Buffer write operations per collection and flush them as chunked,
+    unordered bulk_writes, so that one failing document does not stop the
+    others from being written. Upserted documents get their new _id set,
+    like with insert_many, and the applied callback of an operation is called
+    once it is written.
+    Input:
+        - db: the database
+        - chunk_size: the maximum number of operations (or ids) per request
+    """
+
+    def __init__(self, db: Database, chunk_size: int = BULK_CHUNK_SIZE):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.operations: dict[str, list] = {}
+
+    def _add(self, collection, operation, document=None, applied=None):
+        self.operations.setdefault(collection, []).append(
+            (operation, document, applied)
+        )
+
+    def upsert(self, collection, document, set_fields=()):
+        """
+        Idempotent insert of a document keyed on the collection unique index.
+        Fields in set_fields are also updated when the document already
+        exists, the others are only written on insert.
+        """
+        keys = UNIQUE_KEYS[collection]
+        key_filter = {key: document.get(key) for key in keys}
+        on_insert = {
+            k: v for k, v in document.items() if k not in keys and k not in set_fields
+        }
+        to_set = {k: document[k] for k in set_fields if k in document}
+
+        update = {}
+        if to_set:
+            update["$set"] = to_set
+        if on_insert or not to_set:
+            update["$setOnInsert"] = on_insert or key_filter
+        self._add(collection, UpdateOne(key_filter, update, upsert=True), document)
+
+    def update(self, collection, filter, update, applied=None):
+        self._add(collection, UpdateOne(filter, update), applied=applied)
+
+    def set_fields(self, collection, ids, fields, applied=None):
+        """
+        Set fields on all documents of the given ids, splitting the $in list
+        in chunks of chunk_size ids.
+        Input:
+            - applied: called with the ids of each chunk once written (optional)
+        """
+        for ids_chunk in chunks(ids, self.chunk_size):
+            self._add(
+                collection,
+                UpdateMany({"_id": {"$in": ids_chunk}}, {"$set": fields}),
+                applied=applied and functools.partial(applied, ids_chunk),
+            )
+
+    def delete_many(self, collection, filter):
+        self._add(collection, DeleteMany(filter))
+
+    def delete(self, collection, key, values):
+        """
+        Delete the documents whose key is one of values, in chunks of
+        chunk_size values.
+        """
+        for values_chunk in chunks(values, self.chunk_size):
+            self.delete_many(collection, {key: {"$in": values_chunk}})
+
+    def pending(self, collection=None):
+        if collection is not None:
+            return len(self.operations.get(collection, []))
+        return sum(len(ops) for ops in self.operations.values())
+
+    def flush(self, collection=None):
+        """
+        Send the buffered operations of a collection (or of all collections)
+        Output:
+            - counts: dict of inserted, matched, modified, deleted and failed
+            writes
+        """
+        counts = {
+            "inserted": 0,
+            "matched": 0,
+            "modified": 0,
+            "deleted": 0,
+            "failed": 0,
+        }
+        collections = (
+            [collection] if collection is not None else list(self.operations.keys())
+        )
+        for name in collections:
+            operations = self.operations.pop(name, [])
+            for operations_chunk in chunks(operations, self.chunk_size):
+                try:
+                    result = bulk_collection(self.db, name).bulk_write(
+                        [operation for operation, _, _ in operations_chunk],
+                        ordered=False,
+                    )
+                    details = result.bulk_api_result
+                except BulkWriteError as e:
+                    details = e.details
+                    for error in details.get("writeErrors", [])[:5]:
+                        print(f"- {name}: {error.get('errmsg')}")
+                failed = {error["index"] for error in details.get("writeErrors", [])}
+                for i, (_, _, applied) in enumerate(operations_chunk):
+                    if applied is not None and i not in failed:
+                        applied()
+                for upserted in details.get("upserted", []):
+                    document = operations_chunk[upserted["index"]][1]
+                    if document is not None:
+                        document["_id"] = upserted["_id"]
+                counts["inserted"] += details.get("nUpserted", 0) + details.get(
+                    "nInserted", 0
+                )
+                counts["matched"] += details.get("nMatched", 0)
+                counts["modified"] += details.get("nModified", 0)
+                counts["deleted"] += details.get("nRemoved", 0)
+                counts["failed"] += len(details.get("writeErrors", []))
+        return counts
+
+
+### SHADOW REBUILD ###
+# Index options carried over from the live collections to their shadows
+INDEX_OPTIONS = (
+    "unique",
+    "sparse",
+    "partialFilterExpression",
+    "expireAfterSeconds",
+    "2dsphereIndexVersion",
+)
+
+
+def load_shadow_collection(
+    db, collection, documents, keep=None, chunk_size=BULK_CHUNK_SIZE
+):
+    """
+    Bulk-load documents into the empty shadow of a collection, with the
+    validator and then the indexes of the live collection
+    Input:
+        - keep: aggregation pipeline selecting the live documents copied as
+        they are into the shadow first, on the server (optional)
+    Output:
+        - shadow: the name of the shadow collection, None if invalid
+    """
+    shadow = f"{collection}_shadow"
+    db.drop_collection(shadow)
+    validator = db[collection].options().get("validator")
+    db.create_collection(shadow, **({"validator": validator} if validator else {}))
+
+    kept = 0
+    if keep is not None:
+        # $out keeps the options (validator) of the existing shadow
+        db[collection].aggregate([*keep, {"$out": shadow}])
+        kept = db[shadow].count_documents({})
+
+    inserted = 0
+    for documents_chunk in chunks(documents, chunk_size):
+        try:
+            inserted += len(
+                bulk_collection(db, shadow, collection)
+                .insert_many(documents_chunk, ordered=False)
+                .inserted_ids
+            )
+        except BulkWriteError as e:
+            inserted += e.details.get("nInserted", 0)
+            for error in e.details.get("writeErrors", [])[:5]:
+                print(f"- {shadow}: {error.get('errmsg')}")
+
+    # Indexes are built once the documents are loaded, a unique index fails
+    # on duplicates
+    try:
+        for name, spec in db[collection].index_information().items():
+            if name == "_id_":
+                continue
+            index_options = {k: spec[k] for k in INDEX_OPTIONS if k in spec}
+            db[shadow].create_index(spec["key"], name=name, **index_options)
+    except OperationFailure as e:
+        print(f"- {shadow}: {e}")
+        return None
+
+    count = db[shadow].count_documents({})
+    if inserted != len(documents) or count != kept + len(documents):
+        print(f"- {shadow}: {count} documents loaded, {kept + len(documents)} expected")
+        return None
+    return shadow
+
+
+def rebuild_collections(db, documents_by_collection, keep_by_collection=None):
+    """
+    Replace whole collections by the given documents: every collection is
+    loaded and validated in its shadow first, then the shadows are renamed
+    over the live collections (renameCollection with dropTarget)
+    Input:
+        - documents_by_collection: {collection: documents}
+        - keep_by_collection: {collection: aggregation pipeline of the live
+        documents kept as they are} (optional), e.g. the ones outside of the
+        rebuilt range
+    Output:
+        - swapped: True if the collections were replaced, False if a shadow
+        was invalid (the live collections are then untouched)
+    """
+    keep_by_collection = keep_by_collection or {}
+    shadows = {}
+    for collection, documents in documents_by_collection.items():
+        shadow = load_shadow_collection(
+            db, collection, documents, keep_by_collection.get(collection)
+        )
+        if shadow is None:
+            for name in shadows.values():
+                db.drop_collection(name)
+            db.drop_collection(f"{collection}_shadow")
+            return False
+        shadows[collection] = shadow
+
+    for collection, shadow in shadows.items():
+        db[shadow].rename(collection, dropTarget=True)
+    return True
+
+
+### RUN CONTEXT ###
+# Fields loaded by RunContext for each cached collection (None: all fields)
+CACHE_PROJECTIONS = {
+    "courses": (
+        "code",
+        "name",
+        "credits",
+        "edu_url",
+        "language",
+        "teachers",
+        "available",
+    ),
+    "teachers": ("name", "people_url", "available"),
+    "units": ("name", "code", "section", "promo", "available"),
+    "studyplans": ("unit_id", "semester_id", "available"),
+    "planned_in": ("studyplan_id", "course_id", "available"),
+    "rooms": None,
+}
+
+
+class RunContext:
+    """
+    Unit of work of one pipeline run: each cached collection is read once
+    (with a projection) into an identity map by _id, and the writes made
+    through the context are applied to the cache once flushed (the failed
+    ones are not), so that later stages see them without querying the db
+    again.
+    Input:
+        - db: the database
+        - chunk_size: the maximum number of operations per bulk write
+    """
+
+    def __init__(self, db: Database, chunk_size: int = BULK_CHUNK_SIZE):
+        self.db = db
+        self.writer = BulkWriter(db, chunk_size)
+        self.documents: dict[str, dict] = {}
+        self.upserted: dict[str, list] = {}
+        # Results of lookups made once per run (e.g. current semesters)
+        self.memo: dict = {}
+
+    def load(self, collection, filter=None):
+        """
+        Input:
+            - filter: only cache the documents of the collection matching it
+            (optional), applies to the first load of the run
+        Output:
+            - documents: the identity map {_id: document} of the collection
+        """
+        if collection not in self.documents:
+            fields = CACHE_PROJECTIONS[collection]
+            projection = dict.fromkeys(fields, 1) if fields else None
+            self.documents[collection] = {
+                document["_id"]: document
+                for document in self.db[collection].find(filter or {}, projection)
+            }
+        return self.documents[collection]
+
+    def find(self, collection, **fields):
+        return [
+            document
+            for document in self.load(collection).values()
+            if all(document.get(k) == v for k, v in fields.items())
+        ]
+
+    def index(self, collection, key, **fields):
+        """
+        Output:
+            - index: {document[key]: document} of the documents matching fields
+        """
+        return {
+            document.get(key): document for document in self.find(collection, **fields)
+        }
+
+    def upsert(self, collection, document, set_fields=()):
+        self.writer.upsert(collection, document, set_fields)
+        self.upserted.setdefault(collection, []).append(document)
+
+    def update(self, collection, document, fields):
+        """
+        Set fields on a cached document, in the db and, once flushed, in the
+        cache
+        """
+        self.writer.update(
+            collection,
+            {"_id": document["_id"]},
+            {"$set": fields},
+            applied=lambda: document.update(fields),
+        )
+
+    def set_fields(self, collection, ids, fields):
+        def applied(ids_chunk):
+            for _id in ids_chunk:
+                if _id in self.documents.get(collection, {}):
+                    self.documents[collection][_id].update(fields)
+
+        self.writer.set_fields(collection, ids, fields, applied)
+
+    def flush(self, collection=None):
+        """
+        Flush the buffered writes and apply the written ones to the cache
+        Output:
+            - counts: dict of inserted, matched, modified and failed writes
+        """
+        counts = self.writer.flush(collection)
+        collections = (
+            [collection] if collection is not None else list(self.upserted.keys())
+        )
+        for name in collections:
+            for document in self.upserted.pop(name, []):
+                if name in self.documents and "_id" in document:
+                    self.documents[name][document["_id"]] = document
+        return counts
@@ -0,0 +1,204 @@
+import concurrent.futures
+import os
+import re
+
+from bs4 import BeautifulSoup
+from tqdm import tqdm
+
+from instrumentation import http_session
+
+
+### GET ALL COURSES URLS ###
+def get_all_courses_url():
+    URL_ROOT = "https://edu.epfl.ch/"
+    shs = [
+        "https://edu.epfl.ch/studyplan/fr/bachelor/programme-sciences-humaines-et-sociales/",
+        "https://edu.epfl.ch/studyplan/fr/master/programme-sciences-humaines-et-sociales/",
+    ]
+    page = http_session().get(URL_ROOT, timeout=500)
+    soup = BeautifulSoup(page.content, "html.parser")
+    cards = soup.find_all("div", class_="card-title")
+    promos = [card.find("a").get("href") for card in cards]
+    courses_url = []
+    courses_names = []
+    for promo in tqdm(promos):
+        page = http_session().get(URL_ROOT + promo)
+        soup = BeautifulSoup(page.content, "html.parser")
+        sections = [x.get("href") for x in soup.find("main").find("ul").findAll("a")]
+        for section in sections:
+            page = http_session().get(URL_ROOT + section)
+            soup = BeautifulSoup(page.content, "html.parser")
+            for course in soup.find("main").findAll("div", class_="cours-name"):
+                if course.find("a") is not None:
+                    course_url = course.find("a").get("href")
+                    course_name = course_url.split("/").pop()
+                    if (
+                        "programme-sciences-humaines-et-sociales" not in course_url
+                        and course_name not in courses_names
+                    ):
+                        courses_url.append(course_url)
+                        courses_names.append(course_name)
+
+    # Add SHS courses
+    for url in shs:
+        page = http_session().get(url)
+        soup = BeautifulSoup(page.content, "html.parser")
+        for course in soup.find_all("div", class_="cours-name"):
+            if course.find("a") is not None:
+                course_url = course.find("a").get("href")
+                course_name = course_url.split("/").pop()
+                if course_name not in courses_names:
+                    courses_url.append(course_url)
+                    courses_names.append(course_name)
+
+    # Filter duplicates
+    courses_url = list(set(courses_url))
+
+    return courses_url
+
+
+def parse_credits(soup):
+    credits = soup.find("div", class_="course-summary")
+    if credits is None:
+        return None
+
+    credits = credits.findAll("p")
+    if len(credits) == 0:
+        return None
+
+    credits = credits[0].text.split("/")
+    if len(credits) == 0:
+        return None
+
+    credits = re.findall(r"\d+", credits[1])
+    if len(credits) == 0:
+        return None
+
+    return int(credits[0])
+
+
+### PARSE COURSE ###
+def parse_course(url):
+    page = http_session().get(url, timeout=(500, 500))
+    if page.status_code == 404:
+        print(f"404: {url}")
+        return None
+
+    return parse_course_content(page.content, url)
+
+
+def parse_course_content(content, url):
+    """
+    Parse the edu page of a course
+    Input:
+        - content: the page content
+        - url: the edu url of the course
+    Output:
+        - course: the parsed course, None if the page has no course summary
+    """
+    soup = BeautifulSoup(content, "html.parser")
+
+    title = soup.find("main").find("h1").text
+    if soup.find("div", class_="course-summary") is None:
+        print(url)
+        return None
+    code = (
+        soup.find("div", class_="course-summary")
+        .findAll("p")[0]
+        .text.split("/")[0]
+        .strip()
+    )
+    credits = parse_credits(soup)
+    teachers = [
+        (x.text, x.get("href"))
+        for x in soup.find("div", class_="course-summary").findAll("p")[1].findAll("a")
+    ]
+    language = soup.find("div", class_="course-summary").findAll("p")
+    if len(language) > 2:
+        language = language[2].text.split(":")
+        if "Langue" in language[0] and len(language) > 1:
+            language = language[1].strip()
+        else:
+            language = None
+    else:
+        language = None
+
+    studyplans_elements = soup.find("div", class_="study-plans").findAll(
+        "button", class_="collapse-title-desktop"
+    )
+
+    # studyplans_elements are buttons with section name before the xxxx-xxxx years and the semester after
+    re_pattern = r"(\d{4}-\d{4})"
+
+    studyplans = []
+    for studyplan_element in studyplans_elements:
+        studyplan = {}
+        parts = re.split(re_pattern, studyplan_element.text)
+        studyplan["section"] = parts[0].strip().replace("\n", " ")
+        studyplan["semester"] = parts[1] + " " + parts[2].strip()
+        studyplans.append(studyplan)
+
+    course = {
+        "name": title,
+        "code": code,
+        "credits": credits,
+        "studyplans": studyplans,
+        "teachers": teachers,
+        "edu_url": url,
+        "language": language,
+    }
+
+    return course
+
+
+### PARSE ALL COURSES ###
+def parse_all_courses():
+    URL_ROOT = "https://edu.epfl.ch"
+    print("Getting all courses urls...")
+    courses_url = get_all_courses_url()
+    print(f"- {len(courses_url)} courses urls found")
+
+    courses = []
+    print("Parsing courses...")
+
+    # Use ThreadPoolExecutor to parse courses concurrently
+    with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        # Submit all the tasks to the executor
+        future_to_url = {
+            executor.submit(parse_course, URL_ROOT + url): url for url in courses_url
+        }
+
+        # Process the completed futures
+        for future in tqdm(
+            concurrent.futures.as_completed(future_to_url), total=len(courses_url)
+        ):
+            url = future_to_url[future]
+            try:
+                course = future.result()
+                if course is not None:
+                    courses.append(course)
+            except Exception as exc:
+                print(f"Course {url} generated an exception: {exc}")
+
+    print(f"- {len(courses)} courses parsed")
+    return courses
+
+
+### FILTER DUPLICATES COURSES ###
+def filter_duplicates_courses(courses):
+    """
+    Filter duplicates courses
+    Input:
+        - courses: a list of courses
+    Output:
+        - filtered_courses: a list of courses without duplicates
+    """
+    filtered_courses = []
+    course_codes = set()
+    for course in courses:
+        course_code = course.get("code")
+
+        if course_code not in course_codes:
+            course_codes.add(course_code)
+            filtered_courses.append(course)
+    return filtered_courses
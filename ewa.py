@@ -0,0 +1,304 @@
+import json
+from datetime import datetime, timedelta
+
+from tqdm import tqdm
+
+from config import MAP_ROOMS
+from db_utils import BulkWriter
+from instrumentation import http_session
+
+### MEETINGS ###
+
+
+def query_force(query, max_retry=50):
+    for _ in range(max_retry):
+        response = query()
+        if not response:
+            continue
+        if response.status_code == 200:
+            return response
+    return None
+
+
+def parse_events(response):
+    if not response or not response.text:
+        print("No response")
+        return []
+
+    events_line = response.text.split("0|")[1]
+
+    print(response.text)
+
+    if not events_line:
+        print("No events line")
+        return []
+
+    # Do a little bit of parsing
+    room_occupancy = (
+        events_line.replace(";", "")
+        .replace('\\"', "")
+        .replace("<br>", "")
+        .replace("ISA - ", "")
+        .replace("\\", "")
+    )
+
+    parsed_room_occupancy = json.loads(room_occupancy)["Events"]
+
+    events_tags = ["Evénements", "Réservation académique", "Réservation ponctuelle"]
+
+    # Filter events based on the specified tags
+    filtered_events = [
+        event for event in parsed_room_occupancy if event["Text"] in events_tags
+    ]
+
+    # Keep only the relevant fields
+    filtered_events = [
+        {k: event[k] for k in ["Text", "Start", "End"]} for event in filtered_events
+    ]
+
+    return filtered_events
+
+
+def parse_room_events(room_name, start_date, end_date):
+    asp_net_cookie = get_asp_net_cookie(room_name)
+    headers = {
+        "Connection": "keep-alive",
+        "Content-Type": "application/x-www-form-urlencoded; charset=utf-8",
+        "Cookie": f"ASP.NET_SessionId={asp_net_cookie}; petitpois=dismiss;",
+        "Origin": "https://ewa.epfl.ch",
+        "Referer": f"https://ewa.epfl.ch/room/Default.aspx?room={room_name}",
+    }
+
+    response = query_force(
+        lambda: query_room(room_name, start_date, end_date, headers), max_retry=200
+    )
+
+    if not response:
+        print(f"No response for {room_name}")
+        return []
+    return parse_events(response)
+
+
+def parse_next_week(room_name):
+    start_date = datetime.now()
+    # start_date to begin of the week
+    begin_of_week = start_date - timedelta(days=start_date.weekday())
+    start_date = begin_of_week + timedelta(days=7)
+    end_date = start_date + timedelta(days=7)
+    start_date = start_date.strftime("%Y-%m-%dT%H:%M:%S")
+    end_date = end_date.strftime("%Y-%m-%dT%H:%M:%S")
+
+    asp_net_cookie = get_asp_net_cookie(room_name)
+    headers = {
+        "Connection": "keep-alive",
+        "Content-Type": "application/x-www-form-urlencoded; charset=utf-8",
+        "Cookie": f"ASP.NET_SessionId={asp_net_cookie}; petitpois=dismiss;",
+        "Origin": "https://ewa.epfl.ch",
+        "Referer": f"https://ewa.epfl.ch/room/Default.aspx?room={room_name}",
+    }
+
+    response = query_force(
+        lambda: query_room(room_name, start_date, end_date, headers), max_retry=100
+    )
+    if not response:
+        print(f"No response for {room_name}")
+        return []
+    return parse_events(response)
+
+
+def get_asp_net_cookie(room_name):
+    response = query_force(
+        lambda: http_session().get(
+            f"https://ewa.epfl.ch/room/Default.aspx?room={room_name}"
+        ),
+        max_retry=100,
+    )
+
+    if not response:
+        print("No response")
+        return None
+    if response.status_code == 200:
+        cookies = response.cookies
+        return cookies.get("ASP.NET_SessionId", None)
+    return None
+
+
+def query_room(room_name, start_date, end_date, headers):
+    # generate columns values for the request (for the 7 days starting from start_date)
+    columns = []
+    start_datetime = datetime.strptime(start_date, "%Y-%m-%dT%H:%M:%S")
+    for i in range(7):
+        day = start_datetime + timedelta(days=i)
+        columns.append(
+            {
+                "Value": None,
+                "Name": day.strftime("%d.%m.%Y"),
+                "ToolTip": None,
+                "Date": day.strftime("%Y-%m-%dT00:00:00"),
+                "Children": [],
+            }
+        )
+
+    data = {
+        "MIME Type": "application/x-www-form-urlencoded; charset=UTF-8",
+        "__EVENTTARGET": "",
+        "__EVENTARGUMENT": "",
+        "__VIEWSTATE": "/wEPDwUKMTM5ODM2NTk2OQ9kFgJmD2QWAgIFD2QWBAIBD2QWBgIBDw8WAh4EVGV4dAUEQkMwMWRkAgMPDxYCHgtfIURhdGFCb3VuZGdkZAIFDw8WBh4JVGFnRmllbGRzFQIEbmFtZQJpZB8BZx4JU3RhcnREYXRlBgCAPrfdMNwIZGQCAw8PFgIfAAUEMjAyNGRkZBcDZBZ3ATHldACedIUzjN5kMtI2cxXWLlr1+Lr9oP0L",
+        "__VIEWSTATEGENERATOR": "CC8E5E3B",
+        "__CALLBACKID": "ctl00$ContentPlaceHolder1$DayPilotCalendar1",
+        "__CALLBACKPARAM": """JSON{"action":"Command","parameters":{"command":"navigate"},"data":{"start":"2024-02-26T00:00:00","end":"2024-03-04T00:00:00","days":7},"header":{"control":"dpc","id":"ContentPlaceHolder1_DayPilotCalendar1","clientState":{},"columns":[{"Value":null,"Name":"19.02.2024","ToolTip":null,"Date":"2024-02-19T00:00:00","Children":[]},{"Value":null,"Name":"20.02.2024","ToolTip":null,"Date":"2024-02-20T00:00:00","Children":[]},{"Value":null,"Name":"21.02.2024","ToolTip":null,"Date":"2024-02-21T00:00:00","Children":[]},{"Value":null,"Name":"22.02.2024","ToolTip":null,"Date":"2024-02-22T00:00:00","Children":[]},{"Value":null,"Name":"23.02.2024","ToolTip":null,"Date":"2024-02-23T00:00:00","Children":[]},{"Value":null,"Name":"24.02.2024","ToolTip":null,"Date":"2024-02-24T00:00:00","Children":[]},{"Value":null,"Name":"25.02.2024","ToolTip":null,"Date":"2024-02-25T00:00:00","Children":[]}],"days":7,"startDate":"2024-02-19T00:00:00","cellDuration":30,"heightSpec":"BusinessHours","businessBeginsHour":7,"businessEndsHour":20,"viewType":"Days","dayBeginsHour":0,"dayEndsHour":0,"headerLevels":1,"backColor":"White","nonBusinessBackColor":"White","eventHeaderVisible":true,"timeFormat":"Clock12Hours","showAllDayEvents":true,"tagFields":["name","id"],"hourNameBackColor":"#F3F3F9","hourFontFamily":"Tahoma,Verdana,Sans-serif","hourFontSize":"16pt","hourFontColor":"#42658C","selected":"","hashes":{"callBack":"PFfUEJ3wrfDg2Gfp/oBSL89g8Kc=","columns":"bzP1mnnwN+umsglYKroAi3JEFP4=","events":"xVFNXcegBTUqJf6sHwhHjX6e88g=","colors":"u6JkuOn4xmGT35AnGNQ0dmPOOqk=","hours":"K+iMpCQsduglOsYkdIUQZQMtaDM=","corner":"0XBQYL2rjFh+nn9As5pzf4+hWqg="}}}""",
+    }
+
+    response = http_session().post(
+        "https://ewa.epfl.ch/room/Default.aspx", headers=headers, data=data
+    )
+
+    return response
+
+
+def populate_events_room(db, parsed_events):
+    db_rooms = list(db.rooms.find({"available": True}))
+
+    new_events = []
+    for event in tqdm(parsed_events, total=len(parsed_events)):
+        room_name = event["room"]
+        if room_name in MAP_ROOMS:
+            room_name = MAP_ROOMS[room_name]
+
+        if isinstance(room_name, list):
+            for room_name_sub in room_name:
+                room = list(filter(lambda x: x["name"] == room_name_sub, db_rooms))
+                if len(room) == 0:
+                    print(f"Room {room_name_sub} not found in db")
+                    continue
+                room = room[0]
+                new_event = event
+                new_event["room"] = room["_id"]
+                new_events.append(new_event)
+        else:
+            room = list(filter(lambda x: x["name"] == room_name, db_rooms))
+            if len(room) == 0:
+                print(f"Room {room_name} not found in db")
+                continue
+            room = room[0]
+            new_event = event
+            new_event["room"] = room["_id"]
+            new_events.append(new_event)
+
+    return new_events
+
+
+def create_event_bookings(db, parsed_events):
+    # Available bookings by their unique key (see UNIQUE_KEYS)
+    db_bookings_keys = {
+        (
+            db_booking["room_id"],
+            db_booking["start_datetime"],
+            db_booking["end_datetime"],
+            db_booking["name"],
+        )
+        for db_booking in db.event_bookings.find(
+            {"available": True},
+            {"room_id": 1, "start_datetime": 1, "end_datetime": 1, "name": 1},
+        )
+    }
+    new_bookings = []
+    for event in tqdm(parsed_events, total=len(parsed_events)):
+        key = (
+            event["room"],
+            event["start_datetime"],
+            event["end_datetime"],
+            event["name"],
+        )
+        if key in db_bookings_keys:
+            continue
+        # Also skips the events parsed twice
+        db_bookings_keys.add(key)
+
+        new_booking = {
+            "room_id": event["room"],
+            "start_datetime": event["start_datetime"],
+            "end_datetime": event["end_datetime"],
+            "name": event["name"],
+            "label": event["label"],
+            "available": True,
+        }
+        new_bookings.append(new_booking)
+
+    if len(new_bookings) == 0:
+        print("No new bookings to create")
+        return None
+    print(f"Creating {len(new_bookings)} new bookings")
+    writer = BulkWriter(db)
+    for new_booking in new_bookings:
+        writer.upsert("event_bookings", new_booking)
+    counts = writer.flush()
+    print(f"- {counts['inserted']} bookings created ({counts['failed']} failed)")
+
+
+def split_date_range(start_date, end_date):
+    """
+    Split a date range into a list of date ranges, each starting at the beginning of a week and ending at the end of a week
+    """
+    date_ranges = []
+
+    current_date = datetime.strptime(start_date, "%Y-%m-%dT%H:%M:%S")
+
+    while current_date <= datetime.strptime(end_date, "%Y-%m-%dT%H:%M:%S"):
+        # Find the beginning of the week
+        begin_of_week = current_date - timedelta(days=current_date.weekday())
+        # Find the end of the week
+        end_of_week = begin_of_week + timedelta(days=7)
+        # Add the date range to the list
+        date_ranges.append((begin_of_week, end_of_week))
+        # Move to the next week
+        current_date = end_of_week + timedelta(days=1)
+    return date_ranges
+
+
+def parse_all_rooms_events(rooms_names, start_date, end_date):
+    parsed_events = []
+
+    date_ranges = split_date_range(start_date, end_date)
+
+    for room_name in tqdm(rooms_names, total=len(rooms_names)):
+        for date_range in tqdm(date_ranges, total=len(date_ranges), leave=False):
+            start_date = date_range[0].strftime("%Y-%m-%dT%H:%M:%S")
+            end_date = date_range[1].strftime("%Y-%m-%dT%H:%M:%S")
+            room_events = parse_room_events(room_name, start_date, end_date)
+            for event in room_events:
+                new_event = {
+                    "room": room_name,
+                    "start_datetime": datetime.strptime(
+                        event["Start"], "%Y-%m-%dT%H:%M:%S"
+                    ),
+                    "end_datetime": datetime.strptime(
+                        event["End"], "%Y-%m-%dT%H:%M:%S"
+                    ),
+                    "name": event["Text"],
+                    "label": "event",
+                    "available": True,
+                }
+                parsed_events.append(new_event)
+
+    return parsed_events
+
+
+def parse_all_rooms_next_week(rooms_names):
+    parsed_events = []
+    for room_name in tqdm(rooms_names, total=len(rooms_names)):
+        room_events = parse_next_week(room_name)
+        for event in room_events:
+            new_event = {
+                "room": room_name,
+                "start_datetime": datetime.strptime(
+                    event["Start"], "%Y-%m-%dT%H:%M:%S"
+                ),
+                "end_datetime": datetime.strptime(event["End"], "%Y-%m-%dT%H:%M:%S"),
+                "name": event["Text"],
+                "label": "event",
+                "available": True,
+            }
+            parsed_events.append(new_event)
+
+    return parsed_events
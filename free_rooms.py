@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from room_occupancy import booked_intervals, occupancy_window
+
+# Offset between the bookings of two rooms in the keys of the index, above
+# any booking time (seconds after the start of the index)
+ROOM_SPAN = 2**40
+
+
+class FreeRoomsIndex:
+    """
+    The bookings of the available rooms over the occupancy window (the
+    current or next semester and the next days), in memory: the overlapping
+    bookings of a room are merged and sorted, and the bookings of all the
+    rooms are kept in one sorted array of keys (room index * ROOM_SPAN +
+    seconds after the start of the window), so that a query for all the
+    rooms is one binary search (numpy.searchsorted) per room.
+    Outside of the window the rooms have no bookings.
+    """
+
+    def __init__(self, rooms, intervals, origin):
+        """
+        Input:
+            - rooms: the rooms documents (name, capacity, building)
+            - intervals: (room_id, start_datetime, end_datetime) of the
+            bookings, the ones of other rooms are ignored
+            - origin: the start of the window
+        """
+        self.rooms = rooms
+        self.origin = origin
+        self.rooms_index = {room["name"]: i for i, room in enumerate(rooms)}
+        self.capacities = np.array([room.get("capacity") or 0 for room in rooms])
+        self.buildings = np.array(
+            [room.get("building") or "" for room in rooms], dtype=object
+        )
+
+        rooms_ids = {room["_id"]: i for i, room in enumerate(rooms)}
+        rooms_intervals = [[] for _ in rooms]
+        for room_id, start, end in intervals:
+            if room_id in rooms_ids:
+                rooms_intervals[rooms_ids[room_id]].append(
+                    (self.seconds(start), self.seconds(end))
+                )
+
+        starts, ends, offsets = [], [], [0]
+        for room_intervals in rooms_intervals:
+            room_start = len(starts)
+            for start, end in sorted(room_intervals):
+                if len(starts) > room_start and start <= ends[-1]:
+                    ends[-1] = max(ends[-1], end)
+                elif start < end:
+                    starts.append(start)
+                    ends.append(end)
+            offsets.append(len(starts))
+
+        self.starts = np.array(starts, dtype=np.int64)
+        self.ends = np.array(ends, dtype=np.int64)
+        self.offsets = np.array(offsets, dtype=np.int64)
+        rooms_keys = np.repeat(np.arange(len(rooms), dtype=np.int64), np.diff(offsets))
+        # A last key past all the rooms, the one found when a room has no
+        # booking after the searched time
+        self.start_keys = np.append(
+            rooms_keys * ROOM_SPAN + self.starts, np.iinfo(np.int64).max
+        )
+        self.end_keys = rooms_keys * ROOM_SPAN + self.ends
+
+    @classmethod
+    def load(cls, db, today=None):
+        """
+        Output:
+            - index: the index of the available rooms and of their course and
+            event bookings over the occupancy window
+        """
+        start, days = occupancy_window(db, today)
+        rooms = list(
+            db.rooms.find(
+                {"available": True},
+                {"name": 1, "capacity": 1, "building": 1, "coordinates": 1},
+            )
+        )
+        intervals = booked_intervals(db, start, start + timedelta(days=days))
+        return cls(rooms, intervals, start)
+
+    def seconds(self, date):
+        return min(max((date - self.origin) // timedelta(seconds=1), 0), ROOM_SPAN - 1)
+
+    def to_datetime(self, seconds):
+        return self.origin + timedelta(seconds=int(seconds))
+
+    def candidates(self, min_capacity=None, building=None):
+        """
+        Output:
+            - candidates: indices of the rooms with the capacity and building
+        """
+        mask = np.ones(len(self.rooms), dtype=bool)
+        if min_capacity is not None:
+            mask &= self.capacities >= min_capacity
+        if building is not None:
+            mask &= self.buildings == building
+        return np.flatnonzero(mask)
+
+    def free_mask(self, candidates, start, end):
+        """
+        Output:
+            - free: whether each of the candidates has no booking overlapping
+            [start, end)
+        """
+        rooms_keys = candidates * ROOM_SPAN
+        # The first booking of each room ending after start, free if it is
+        # the one of a next room or starts at or after end
+        first = np.searchsorted(
+            self.end_keys, rooms_keys + self.seconds(start), side="right"
+        )
+        return (first >= self.offsets[candidates + 1]) | (
+            self.start_keys[first] >= rooms_keys + self.seconds(end)
+        )
+
+    def find_free_rooms(self, start, end, min_capacity=None, building=None):
+        """
+        Input:
+            - start, end: the datetime range the rooms should be free
+            - min_capacity: the minimum capacity of the rooms (optional)
+            - building: the building of the rooms (optional)
+        Output:
+            - rooms: the free rooms documents
+        """
+        candidates = self.candidates(min_capacity, building)
+        free = self.free_mask(candidates, start, end)
+        return [self.rooms[i] for i in candidates[free]]
+
+    def next_free_slot(self, room, after=None, duration=timedelta(minutes=1)):
+        """
+        Input:
+            - room: the name of the room
+            - after: the datetime to search from (default now)
+            - duration: the minimum duration of the slot
+        Output:
+            - start, end: the first slot of the room free for duration, end is
+            None when there is no booking after it
+        """
+        i = self.rooms_index[room]
+        starts = self.starts[self.offsets[i] : self.offsets[i + 1]]
+        ends = self.ends[self.offsets[i] : self.offsets[i + 1]]
+        after = self.seconds(after or datetime.now())
+
+        # The free gaps from after: until the next booking, then between the
+        # following ones, the last one unbounded
+        first = np.searchsorted(ends, after, side="right")
+        gaps_starts = np.maximum(np.append(after, ends[first:]), after)
+        gaps_ends = np.append(starts[first:], np.iinfo(np.int64).max)
+        fits = gaps_ends - gaps_starts >= duration // timedelta(seconds=1)
+        gap = int(np.argmax(fits))
+        end = None if gap == len(gaps_ends) - 1 else self.to_datetime(gaps_ends[gap])
+        return self.to_datetime(gaps_starts[gap]), end
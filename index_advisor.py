@@ -0,0 +1,308 @@
+import logging
+import sys
+from datetime import timedelta
+
+import fire
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+from config import local_today
+from db_utils import client_options, init
+from indexes import INDEXES
+from settings import Settings
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+### QUERIES ###
+# The queries of the scraper and of the backend: (name, collection, query).
+# A query gets sample values from the DB and returns the find filter (and
+# sort), the aggregate pipeline or the distinct key and filter to explain.
+# The full collection reads of RunContext are scans by design, not listed.
+QUERIES = [
+    (
+        "current semester of a type",
+        "semesters",
+        lambda s: {
+            "filter": {"end_date": {"$gte": s["today"]}, "type": "fall"},
+            "sort": [("end_date", 1)],
+        },
+    ),
+    (
+        "current semester",
+        "semesters",
+        lambda s: {
+            "filter": {
+                "start_date": {"$lte": s["today"]},
+                "end_date": {"$gte": s["today"]},
+                "type": {"$ne": "year"},
+            }
+        },
+    ),
+    (
+        "next semester",
+        "semesters",
+        lambda s: {
+            "filter": {"start_date": {"$gte": s["today"]}, "type": {"$ne": "year"}},
+            "sort": [("start_date", 1)],
+        },
+    ),
+    (
+        "semesters studyplans",
+        "studyplans",
+        lambda s: {
+            "pipeline": [{"$match": {"semester_id": {"$in": [s["semester_id"]]}}}]
+        },
+    ),
+    (
+        "studyplan planned_in",
+        "planned_in",
+        lambda s: {"filter": {"studyplan_id": s["studyplan_id"]}},
+    ),
+    (
+        "courses schedules",
+        "course_schedules",
+        lambda s: {"filter": {"course_id": {"$in": [s["course_id"]]}}},
+    ),
+    (
+        "scheduled courses",
+        "course_schedules",
+        lambda s: {
+            "distinct": "course_id",
+            "filter": {
+                "course_id": {"$in": [s["course_id"]]},
+                "available": True,
+                "start_datetime": {"$gte": s["today"], "$lte": s["next_week"]},
+            },
+        },
+    ),
+    (
+        "available schedules",
+        "course_schedules",
+        lambda s: {"filter": {"available": True}},
+    ),
+    (
+        "available bookings",
+        "course_bookings",
+        lambda s: {"filter": {"available": True}},
+    ),
+    (
+        "unavailable bookings",
+        "course_bookings",
+        lambda s: {"filter": {"available": False}},
+    ),
+    (
+        "schedules bookings",
+        "course_bookings",
+        lambda s: {
+            "filter": {"schedule_id": {"$in": [s["schedule_id"]]}, "available": True}
+        },
+    ),
+    (
+        "available events",
+        "event_bookings",
+        lambda s: {"filter": {"available": True}},
+    ),
+    ("available rooms", "rooms", lambda s: {"filter": {"available": True}}),
+    (
+        "rooms near a point",
+        "rooms",
+        lambda s: {
+            "filter": {
+                "coordinates": {"$near": {"$geometry": s["point"], "$maxDistance": 200}}
+            }
+        },
+    ),
+    (
+        "rooms in an area",
+        "rooms",
+        lambda s: {
+            "filter": {
+                "coordinates": {
+                    # Radius in radians, about 640 m
+                    "$geoWithin": {"$centerSphere": [s["point"]["coordinates"], 0.0001]}
+                }
+            }
+        },
+    ),
+    # Backend
+    (
+        "semester studyplans",
+        "studyplans",
+        lambda s: {"filter": {"available": True, "semester_id": s["semester_id"]}},
+    ),
+    (
+        "studyplan courses",
+        "planned_in",
+        lambda s: {"filter": {"available": True, "studyplan_id": s["studyplan_id"]}},
+    ),
+    (
+        "week schedules",
+        "course_schedules",
+        lambda s: {
+            "filter": {
+                "available": True,
+                "start_datetime": {"$gte": s["today"], "$lt": s["next_week"]},
+            }
+        },
+    ),
+    (
+        "room bookings",
+        "course_bookings",
+        lambda s: {"filter": {"available": True, "room_id": s["room_id"]}},
+    ),
+    (
+        "room events",
+        "event_bookings",
+        lambda s: {
+            "filter": {
+                "room_id": s["room_id"],
+                "available": True,
+                "start_datetime": {"$lt": s["next_week"]},
+                "end_datetime": {"$gt": s["today"]},
+            }
+        },
+    ),
+]
+
+
+def sample_values(db):
+    """
+    Output:
+        - samples: values of the DB to fill the queries with
+    """
+
+    def sample_id(collection):
+        document = db[collection].find_one({}, {"_id": 1})
+        return document["_id"] if document is not None else None
+
+    today = local_today()
+    return {
+        "today": today,
+        "next_week": today + timedelta(days=7),
+        "semester_id": sample_id("semesters"),
+        "studyplan_id": sample_id("studyplans"),
+        "course_id": sample_id("courses"),
+        "schedule_id": sample_id("course_schedules"),
+        "room_id": sample_id("rooms"),
+        # EPFL campus, if no room has coordinates
+        "point": (db.rooms.find_one({"coordinates.type": "Point"}) or {}).get(
+            "coordinates", {"type": "Point", "coordinates": [6.5668, 46.5191]}
+        ),
+    }
+
+
+### EXPLAIN ###
+def explain(db, collection, query):
+    if "pipeline" in query:
+        return db.command(
+            "aggregate", collection, pipeline=query["pipeline"], explain=True
+        )
+    if "distinct" in query:
+        return db.command(
+            "explain",
+            {
+                "distinct": collection,
+                "key": query["distinct"],
+                "query": query["filter"],
+            },
+            verbosity="executionStats",
+        )
+    return db[collection].find(query["filter"], sort=query.get("sort")).explain()
+
+
+def plan_summary(explain_output):
+    """
+    Output:
+        - summary: stages and indexes of the winning plan (the rejected plans
+        are skipped) and the documents examined
+    """
+    stages = set()
+    indexes = set()
+    docs_examined = 0
+
+    def walk(node, in_plan):
+        nonlocal docs_examined
+        if isinstance(node, list):
+            for item in node:
+                walk(item, in_plan)
+        if not isinstance(node, dict):
+            return
+        for key, value in node.items():
+            if key in ("rejectedPlans", "allPlansExecution"):
+                continue
+            if in_plan and key == "stage" and isinstance(value, str):
+                stages.add(value)
+            if in_plan and key == "indexName":
+                indexes.add(value)
+            if key == "totalDocsExamined":
+                docs_examined = max(docs_examined, value)
+            walk(value, in_plan or key in ("winningPlan", "executionStats"))
+
+    walk(explain_output, False)
+    return {"stages": stages, "indexes": indexes, "docs_examined": docs_examined}
+
+
+def missing_indexes(db):
+    """
+    Output:
+        - missing: (collection, index name) of INDEXES not in the DB
+    """
+    missing = []
+    for collection, indexes in INDEXES.items():
+        existing = db[collection].index_information()
+        for _, options in indexes:
+            if options["name"] not in existing:
+                missing.append((collection, options["name"]))
+    return missing
+
+
+def main(apply: bool = False, min_documents: int = 1000, fail: bool = False) -> None:
+    """
+    Explain the queries of the scraper and of the backend and flag the
+    collection scans
+
+    Args:
+        apply: create the indexes of indexes.py first (through init)
+        min_documents: only flag the scans of collections at least this big
+        fail: exit with an error if a scan is flagged
+    """
+    settings = Settings()
+    client: MongoClient = MongoClient(
+        settings.connection_string, **client_options(settings)
+    )
+    db = client.get_database(settings.DB_NAME)
+
+    if apply:
+        # Forced, an index dropped by hand does not change the schema hash
+        init(db, force=True)
+    for collection, name in missing_indexes(db):
+        logger.warning(f"Index {name} of {collection} is missing (run with --apply)")
+
+    samples = sample_values(db)
+    flagged = []
+    print(f"{'query':<30}{'collection':<18}{'docs':>9}{'examined':>10}  plan")
+    for name, collection, query in QUERIES:
+        summary = plan_summary(explain(db, collection, query(samples)))
+        documents = db[collection].estimated_document_count()
+        scan = "COLLSCAN" in summary["stages"]
+        plan = "COLLSCAN" if scan else f"IXSCAN {', '.join(sorted(summary['indexes']))}"
+        if scan and documents >= min_documents:
+            flagged.append(name)
+            plan += "  <- add an index in indexes.py"
+        print(
+            f"{name:<30}{collection:<18}{documents:>9}"
+            f"{summary['docs_examined']:>10}  {plan}"
+        )
+
+    if flagged:
+        logger.warning(f"{len(flagged)} queries scan their collection")
+        if fail:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
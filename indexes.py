@@ -0,0 +1,126 @@
+import pymongo
+
+# Indexes (keys, options) of each collection, created by db_utils.init. The
+# unique ones are the upsert keys (see db_utils.UNIQUE_KEYS), the others
+# serve the queries of the scraper and of the backend (see index_advisor.py).
+INDEXES = {
+    "rooms": [
+        ([("name", pymongo.ASCENDING)], {"name": "room_name", "unique": True}),
+        # $near and $geoWithin queries on the GeoJSON Points, the rooms
+        # without coordinates are not indexed
+        ([("coordinates", pymongo.GEOSPHERE)], {"name": "room_coordinates"}),
+    ],
+    "teachers": [
+        ([("name", pymongo.ASCENDING)], {"name": "teacher_unique", "unique": True}),
+    ],
+    "courses": [
+        ([("code", pymongo.ASCENDING)], {"name": "course_unique", "unique": True}),
+    ],
+    "course_bookings": [
+        (
+            [("schedule_id", pymongo.ASCENDING), ("room_id", pymongo.ASCENDING)],
+            {"name": "booking_unique", "unique": True},
+        ),
+        # Available bookings, of a room
+        (
+            [("available", pymongo.ASCENDING), ("room_id", pymongo.ASCENDING)],
+            {"name": "booking_available"},
+        ),
+    ],
+    "course_schedules": [
+        (
+            [
+                ("course_id", pymongo.ASCENDING),
+                ("start_datetime", pymongo.ASCENDING),
+                ("end_datetime", pymongo.ASCENDING),
+                ("label", pymongo.ASCENDING),
+            ],
+            {"name": "schedule_unique", "unique": True},
+        ),
+        # Available schedules, in a date range
+        (
+            [("available", pymongo.ASCENDING), ("start_datetime", pymongo.ASCENDING)],
+            {"name": "schedule_available"},
+        ),
+    ],
+    "studyplans": [
+        (
+            [("unit_id", pymongo.ASCENDING), ("semester_id", pymongo.ASCENDING)],
+            {"name": "studyplan_unique", "unique": True},
+        ),
+        # Studyplans of the semesters (find_semester_courses), available ones
+        (
+            [("semester_id", pymongo.ASCENDING), ("available", pymongo.ASCENDING)],
+            {"name": "studyplan_semester"},
+        ),
+    ],
+    "units": [
+        ([("name", pymongo.ASCENDING)], {"name": "unit_unique", "unique": True}),
+    ],
+    "semesters": [
+        ([("name", pymongo.ASCENDING)], {"name": "semester_unique", "unique": True}),
+        # Current or next semester of a type (get_current_or_next_semester)
+        (
+            [("type", pymongo.ASCENDING), ("end_date", pymongo.ASCENDING)],
+            {"name": "semester_type_end"},
+        ),
+        (
+            [("type", pymongo.ASCENDING), ("start_date", pymongo.ASCENDING)],
+            {"name": "semester_type_start"},
+        ),
+    ],
+    "planned_in": [
+        # Its studyplan_id prefix also serves {available, studyplan_id}
+        (
+            [("studyplan_id", pymongo.ASCENDING), ("course_id", pymongo.ASCENDING)],
+            {"name": "planned_in_unique", "unique": True},
+        ),
+    ],
+    "event_bookings": [
+        # The upsert key of create_event_bookings, not partial: the upsert
+        # filter has no available condition
+        (
+            [
+                ("room_id", pymongo.ASCENDING),
+                ("start_datetime", pymongo.ASCENDING),
+                ("end_datetime", pymongo.ASCENDING),
+                ("name", pymongo.ASCENDING),
+            ],
+            {"name": "event_booking_unique", "unique": True},
+        ),
+        # Available events (create_event_bookings)
+        ([("available", pymongo.ASCENDING)], {"name": "event_booking_available"}),
+        # Available events of a room in a date range, the unavailable ones are
+        # never looked up by room
+        (
+            [
+                ("room_id", pymongo.ASCENDING),
+                ("start_datetime", pymongo.ASCENDING),
+                ("end_datetime", pymongo.ASCENDING),
+            ],
+            {
+                "name": "event_booking_room",
+                "partialFilterExpression": {"available": True},
+            },
+        ),
+    ],
+    "room_occupancy": [
+        # Also serves the reads of all the rooms of a day
+        (
+            [("date", pymongo.ASCENDING), ("room_id", pymongo.ASCENDING)],
+            {"name": "room_occupancy_unique", "unique": True},
+        ),
+    ],
+    "room_geometry": [
+        (
+            [("room_id", pymongo.ASCENDING)],
+            {"name": "room_geometry_unique", "unique": True},
+        ),
+    ],
+    "building_geometry": [
+        (
+            [("building", pymongo.ASCENDING)],
+            {"name": "building_geometry_unique", "unique": True},
+        ),
+    ],
+}
@@ -0,0 +1,392 @@
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlparse
+
+import bson
+from pymongo import monitoring
+
+from profiling import (
+    PROFILE_ENV,
+    PROFILES_DIR,
+    RSS_SAMPLER_THREAD,
+    SamplingProfiler,
+    collapsed,
+    flamegraph_svg,
+    read_collapsed,
+)
+
+# Directory of the JSON run reports
+REPORTS_DIR = "run_reports"
+
+# Period of the RSS sampling during a stage (seconds)
+RSS_SAMPLING_PERIOD = 0.05
+
+
+### MEMORY ###
+def current_rss_mb():
+    """
+    Resident memory of the process in MB (falls back to the peak if /proc is
+    not available)
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024**2
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb(children=False):
+    """
+    Peak resident memory of the process in MB, or with children the one of
+    its largest terminated child (e.g. a parse worker), not a sum: the peaks
+    of the process and of its children are not simultaneous
+    """
+    rss = resource.getrusage(
+        resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    ).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB on Linux
+    return rss / 1024**2 if sys.platform == "darwin" else rss / 1024
+
+
+def cpu_seconds():
+    """
+    CPU time (user + system) of the process and of its terminated children,
+    e.g. the workers of a closed multiprocessing pool
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime + children.ru_utime + children.ru_stime
+
+
+### STAGES ###
+class Stage:
+    """
+    Measures of one stage of a run, the stage code sets items_in and
+    items_out
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.wall_s = 0.0
+        self.cpu_s = 0.0
+        self.peak_rss_mb = 0.0
+        self.items_in = None
+        self.items_out = None
+        self.http = defaultdict(lambda: {"requests": 0, "bytes": 0})
+        self.db = defaultdict(lambda: {"operations": 0, "documents": 0, "bytes": 0})
+        self.commands = Counter()
+
+    @property
+    def round_trips(self):
+        return sum(collection["operations"] for collection in self.db.values())
+
+    def merge(self, other):
+        """
+        Add the HTTP and DB counters of a nested stage
+        """
+        for host, counters in other.http.items():
+            for key, value in counters.items():
+                self.http[host][key] += value
+        for collection, counters in other.db.items():
+            for key, value in counters.items():
+                self.db[collection][key] += value
+        self.commands.update(other.commands)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "wall_s": round(self.wall_s, 3),
+            "cpu_s": round(self.cpu_s, 3),
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "http": dict(self.http),
+            "db": dict(self.db),
+            "commands": dict(self.commands),
+        }
+
+
+# Stage currently running, the HTTP requests and DB commands (from any
+# thread) are attributed to it
+_current_stage: Stage | None = None
+_lock = threading.Lock()
+
+
+def current_stage():
+    return _current_stage
+
+
+### HTTP ###
+# Response hooks of the sessions of http_session, shared by all of them: the
+# hook of a RunReport counts the requests of the sessions already created,
+# until the report is closed
+http_response_hooks: list = []
+
+
+def http_session():
+    """
+    Output:
+        - session: a requests Session counted by the open RunReports
+    """
+    # requests is only imported by the download threads, not by the parse
+    # workers started with the spawn or forkserver methods
+    import requests
+
+    session = requests.Session()
+    session.hooks["response"] = http_response_hooks
+    return session
+
+
+### DB ###
+# Reply fields holding the documents returned or written by a command
+REPLY_DOCUMENTS = {
+    "find": lambda reply: len(reply.get("cursor", {}).get("firstBatch", [])),
+    "getMore": lambda reply: len(reply.get("cursor", {}).get("nextBatch", [])),
+    "aggregate": lambda reply: len(reply.get("cursor", {}).get("firstBatch", [])),
+    "insert": lambda reply: reply.get("n", 0),
+    "update": lambda reply: reply.get("n", 0),
+    "delete": lambda reply: reply.get("n", 0),
+    "count": lambda reply: 1,
+    "distinct": lambda reply: len(reply.get("values", [])),
+}
+
+
+class StageCommandListener(monitoring.CommandListener):
+    """
+    Attribute the DB commands, their documents and their BSON bytes (sent and
+    received) to the current stage, by collection and by command name. Passed
+    to the client by init_and_connect.
+    """
+
+    def __init__(self):
+        self.pending = {}
+
+    def started(self, event):
+        stage = _current_stage
+        if stage is None:
+            return
+        collection = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        if not isinstance(collection, str):
+            collection = f"${event.command_name}"
+        size = len(bson.encode(event.command))
+        with _lock:
+            stage.db[collection]["operations"] += 1
+            stage.db[collection]["bytes"] += size
+            stage.commands[event.command_name] += 1
+            self.pending[event.request_id] = (stage, collection)
+
+    def succeeded(self, event):
+        with _lock:
+            stage, collection = self.pending.pop(event.request_id, (None, None))
+        if stage is None:
+            return
+        count = REPLY_DOCUMENTS.get(event.command_name)
+        documents = count(event.reply) if count is not None else 0
+        size = len(bson.encode(event.reply))
+        with _lock:
+            stage.db[collection]["documents"] += documents
+            stage.db[collection]["bytes"] += size
+
+    def failed(self, event):
+        with _lock:
+            self.pending.pop(event.request_id, None)
+
+
+command_listener = StageCommandListener()
+
+
+### ROUND TRIP BUDGETS ###
+class RoundTripBudgetExceeded(Exception):
+    pass
+
+
+@contextmanager
+def round_trip_budget(name, max_round_trips):
+    """
+    Run the body as a nested stage and fail if it used more than
+    max_round_trips DB commands, to catch the loops of per document queries.
+    The counters are added to the enclosing stage.
+    Output:
+        - stage: the Stage measures of the body
+    """
+    global _current_stage
+
+    stage = Stage(name)
+    previous = _current_stage
+    _current_stage = stage
+    try:
+        yield stage
+    finally:
+        _current_stage = previous
+        if previous is not None:
+            with _lock:
+                previous.merge(stage)
+    if max_round_trips is not None and stage.round_trips > max_round_trips:
+        raise RoundTripBudgetExceeded(
+            f"{name}: {stage.round_trips} round trips > {max_round_trips} "
+            f"({dict(stage.commands)})"
+        )
+
+
+### RUN REPORT ###
+class RunReport:
+    """
+    Instrumentation of a pipeline run: every stage run through stage() gets
+    its wall and CPU time, HTTP requests and bytes by host, DB operations,
+    documents and bytes by collection, peak RSS and items in and out. The report is
+    written as JSON by write() and summarized by print_summary(). The DB
+    counters need the client to have command_listener (see init_and_connect).
+    With profile, every stage also runs under a SamplingProfiler (with its
+    worker processes, see start_worker_profiler) and its collapsed stacks and
+    flamegraph are written to the profile directory.
+    Input:
+        - name: the name of the run (e.g. the entry point)
+        - profile: whether to profile the stages
+    """
+
+    def __init__(self, name, profile=False):
+        self.name = name
+        self.started_at = datetime.now()
+        self.stages: list[Stage] = []
+        self.profile_dir = None
+        if profile:
+            timestamp = self.started_at.strftime("%Y%m%d-%H%M%S")
+            self.profile_dir = Path(PROFILES_DIR) / f"{self.name}-{timestamp}"
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+        http_response_hooks.append(self.count_response)
+
+    def count_response(self, response, *args, **kwargs):
+        """
+        Response hook of the sessions: attribute the request and its bytes to
+        the current stage, if it is one of this run
+        """
+        stage = _current_stage
+        if stage is None or stage not in self.stages:
+            return
+        host = urlparse(response.url).hostname or ""
+        size = 0 if kwargs.get("stream") else len(response.content)
+        with _lock:
+            stage.http[host]["requests"] += 1
+            stage.http[host]["bytes"] += size
+
+    def close(self):
+        """
+        Stop counting the HTTP requests of the sessions
+        """
+        if self.count_response in http_response_hooks:
+            http_response_hooks.remove(self.count_response)
+
+    @contextmanager
+    def stage(self, name, items_in=None):
+        """
+        Run the body as a stage of the run
+        Output:
+            - stage: the Stage measures, set its items_out (and items_in)
+        """
+        global _current_stage
+
+        stage = Stage(name)
+        stage.items_in = items_in
+        self.stages.append(stage)
+
+        previous = _current_stage
+        _current_stage = stage
+        sampling = threading.Event()
+        stage.peak_rss_mb = current_rss_mb()
+
+        def sample_rss():
+            while not sampling.wait(RSS_SAMPLING_PERIOD):
+                stage.peak_rss_mb = max(stage.peak_rss_mb, current_rss_mb())
+
+        sampler = threading.Thread(
+            target=sample_rss, name=RSS_SAMPLER_THREAD, daemon=True
+        )
+        sampler.start()
+        profiler = None
+        if self.profile_dir is not None:
+            profile_prefix = self.profile_dir / f"{len(self.stages):02d}-{name}"
+            os.environ[PROFILE_ENV] = str(profile_prefix)
+            profiler = SamplingProfiler(f"{self.name}-{os.getpid()}").start()
+        wall = time.perf_counter()
+        cpu = cpu_seconds()
+        try:
+            yield stage
+        finally:
+            stage.wall_s = time.perf_counter() - wall
+            stage.cpu_s = cpu_seconds() - cpu
+            sampling.set()
+            sampler.join()
+            stage.peak_rss_mb = max(stage.peak_rss_mb, current_rss_mb())
+            _current_stage = previous
+            if profiler is not None:
+                profiler.stop()
+                os.environ.pop(PROFILE_ENV, None)
+                self.write_profile(profile_prefix, profiler.stacks)
+
+    def write_profile(self, prefix, stacks):
+        """
+        Merge the stacks of the stage with the ones of its workers and write
+        them as <prefix>.collapsed and <prefix>.svg
+        """
+        stacks = Counter(stacks)
+        for worker_path in prefix.parent.glob(f"{prefix.name}.*.collapsed"):
+            stacks.update(read_collapsed(worker_path))
+            worker_path.unlink()
+        Path(f"{prefix}.collapsed").write_text(collapsed(stacks))
+        Path(f"{prefix}.svg").write_text(flamegraph_svg(stacks, prefix.name))
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "started_at": self.started_at.isoformat(),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "children_peak_rss_mb": round(peak_rss_mb(children=True), 1),
+            "stages": [stage.to_dict() for stage in self.stages],
+        }
+
+    def write(self, path=None):
+        """
+        Output:
+            - path: the path of the JSON report (by default in REPORTS_DIR)
+        """
+        if path is None:
+            timestamp = self.started_at.strftime("%Y%m%d-%H%M%S")
+            path = Path(REPORTS_DIR) / f"{self.name}-{timestamp}.json"
+        self.close()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), indent=2))
+        return path
+
+    def print_summary(self):
+        header = (
+            f"{'stage':<28}{'wall s':>9}{'cpu s':>9}{'http':>7}{'http MB':>9}"
+            f"{'db ops':>8}{'db docs':>9}{'db MB':>8}{'rss MB':>8}{'in':>8}"
+            f"{'out':>8}"
+        )
+        print(header)
+        print("-" * len(header))
+        for stage in self.stages:
+            http_requests = sum(host["requests"] for host in stage.http.values())
+            http_bytes = sum(host["bytes"] for host in stage.http.values())
+            db_documents = sum(c["documents"] for c in stage.db.values())
+            db_bytes = sum(c["bytes"] for c in stage.db.values())
+            items_in = "" if stage.items_in is None else stage.items_in
+            items_out = "" if stage.items_out is None else stage.items_out
+            print(
+                f"{stage.name:<28}{stage.wall_s:>9.1f}{stage.cpu_s:>9.1f}"
+                f"{http_requests:>7}{http_bytes / 1024**2:>9.1f}"
+                f"{stage.round_trips:>8}{db_documents:>9}{db_bytes / 1024**2:>8.1f}"
+                f"{stage.peak_rss_mb:>8.0f}{items_in:>8}{items_out:>8}"
+            )
@@ -0,0 +1,81 @@
+from pymongo import UpdateOne
+
+# Maximum number of ids per delete_many
+DELETE_CHUNK_SIZE = 1000
+
+
+### MIGRATIONS ###
+# Data migrations of each collection, run by db_utils.init before it applies
+# a new validator and indexes to the collection (only when its schema hash
+# changed, see schema_meta), so they should be idempotent
+def migrate_rooms_coordinates(db):
+    """
+    Rewrite the rooms coordinates stored as (latitude, longitude) pairs as
+    GeoJSON Points (longitude, latitude), before the 2dsphere index (which
+    would read the pairs as (longitude, latitude)) and the validator
+    """
+    updates = [
+        UpdateOne(
+            {"_id": room["_id"]},
+            {
+                "$set": {
+                    "coordinates": {
+                        "type": "Point",
+                        "coordinates": [
+                            float(room["coordinates"][1]),
+                            float(room["coordinates"][0]),
+                        ],
+                    }
+                }
+            },
+        )
+        for room in db.rooms.find(
+            {"coordinates": {"$type": "array"}}, {"coordinates": 1}
+        )
+        if len(room["coordinates"]) == 2
+    ]
+    if len(updates) == 0:
+        return
+    result = db.rooms.bulk_write(updates, ordered=False)
+    print(f"- {result.modified_count} rooms coordinates migrated to GeoJSON")
+
+
+def dedup_event_bookings(db):
+    """
+    Delete the event bookings inserted more than once (same room, start, end
+    and name) before the event_booking_unique index, which cannot be built
+    on duplicates. An available one of each is kept.
+    """
+    keys = ("room_id", "start_datetime", "end_datetime", "name")
+    duplicates = [
+        _id
+        for group in db.event_bookings.aggregate(
+            [
+                {"$sort": {"available": -1, "_id": 1}},
+                {
+                    "$group": {
+                        "_id": {key: f"${key}" for key in keys},
+                        "ids": {"$push": "$_id"},
+                        "count": {"$sum": 1},
+                    }
+                },
+                {"$match": {"count": {"$gt": 1}}},
+            ],
+            allowDiskUse=True,
+        )
+        for _id in group["ids"][1:]
+    ]
+    if len(duplicates) == 0:
+        return
+    deleted = 0
+    for i in range(0, len(duplicates), DELETE_CHUNK_SIZE):
+        deleted += db.event_bookings.delete_many(
+            {"_id": {"$in": duplicates[i : i + DELETE_CHUNK_SIZE]}}
+        ).deleted_count
+    print(f"- {deleted} duplicated event bookings deleted")
+
+
+MIGRATIONS = {
+    "rooms": [migrate_rooms_coordinates],
+    "event_bookings": [dedup_event_bookings],
+}
@@ -18,6 +18,20 @@ room_validator = {
             "capacity": {"bsonType": "int", "description": "must be an integer"},
             "level": {"bsonType": "int", "description": "must be an integer"},
             "building": {"bsonType": "string", "description": "must be a string"},
+            "coordinates": {
+                "bsonType": ["object", "null"],
+                "required": ["type", "coordinates"],
+                "properties": {
+                    "type": {"enum": ["Point"]},
+                    "coordinates": {
+                        "bsonType": "array",
+                        "minItems": 2,
+                        "maxItems": 2,
+                        "items": {"bsonType": "double"},
+                    },
+                },
+                "description": "must be a GeoJSON Point (longitude, latitude)",
+            },
         },
     }
 }
@@ -265,3 +279,72 @@ unit_validator = {
         },
     }
 }
+
+room_occupancy_validator = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["room_id", "date", "slots"],
+        "properties": {
+            "room_id": {
+                "bsonType": "objectId",
+                "description": "must be an objectId and is required",
+            },
+            "date": {
+                "bsonType": "date",
+                "description": "must be a date and is required",
+            },
+            "slots": {
+                "bsonType": "binData",
+                "description": "must be binary data and is required",
+            },
+        },
+    }
+}
+
+room_geometry_validator = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["room_id", "name", "footprint"],
+        "properties": {
+            "room_id": {
+                "bsonType": "objectId",
+                "description": "must be an objectId and is required",
+            },
+            "name": {
+                "bsonType": "string",
+                "description": "must be a string and is required",
+            },
+            "footprint": {
+                "bsonType": "object",
+                "required": ["type", "coordinates"],
+                "properties": {
+                    "type": {"enum": ["Polygon"]},
+                    "coordinates": {"bsonType": "array"},
+                },
+                "description": "must be a GeoJSON Polygon and is required",
+            },
+        },
+    }
+}
+
+building_geometry_validator = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["building", "geojson"],
+        "properties": {
+            "building": {
+                "bsonType": "string",
+                "description": "must be a string and is required",
+            },
+            "geojson": {
+                "bsonType": "object",
+                "required": ["type", "features"],
+                "properties": {
+                    "type": {"enum": ["FeatureCollection"]},
+                    "features": {"bsonType": "array"},
+                },
+                "description": "must be a GeoJSON FeatureCollection and is required",
+            },
+        },
+    }
+}
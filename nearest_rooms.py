@@ -0,0 +1,196 @@
+import math
+from datetime import datetime, timedelta
+
+import fire
+import numpy as np
+from dotenv import load_dotenv
+
+from db_utils import init_and_connect
+from free_rooms import FreeRoomsIndex
+from settings import Settings
+
+load_dotenv()
+
+EARTH_RADIUS_METERS = 6_371_000
+
+# Side of the grid cells, about the size of a building
+GRID_CELL_METERS = 50
+
+
+def is_point(coordinates):
+    """
+    Output:
+        - is_point: whether the coordinates are a GeoJSON Point, the rooms not
+        migrated yet have a [latitude, longitude] list (see migrations)
+    """
+    return isinstance(coordinates, dict) and coordinates.get("type") == "Point"
+
+
+class RoomsGrid:
+    """
+    Uniform grid over the rooms coordinates (the WGS84 centroids of
+    plan.epfl.ch, stored as GeoJSON Points by create_rooms), in meters
+    on a local equirectangular projection, precise at the scale of a campus.
+    The rooms are the ones of a FreeRoomsIndex, in the same order, the ones
+    without coordinates or with legacy ones (not a GeoJSON Point) are left
+    out.
+    """
+
+    def __init__(self, rooms, cell_meters=GRID_CELL_METERS):
+        self.cell_meters = cell_meters
+        located = [
+            i for i, room in enumerate(rooms) if is_point(room.get("coordinates"))
+        ]
+        # GeoJSON (longitude, latitude) to (latitude, longitude)
+        coordinates = np.array(
+            [rooms[i]["coordinates"]["coordinates"][::-1] for i in located],
+            dtype=float,
+        ).reshape(-1, 2)
+        self.origin = coordinates.mean(axis=0) if len(located) else np.zeros(2)
+        self.xs, self.ys = np.full(len(rooms), np.nan), np.full(len(rooms), np.nan)
+        self.xs[located], self.ys[located] = self.project(*coordinates.T)
+
+        cells = {}
+        for i in located:
+            cells.setdefault(self.cell(self.xs[i], self.ys[i]), []).append(i)
+        self.cells = {cell: np.array(indices) for cell, indices in cells.items()}
+
+    def project(self, latitude, longitude):
+        """
+        Output:
+            - x, y: meters east and north of the center of the rooms
+        """
+        x = np.radians(longitude - self.origin[1]) * math.cos(
+            math.radians(self.origin[0])
+        )
+        y = np.radians(latitude - self.origin[0])
+        return x * EARTH_RADIUS_METERS, y * EARTH_RADIUS_METERS
+
+    def cell(self, x, y):
+        return (math.floor(x / self.cell_meters), math.floor(y / self.cell_meters))
+
+    def ring(self, center, radius):
+        """
+        Output:
+            - cells: the cells at radius cells (Chebyshev distance) of center
+        """
+        cx, cy = center
+        if radius == 0:
+            return [center]
+        return [
+            (cx + dx, cy + dy)
+            for dx in range(-radius, radius + 1)
+            for dy in range(-radius, radius + 1)
+            if max(abs(dx), abs(dy)) == radius
+        ]
+
+    def nearest(self, latitude, longitude, count, mask):
+        """
+        Visit the cells in rings around the point until the count nearest
+        rooms are found: the rooms of the cells after ring r are at least
+        r cells away
+        Input:
+            - latitude, longitude: the point
+            - count: the number of rooms
+            - mask: whether each room can be returned
+        Output:
+            - rooms, distances: indices of the count nearest rooms of the
+            mask and their distance (meters), nearest first
+        """
+        x, y = self.project(latitude, longitude)
+        center = self.cell(x, y)
+        if not self.cells:
+            return np.array([], dtype=int), np.array([])
+        last_ring = max(
+            max(abs(cx - center[0]), abs(cy - center[1])) for cx, cy in self.cells
+        )
+
+        rooms, distances = [], []
+        for radius in range(last_ring + 1):
+            for cell in self.ring(center, radius):
+                cell_rooms = self.cells.get(cell)
+                if cell_rooms is None:
+                    continue
+                cell_rooms = cell_rooms[mask[cell_rooms]]
+                rooms.append(cell_rooms)
+                distances.append(
+                    np.hypot(self.xs[cell_rooms] - x, self.ys[cell_rooms] - y)
+                )
+            found = np.concatenate(distances) if distances else np.array([])
+            if len(found) >= count and np.partition(found, count - 1)[count - 1] <= (
+                radius * self.cell_meters
+            ):
+                break
+
+        rooms = np.concatenate(rooms) if rooms else np.array([], dtype=int)
+        distances = np.concatenate(distances) if distances else np.array([])
+        nearest = np.argsort(distances, kind="stable")[:count]
+        return rooms[nearest], distances[nearest]
+
+
+def nearest_free_rooms(
+    index, grid, latitude, longitude, count=5, hours=2, min_capacity=None, start=None
+):
+    """
+    Input:
+        - index: the FreeRoomsIndex of the rooms
+        - grid: the RoomsGrid of the rooms of the index
+        - latitude, longitude: the point (WGS84)
+        - count: the number of rooms
+        - hours: the rooms should be free for the next hours
+        - min_capacity: the minimum capacity of the rooms (optional)
+        - start: the start of the hours (default now)
+    Output:
+        - rooms: (room, distance in meters) of the count nearest rooms free
+        from start for hours, nearest first
+    """
+    start = start or datetime.now()
+    candidates = index.candidates(min_capacity)
+    mask = np.zeros(len(index.rooms), dtype=bool)
+    mask[candidates] = index.free_mask(
+        candidates, start, start + timedelta(hours=hours)
+    )
+    rooms, distances = grid.nearest(latitude, longitude, count, mask)
+    return [
+        (index.rooms[i], float(distance))
+        for i, distance in zip(rooms, distances, strict=True)
+    ]
+
+
+def main(
+    latitude: float,
+    longitude: float,
+    count: int = 5,
+    hours: float = 2,
+    min_capacity: int | None = None,
+) -> None:
+    """
+    Print the nearest rooms free for the next hours
+
+    Args:
+        latitude: latitude of the point (WGS84)
+        longitude: longitude of the point (WGS84)
+        count: number of rooms
+        hours: the rooms should be free for the next hours
+        min_capacity: minimum capacity of the rooms
+    """
+    db = init_and_connect(Settings())
+
+    index = FreeRoomsIndex.load(db)
+    grid = RoomsGrid(index.rooms)
+    rooms = nearest_free_rooms(
+        index, grid, latitude, longitude, count, hours, min_capacity
+    )
+    if not rooms:
+        print("No free room found")
+    for room, distance in rooms:
+        until = index.next_free_slot(room["name"])[1]
+        print(
+            f"{room['name']:<16}{distance:>8.0f} m  capacity "
+            f"{room.get('capacity') or '?':>4}  free until "
+            f"{'the end of the semester' if until is None else f'{until:%a %d.%m %H:%M}'}"
+        )
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -0,0 +1,292 @@
+import functools
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# One row per occurrence, the rooms are stored apart (CSR) in room_offsets and
+# room_indices: the rooms of occurrence i are
+# rooms[room_indices[room_offsets[i] : room_offsets[i + 1]]]
+OCCURRENCE_DTYPE = np.dtype(
+    [
+        ("course", np.int32),  # index in courses_ids
+        ("start", np.int64),  # minutes since 1970-01-01 (naive datetimes)
+        ("duration", np.int32),  # minutes
+        ("label", np.int16),  # index in labels
+    ]
+)
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch_minutes(dt):
+    return (dt - EPOCH) // timedelta(minutes=1)
+
+
+def from_epoch_minutes(minutes):
+    return EPOCH + timedelta(minutes=int(minutes))
+
+
+@functools.lru_cache(maxsize=16)
+def semester_weekdays(start_date, end_date, skip_dates):
+    """
+    Input:
+        - start_date: first day of the semester
+        - end_date: last day of the semester (included)
+        - skip_dates: tuple of the days without courses
+    Output:
+        - weekdays: for each weekday (0 is Monday), the datetime64[D] array of
+        the semester days falling on it, without the skip dates
+    """
+    days = np.arange(
+        np.datetime64(start_date.date(), "D"),
+        np.datetime64(end_date.date(), "D") + np.timedelta64(1, "D"),
+    )
+    skip = np.array([d.date() for d in skip_dates], dtype="datetime64[D]")
+    days = days[~np.isin(days, skip)]
+    # 1970-01-01 was a Thursday
+    weekday = (days.astype(np.int64) + 3) % 7
+    return tuple(days[weekday == day] for day in range(7))
+
+
+@functools.lru_cache(maxsize=1024)
+def weekly_starts(day, start_hour, semester_key):
+    """
+    Start (epoch minutes) of every occurrence of a weekly event, shared by
+    all the events with the same day and start hour in the semester
+    """
+    days = semester_weekdays(*semester_key)[day]
+    starts = days.astype("datetime64[m]").astype(np.int64) + 60 * start_hour
+    starts.flags.writeable = False
+    return starts
+
+
+def semester_key(db_semester):
+    return (
+        db_semester.get("start_date"),
+        db_semester.get("end_date"),
+        tuple(db_semester.get("skip_dates") or ()),
+    )
+
+
+class OccurrenceStore:
+    """
+    Compact store of schedule occurrences backed by NumPy arrays, cheap to
+    pickle between processes. Courses, rooms and labels are interned in
+    small tables and referenced by index. It is the transport format of the
+    parse workers: the reconciliation runs on the schedules dicts expanded
+    back with to_schedules.
+    """
+
+    def __init__(
+        self,
+        occurrences=None,
+        room_offsets=None,
+        room_indices=None,
+        courses_ids=None,
+        rooms=None,
+        labels=None,
+    ):
+        self.occurrences = (
+            occurrences
+            if occurrences is not None
+            else np.empty(0, dtype=OCCURRENCE_DTYPE)
+        )
+        self.room_offsets = (
+            room_offsets if room_offsets is not None else np.zeros(1, dtype=np.int32)
+        )
+        self.room_indices = (
+            room_indices if room_indices is not None else np.empty(0, dtype=np.int32)
+        )
+        self.courses_ids = courses_ids if courses_ids is not None else []
+        self.rooms = rooms if rooms is not None else []
+        self.labels = labels if labels is not None else []
+
+    def __len__(self):
+        return len(self.occurrences)
+
+    @classmethod
+    def from_schedules(cls, schedules):
+        """
+        Build a store from a list of schedules dicts (course_id,
+        start_datetime, end_datetime, label and optionally rooms)
+        """
+        courses_index = {}
+        rooms_index = {}
+        labels_index = {}
+
+        occurrences = np.empty(len(schedules), dtype=OCCURRENCE_DTYPE)
+        room_offsets = np.zeros(len(schedules) + 1, dtype=np.int32)
+        room_indices = []
+        for i, schedule in enumerate(schedules):
+            start = to_epoch_minutes(schedule["start_datetime"])
+            occurrences[i] = (
+                courses_index.setdefault(schedule.get("course_id"), len(courses_index)),
+                start,
+                to_epoch_minutes(schedule["end_datetime"]) - start,
+                labels_index.setdefault(schedule.get("label"), len(labels_index)),
+            )
+            for room in schedule.get("rooms", []):
+                room_indices.append(rooms_index.setdefault(room, len(rooms_index)))
+            room_offsets[i + 1] = len(room_indices)
+
+        return cls(
+            occurrences,
+            room_offsets,
+            np.array(room_indices, dtype=np.int32),
+            list(courses_index),
+            list(rooms_index),
+            list(labels_index),
+        )
+
+    @classmethod
+    def concatenate(cls, stores):
+        """
+        Merge stores, remapping their courses, rooms and labels tables
+        """
+        store = cls()
+        courses_index = {}
+        rooms_index = {}
+        labels_index = {}
+        occurrences = []
+        room_offsets = [np.zeros(1, dtype=np.int32)]
+        room_indices = []
+        offset = 0
+        for other in stores:
+            if len(other) == 0:
+                continue
+            courses_map = np.array(
+                [
+                    courses_index.setdefault(c, len(courses_index))
+                    for c in other.courses_ids
+                ],
+                dtype=np.int32,
+            )
+            rooms_map = np.array(
+                [rooms_index.setdefault(r, len(rooms_index)) for r in other.rooms],
+                dtype=np.int32,
+            )
+            labels_map = np.array(
+                [labels_index.setdefault(lb, len(labels_index)) for lb in other.labels],
+                dtype=np.int16,
+            )
+
+            other_occurrences = other.occurrences.copy()
+            other_occurrences["course"] = courses_map[other_occurrences["course"]]
+            other_occurrences["label"] = labels_map[other_occurrences["label"]]
+            occurrences.append(other_occurrences)
+            room_offsets.append(other.room_offsets[1:] + offset)
+            room_indices.append(
+                rooms_map[other.room_indices]
+                if len(other.room_indices)
+                else other.room_indices
+            )
+            offset += len(other.room_indices)
+
+        if occurrences:
+            store.occurrences = np.concatenate(occurrences)
+            store.room_offsets = np.concatenate(room_offsets).astype(np.int32)
+            store.room_indices = np.concatenate(room_indices).astype(np.int32)
+        store.courses_ids = list(courses_index)
+        store.rooms = list(rooms_index)
+        store.labels = list(labels_index)
+        return store
+
+    @classmethod
+    def from_weekly(cls, schedule, db_semester, course_id=None):
+        """
+        Expand a weekly schedule over the semester days, without going
+        through one dict per occurrence
+
+        Input:
+            - schedule: list of events (day, start_hour, duration, label, rooms)
+            - db_semester: semester document (start_date, end_date, skip_dates)
+            - course_id: course of the occurrences
+        Output:
+            - store: the occurrences ordered by day, then by event
+        """
+        key = semester_key(db_semester)
+        rooms_index = {}
+        labels_index = {}
+
+        occurrences = []
+        room_counts = []
+        room_indices = []
+        for event in schedule:
+            starts = weekly_starts(event["day"], int(event["start_hour"]), key)
+            event_occurrences = np.empty(len(starts), dtype=OCCURRENCE_DTYPE)
+            event_occurrences["course"] = 0
+            event_occurrences["start"] = starts
+            event_occurrences["duration"] = 60 * int(event["duration"])
+            event_occurrences["label"] = labels_index.setdefault(
+                event["label"], len(labels_index)
+            )
+            occurrences.append(event_occurrences)
+
+            rooms = np.array(
+                [rooms_index.setdefault(r, len(rooms_index)) for r in event["rooms"]],
+                dtype=np.int32,
+            )
+            room_counts.append(np.full(len(starts), len(rooms), dtype=np.int32))
+            room_indices.append(np.tile(rooms, len(starts)))
+
+        if not occurrences:
+            return cls(courses_ids=[course_id])
+
+        store = cls(
+            np.concatenate(occurrences),
+            np.concatenate([[0], np.cumsum(np.concatenate(room_counts))]).astype(
+                np.int32
+            ),
+            np.concatenate(room_indices).astype(np.int32),
+            [course_id],
+            list(rooms_index),
+            list(labels_index),
+        )
+        # Events are expanded one after the other, reorder by day then event
+        event = np.repeat(np.arange(len(occurrences)), [len(o) for o in occurrences])
+        day = store.occurrences["start"] // (24 * 60)
+        return store.take(np.lexsort((event, day)))
+
+    def take(self, order):
+        """
+        Output:
+            - store: the occurrences at the order indices, sharing the tables
+        """
+        order = np.asarray(order, dtype=np.int64)
+        counts = np.diff(self.room_offsets)[order]
+        room_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int32)
+        # Position of every room of the new order in the old room_indices
+        positions = np.repeat(
+            self.room_offsets[:-1][order] - room_offsets[:-1], counts
+        ) + np.arange(room_offsets[-1])
+        return OccurrenceStore(
+            self.occurrences[order],
+            room_offsets,
+            self.room_indices[positions],
+            self.courses_ids,
+            self.rooms,
+            self.labels,
+        )
+
+    def occurrence_rooms(self, i):
+        indices = self.room_indices[self.room_offsets[i] : self.room_offsets[i + 1]]
+        return [self.rooms[index] for index in indices]
+
+    def to_schedules(self):
+        """
+        Expand the store back to a list of schedules dicts
+        """
+        schedules = []
+        for i, occurrence in enumerate(self.occurrences):
+            start_datetime = from_epoch_minutes(occurrence["start"])
+            schedules.append(
+                {
+                    "start_datetime": start_datetime,
+                    "end_datetime": start_datetime
+                    + timedelta(minutes=int(occurrence["duration"])),
+                    "label": self.labels[occurrence["label"]],
+                    "rooms": self.occurrence_rooms(i),
+                    "course_id": self.courses_ids[occurrence["course"]],
+                }
+            )
+        return schedules
@@ -0,0 +1,532 @@
+import functools
+import re
+from datetime import datetime
+
+from bs4 import BeautifulSoup
+from tqdm import tqdm
+
+from db_utils import BulkWriter, RunContext
+from instrumentation import http_session
+
+# Douglas-Peucker tolerance of the rooms footprints, in meters (MN95)
+FOOTPRINT_TOLERANCE_METERS = 0.2
+# Decimals of the footprints WGS84 coordinates, 6 decimals are about 0.1 m
+FOOTPRINT_DECIMALS = 6
+
+
+### LIST ALL ROOMS ###
+def list_rooms(schedules):
+    rooms = []
+    for schedule in schedules:
+        if schedule.get("rooms") is None:
+            continue
+
+        schedule_rooms = schedule.get("rooms")
+
+        for room in schedule_rooms:
+            if room not in rooms:
+                rooms.append(room)
+
+    return rooms
+
+
+### LIST ALL PLAN ROOMS ###
+def parse_plan_level(level_text):
+    """
+    Parse the WFS response of a plan.epfl.ch level
+    Output:
+        - rooms_xml: the list of XML rooms objects, None if the level is empty
+    """
+    level_xml = BeautifulSoup(level_text, "xml")
+    if level_xml.find("gml:Null") is not None:
+        return None
+    return level_xml.findAll("gml:featureMember")
+
+
+@functools.cache
+def mn95_to_wgs84():
+    """
+    Transformer from MN95 (epsg:2056) to WGS84 (epsg:4326), built once since
+    pyproj is slow to import and to set up
+    """
+    from pyproj import Transformer
+
+    return Transformer.from_crs("epsg:2056", "epsg:4326")
+
+
+def compute_coordinates(coordinates_string):
+    import numpy as np
+
+    coordinates_split = coordinates_string.split()
+    coordinates = [
+        (float(coordinates_split[i]), float(coordinates_split[i + 1]))
+        for i in range(0, len(coordinates_split), 2)
+    ]
+
+    # Compute center coordinates
+    xs, ys = zip(*coordinates)
+    center_x, center_y = (np.mean(xs), np.mean(ys))
+
+    # Transform coordinates from MN95 (epsg:2056) to WGS84 (epsg:4326), in
+    # the (latitude, longitude) axis order of epsg:4326
+    latitude, longitude = mn95_to_wgs84().transform(center_x, center_y)
+    return geojson_point(latitude, longitude)
+
+
+def geojson_point(latitude, longitude):
+    """
+    Output:
+        - point: the GeoJSON Point of the coordinates, in the (longitude,
+        latitude) order of GeoJSON and of the 2dsphere index
+    """
+    return {"type": "Point", "coordinates": [float(longitude), float(latitude)]}
+
+
+def parse_pos_list(coordinates_string):
+    """
+    Output:
+        - points: (n, 2) array of the MN95 (east, north) points of a posList
+    """
+    import numpy as np
+
+    return np.array(coordinates_string.split(), dtype=float).reshape(-1, 2)
+
+
+def simplify_line(points, tolerance):
+    """
+    Douglas-Peucker simplification of a line, iterative
+    Input:
+        - points: (n, 2) array of the points
+        - tolerance: the maximum distance of a dropped point to the line
+    Output:
+        - points: the kept points, including the first and the last
+    """
+    import numpy as np
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    segments = [(0, len(points) - 1)]
+    while segments:
+        first, last = segments.pop()
+        if last - first < 2:
+            continue
+        direction = points[last] - points[first]
+        inner = points[first + 1 : last] - points[first]
+        length = np.hypot(*direction)
+        if length == 0:
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distances = (
+                np.abs(direction[0] * inner[:, 1] - direction[1] * inner[:, 0]) / length
+            )
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            segments += [(first, split), (split, last)]
+    return points[keep]
+
+
+def simplify_ring(ring, tolerance):
+    """
+    Douglas-Peucker simplification of a closed ring, split at its point
+    farthest from the first one. A ring that would collapse is kept as is.
+    Output:
+        - ring: the simplified ring, closed
+    """
+    import numpy as np
+
+    if not np.array_equal(ring[0], ring[-1]):
+        ring = np.vstack((ring, ring[:1]))
+    if len(ring) <= 4:
+        return ring
+    split = int(np.argmax(np.hypot(*(ring - ring[0]).T)))
+    simplified = np.vstack(
+        (
+            simplify_line(ring[: split + 1], tolerance)[:-1],
+            simplify_line(ring[split:], tolerance),
+        )
+    )
+    return simplified if len(simplified) >= 4 else ring
+
+
+def compute_footprint(coordinates_string):
+    """
+    Output:
+        - footprint: the GeoJSON Polygon of the room, simplified within
+        FOOTPRINT_TOLERANCE_METERS and rounded to FOOTPRINT_DECIMALS
+    """
+    import numpy as np
+
+    ring = simplify_ring(parse_pos_list(coordinates_string), FOOTPRINT_TOLERANCE_METERS)
+    latitudes, longitudes = mn95_to_wgs84().transform(ring[:, 0], ring[:, 1])
+    ring = np.round(np.column_stack((longitudes, latitudes)), FOOTPRINT_DECIMALS)
+    return {"type": "Polygon", "coordinates": [ring.tolist()]}
+
+
+def parse_plan_room(room_xml):
+    """
+    Parse a XML room object
+    Input:
+        - room_xml: the XML room object
+    Output:
+        - room: the parsed room object (name, type, coordinates, link)
+    """
+    room_name = (
+        BeautifulSoup(room_xml.find("ms:room_abr_link").text, "html.parser")
+        .find("div", class_="room")
+        .text.replace(" ", "")
+    )
+    room_type = room_xml.find("ms:room_uti_a").text
+    room_link = (
+        BeautifulSoup(room_xml.find("ms:room_abr_link").text, "html.parser")
+        .find("button", class_="clipboard")
+        .attrs["data-clipboard-text"]
+    )
+    room_capacity = room_xml.find("ms:room_place").text
+    if room_capacity and room_capacity != "":
+        room_capacity = int(room_capacity)
+    else:
+        room_capacity = None
+    room_coordinates_string = room_xml.find("gml:posList").text
+    room_coordinates = compute_coordinates(room_coordinates_string)
+    room_footprint = compute_footprint(room_coordinates_string)
+
+    return {
+        "name": room_name,
+        "type": room_type,
+        "coordinates": room_coordinates,
+        "footprint": room_footprint,
+        "link": room_link,
+        "capacity": room_capacity,
+    }
+
+
+def list_plan_rooms():
+    """
+    List all the rooms objects (name, type) on the plan.epfl.ch website
+    Output:
+        - rooms: a list of rooms
+    """
+
+    def list_level_rooms(low, up, floor, max=1000):
+        """
+        List all the XML rooms objects in a level
+        Input:
+            - low: the lower left corner of the level
+            - up: the upper right corner of the level
+            - floor: the floor of the level
+            - max: the maximum number of rooms to return
+            Output:
+                - rooms: a list of XML rooms
+        """
+        low1, low2 = low
+        up1, up2 = up
+        request_url = f"https://plan.epfl.ch/mapserv_proxy?ogcserver=source+for+image%2Fpng&cache_version=9fe661ce469e4692b9e402b22d8cb420&floor={floor}"
+        xml = f'<GetFeature xmlns="http://www.opengis.net/wfs" service="WFS" version="1.1.0" outputFormat="GML3" maxFeatures="{max}" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://www.opengis.net/wfs http://schemas.opengis.net/wfs/1.1.0/wfs.xsd"><Query typeName="feature:batiments_wmsquery" srsName="EPSG:2056" xmlns:feature="http://mapserver.gis.umn.edu/mapserver"><Filter xmlns="http://www.opengis.net/ogc"><BBOX><PropertyName>the_geom</PropertyName><Envelope xmlns="http://www.opengis.net/gml" srsName="EPSG:2056"><lowerCorner>{low1} {low2}</lowerCorner><upperCorner>{up1} {up2}</upperCorner></Envelope></BBOX></Filter></Query></GetFeature>'
+
+        r = http_session().post(request_url, data=xml)
+        return parse_plan_level(r.text)
+
+    def list_all_levels_rooms():
+        """
+        List all the XML rooms objects in ALL levels
+        Output:
+            - rooms: a list of XML rooms
+        """
+        rooms_xml = {}
+        for level in tqdm(range(-3, 8)):
+            level_rooms_xml = list_level_rooms(
+                (2533565.4081416847, 1152107.9784703811),
+                (2532680.590, 1152904.181),
+                level,
+                max=5000,
+            )
+            if level_rooms_xml and len(level_rooms_xml) > 0:
+                rooms_xml[level] = level_rooms_xml
+        return rooms_xml
+
+    def parse_all_rooms(rooms_xml):
+        """
+        Parse all XML rooms objects
+        Input:
+            - rooms_xml: object of XML rooms objects (level: rooms_xml)
+        Output:
+            - rooms: a list of parsed rooms objects (name, type)
+        """
+        rooms_parsed = []
+        for level, level_rooms_xml in tqdm(
+            rooms_xml.items(), total=len(rooms_xml.keys())
+        ):
+            for room_xml in tqdm(
+                level_rooms_xml, total=len(level_rooms_xml), leave=False
+            ):
+                room = parse_plan_room(room_xml)
+                if room is None:
+                    continue
+                if room not in rooms_parsed:
+                    room["level"] = level
+                    rooms_parsed.append(room)
+        return rooms_parsed
+
+    rooms_xml = list_all_levels_rooms()
+
+    print("Parsing rooms...")
+    rooms = parse_all_rooms(rooms_xml)
+
+    return rooms
+
+
+### CREATE ROOMS ###
+def create_rooms(
+    db, schedules=[], rooms_names=[], update=False, create_only=False, ctx=None
+):
+    """
+    Create schedules in the database
+    Input:
+        - db: the database
+        - schedules: a list of schedules
+        - update: only update the existing rooms
+        - create_only: only create the new rooms
+        - ctx: the RunContext of the run (optional)
+    """
+    if ctx is None:
+        ctx = RunContext(db)
+
+    if update:
+        rooms_names = []
+
+    elif len(rooms_names) == 0 or not isinstance(rooms_names, list):
+        if len(schedules) == 0 or not isinstance(schedules, list):
+            print("No schedules to create")
+            return
+
+        # List all rooms in the schedules
+        rooms_names = list_rooms(schedules)
+
+    # Find all rooms on plan.epfl.ch (once per run)
+    if "plan_rooms" not in ctx.memo:
+        print("Getting rooms from plan.epfl.ch")
+        ctx.memo["plan_rooms"] = list_plan_rooms()
+    plan_rooms = ctx.memo["plan_rooms"]
+    plan_rooms_by_name = {plan_room.get("name"): plan_room for plan_room in plan_rooms}
+    print(f"Found {len(plan_rooms_by_name)} rooms on plan.epfl.ch")
+
+    # List all rooms in the database
+    print("Getting rooms from database")
+    db_rooms = ctx.find("rooms", available=True)
+    print(f"Found {len(db_rooms)} rooms in database")
+
+    # Update the rooms type, coordinates and link in the database if necessary
+    print("Updating rooms in database")
+    for db_room in tqdm([] if create_only else db_rooms):
+        db_room_name = db_room.get("name")
+        if db_room_name not in plan_rooms_by_name:
+            # If the room is not on plan.epfl.ch, ignore it
+            print(f"Room {db_room_name} not found on plan.epfl.ch")
+            continue
+        db_room_type = db_room.get("type")
+        db_room_capacity = db_room.get("capacity")
+        db_room_level = db_room.get("level", None)
+        db_room_link = db_room.get("link")
+        db_room_coordinates = db_room.get("coordinates")
+
+        # Find the room in plan data
+        plan_room = plan_rooms_by_name[db_room_name]
+        plan_room_type = plan_room.get("type")
+        plan_room_link = plan_room.get("link")
+        plan_room_coordinates = plan_room.get("coordinates")
+        plan_room_capacity = plan_room.get("capacity")
+        plan_room_level = plan_room.get("level", None)
+
+        # Update it if necessary
+        if (
+            db_room_type != plan_room_type
+            or db_room_link != plan_room_link
+            or db_room_coordinates != plan_room_coordinates
+            or db_room_capacity != plan_room_capacity
+            or (db_room_level != plan_room_level and plan_room_level)
+        ):
+            updated_room = {
+                "name": db_room_name,
+                "type": plan_room_type,
+                "link": plan_room_link,
+                "coordinates": plan_room_coordinates,
+            }
+
+            if plan_room_capacity is not None and isinstance(plan_room_capacity, int):
+                updated_room["capacity"] = plan_room_capacity
+
+            if plan_room_level is not None and isinstance(plan_room_level, int):
+                updated_room["level"] = plan_room_level
+
+            ctx.update("rooms", db_room, updated_room)
+
+    counts = ctx.flush("rooms")
+    print(f"- {counts['modified']} rooms updated ({counts['failed']} failed)")
+
+    # List rooms to create
+    db_rooms_names = {db_room.get("name") for db_room in db_rooms}
+    new_rooms_names = [
+        room_name for room_name in rooms_names if room_name not in db_rooms_names
+    ]
+
+    # Create the rooms that are not in the database
+    print("Filtering rooms to create")
+    new_rooms = []
+    for room_name in tqdm(new_rooms_names):
+        plan_room = plan_rooms_by_name.get(room_name)
+
+        room_link = None
+        room_coordinates = None
+        room_type = "unknown"
+        room_capacity = 0
+        room_level = 0
+
+        # building is the characters before the first number
+        room_building = re.split(r"\d", room_name)[0]
+        # replace underscores or hyphens with spaces
+        room_building = re.sub(r"[-_]", " ", room_building)
+
+        if plan_room is not None:
+            room_type = plan_room.get("type", "unknown")
+            room_link = plan_room.get("link", None)
+            room_coordinates = plan_room.get("coordinates", None)
+            room_capacity = plan_room.get("capacity", None)
+            room_level = plan_room.get("level", None)
+
+        new_room = {
+            "name": room_name,
+            "type": room_type,
+            "available": True,
+            "link": room_link,
+            "coordinates": room_coordinates,
+            "building": room_building,
+        }
+
+        if room_capacity is not None and isinstance(room_capacity, int):
+            new_room["capacity"] = room_capacity
+
+        if room_level is not None and isinstance(room_level, int):
+            new_room["level"] = room_level
+
+        new_rooms.append(new_room)
+
+    if len(new_rooms) == 0:
+        print("No new rooms to create")
+        return
+
+    print(f"Inserting {len(new_rooms)} new rooms in database")
+    for new_room in new_rooms:
+        ctx.upsert("rooms", new_room)
+    counts = ctx.flush("rooms")
+    print(f"- {counts['inserted']} rooms created ({counts['failed']} failed)")
+
+    return
+
+
+### ROOMS GEOMETRY ###
+def room_feature(room, footprint):
+    return {
+        "type": "Feature",
+        "geometry": footprint,
+        "properties": {
+            "name": room.get("name"),
+            "type": room.get("type"),
+            "capacity": room.get("capacity"),
+            "level": room.get("level"),
+        },
+    }
+
+
+def update_rooms_geometry(db, ctx=None):
+    """
+    Store the footprints of the available rooms on plan.epfl.ch in
+    room_geometry, and one GeoJSON FeatureCollection of them per building in
+    building_geometry, the payload of the map. Only the changed documents
+    are written, the ones of the rooms and buildings no longer found are
+    deleted.
+    Input:
+        - db: the database
+        - ctx: the RunContext of the run (optional)
+    """
+    if ctx is None:
+        ctx = RunContext(db)
+
+    # Find all rooms on plan.epfl.ch (once per run)
+    if "plan_rooms" not in ctx.memo:
+        print("Getting rooms from plan.epfl.ch")
+        ctx.memo["plan_rooms"] = list_plan_rooms()
+    # Nothing is deleted when plan.epfl.ch could not be read
+    if not ctx.memo["plan_rooms"]:
+        print("No rooms found on plan.epfl.ch")
+        return
+    footprints = {
+        plan_room.get("name"): plan_room.get("footprint")
+        for plan_room in ctx.memo["plan_rooms"]
+    }
+    rooms = [
+        room
+        for room in ctx.find("rooms", available=True)
+        if footprints.get(room.get("name")) is not None
+    ]
+    print(f"Found {len(rooms)} rooms footprints")
+
+    writer = BulkWriter(db)
+    updated_at = datetime.now()
+    existing = {
+        document["room_id"]: document["footprint"]
+        for document in db.room_geometry.find({}, {"room_id": 1, "footprint": 1})
+    }
+    for room in rooms:
+        footprint = footprints[room["name"]]
+        if existing.get(room["_id"]) != footprint:
+            writer.upsert(
+                "room_geometry",
+                {
+                    "room_id": room["_id"],
+                    "name": room["name"],
+                    "footprint": footprint,
+                    "updated_at": updated_at,
+                },
+                set_fields=("name", "footprint", "updated_at"),
+            )
+    rooms_ids = {room["_id"] for room in rooms}
+    writer.delete(
+        "room_geometry",
+        "room_id",
+        [room_id for room_id in existing if room_id not in rooms_ids],
+    )
+    counts = writer.flush("room_geometry")
+    print(
+        f"- {counts['inserted']} rooms footprints created, {counts['modified']} "
+        f"updated, {counts['deleted']} deleted ({counts['failed']} failed)"
+    )
+
+    buildings = {}
+    for room in sorted(rooms, key=lambda room: room["name"]):
+        buildings.setdefault(room.get("building") or "unknown", []).append(
+            room_feature(room, footprints[room["name"]])
+        )
+    existing = {
+        document["building"]: document["geojson"]
+        for document in db.building_geometry.find({}, {"building": 1, "geojson": 1})
+    }
+    for building, features in buildings.items():
+        geojson = {"type": "FeatureCollection", "features": features}
+        if existing.get(building) != geojson:
+            writer.upsert(
+                "building_geometry",
+                {"building": building, "geojson": geojson, "updated_at": updated_at},
+                set_fields=("geojson", "updated_at"),
+            )
+    writer.delete(
+        "building_geometry",
+        "building",
+        [building for building in existing if building not in buildings],
+    )
+    counts = writer.flush("building_geometry")
+    print(
+        f"- {counts['inserted']} buildings bundles created, {counts['modified']} "
+        f"updated, {counts['deleted']} deleted ({counts['failed']} failed)"
+    )
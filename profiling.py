@@ -0,0 +1,177 @@
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from pathlib import Path
+
+# Directory of the profiles (collapsed stacks and flamegraphs by stage)
+PROFILES_DIR = "profiles"
+
+# Period of the stack sampling of the profiler (seconds) and of the flushes of
+# the workers profiles (the pools are terminated, not joined)
+PROFILE_SAMPLING_PERIOD = 0.01
+PROFILE_FLUSH_PERIOD = 1.0
+
+# Set by RunReport during a profiled stage to the prefix of the profiles of
+# the worker processes started by the stage (inherited by fork and spawn)
+PROFILE_ENV = "OCCUPANCY_PROFILE_PREFIX"
+
+# Threads of the instrumentation, not sampled
+RSS_SAMPLER_THREAD = "rss-sampler"
+PROFILER_THREAD = "profiler"
+
+
+### SAMPLING ###
+def frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Sampling profiler of all the threads of the process: every period the
+    stacks of the threads are collected by sys._current_frames, the waiting
+    threads (e.g. the HTTP downloads) are sampled as well
+    Input:
+        - root: the first frame of the stacks (e.g. the process)
+        - flush_path: if given, the collapsed stacks are rewritten to this
+        path every PROFILE_FLUSH_PERIOD (for processes killed at the end)
+    """
+
+    def __init__(self, root, flush_path=None):
+        self.root = root
+        self.flush_path = flush_path
+        self.stacks = Counter()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, name=PROFILER_THREAD, daemon=True
+        )
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        self.thread.join()
+        if self.flush_path is not None:
+            self.flush()
+
+    def sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            name = names.get(ident, str(ident))
+            if name in (PROFILER_THREAD, RSS_SAMPLER_THREAD):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame))
+                frame = frame.f_back
+            stack += [name, self.root]
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def run(self):
+        last_flush = time.perf_counter()
+        while not self.stopping.wait(PROFILE_SAMPLING_PERIOD):
+            self.sample()
+            if (
+                self.flush_path is not None
+                and time.perf_counter() - last_flush > PROFILE_FLUSH_PERIOD
+            ):
+                self.flush()
+                last_flush = time.perf_counter()
+
+    def flush(self):
+        tmp_path = Path(f"{self.flush_path}.tmp")
+        tmp_path.write_text(collapsed(self.stacks))
+        tmp_path.replace(self.flush_path)
+
+
+def collapsed(stacks):
+    """
+    Stacks in the collapsed format of flamegraph.pl, speedscope and inferno
+    """
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.items())
+
+
+def read_collapsed(path):
+    stacks = Counter()
+    for line in Path(path).read_text().splitlines():
+        stack, _, count = line.rpartition(" ")
+        stacks[stack] += int(count)
+    return stacks
+
+
+def flamegraph_svg(stacks, title, width=1200, row_height=16, min_width=0.5):
+    """
+    Render collapsed stacks as a standalone flamegraph SVG (the frames
+    narrower than min_width pixels are dropped)
+    Output:
+        - svg: the SVG document
+    """
+    # Tree of frames: name -> [count, children]
+    tree = [0, {}]
+    for stack, count in stacks.items():
+        node = tree
+        node[0] += count
+        for name in stack.split(";"):
+            node = node[1].setdefault(name, [0, {}])
+            node[0] += count
+
+    total = max(tree[0], 1)
+    rects = []
+    depth_max = 0
+
+    def layout(children, x, depth):
+        nonlocal depth_max
+        for name, (count, grandchildren) in sorted(children.items()):
+            frame_width = count / total * width
+            if frame_width >= min_width:
+                depth_max = max(depth_max, depth)
+                rects.append((name, count, x, depth, frame_width))
+                layout(grandchildren, x, depth + 1)
+            x += frame_width
+
+    layout(tree[1], 0.0, 0)
+    height = (depth_max + 2) * row_height + 24
+
+    header = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" '
+        f'height="{height}" font-family="monospace" font-size="11">'
+    )
+    lines = [
+        header,
+        f'<text x="4" y="16">{escape(title)} ({tree[0]} samples)</text>',
+    ]
+    for name, count, x, depth, frame_width in rects:
+        y = height - (depth + 1) * row_height
+        hue = zlib.crc32(name.encode()) % 50
+        label = escape(name[: int(frame_width / 7)]) if frame_width > 21 else ""
+        lines.append(
+            f"<g><title>{escape(name)}: {count} samples "
+            f"({count / total:.1%})</title>"
+            f'<rect x="{x:.1f}" y="{y}" width="{frame_width:.1f}" '
+            f'height="{row_height - 1}" fill="hsl({hue}, 90%, 60%)"/>'
+            f'<text x="{x + 2:.1f}" y="{y + row_height - 4}">{label}</text></g>'
+        )
+    lines.append("</svg>")
+    return "\n".join(lines)
+
+
+def escape(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def start_worker_profiler():
+    """
+    Profile a worker process started by a profiled stage (call it from the
+    initializer of the pool), its stacks are merged by the stage at its end
+    """
+    prefix = os.environ.get(PROFILE_ENV)
+    if prefix is None:
+        return None
+    return SamplingProfiler(
+        f"worker-{os.getpid()}", flush_path=f"{prefix}.{os.getpid()}.collapsed"
+    ).start()
@@ -0,0 +1,200 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+from bson import Binary
+
+from config import local_today
+from db_sync import get_current_or_next_semester
+from db_utils import BULK_CHUNK_SIZE, BulkWriter, chunks
+
+# A room_occupancy document holds the slots of a room for a day: slot i is
+# [i * SLOT_MINUTES, (i + 1) * SLOT_MINUTES) after midnight, occupied if an
+# available course or event booking overlaps it. The slots are packed in
+# little endian bit order: int.from_bytes(slots, "little") >> i & 1.
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+
+# Days after today covered in addition to the current or next semester (the
+# meetings are scraped 30 days ahead)
+OCCUPANCY_HORIZON_DAYS = 30
+
+
+def midnight(date):
+    return date.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+### BUILD ###
+def occupancy_window(db, today=None):
+    """
+    Output:
+        - start: the first day of the occupancy (midnight)
+        - days: the number of days
+    """
+    start = midnight(today or local_today())
+    end = start + timedelta(days=OCCUPANCY_HORIZON_DAYS)
+    semester = get_current_or_next_semester(db)
+    if semester is not None:
+        start = min(start, midnight(semester["start_date"]))
+        end = max(end, midnight(semester["end_date"]) + timedelta(days=1))
+    return start, (end - start).days
+
+
+def booked_intervals(db, start, end):
+    """
+    Output:
+        - intervals: (room_id, start_datetime, end_datetime) of the available
+        course and event bookings overlapping [start, end)
+    """
+    overlapping = {
+        "available": True,
+        "start_datetime": {"$lt": end},
+        "end_datetime": {"$gt": start},
+    }
+    projection = {"start_datetime": 1, "end_datetime": 1}
+    schedules = {
+        schedule["_id"]: schedule
+        for schedule in db.course_schedules.find(overlapping, projection)
+    }
+
+    # Only the bookings of the schedules in the range
+    intervals = []
+    for schedules_ids in chunks(schedules, BULK_CHUNK_SIZE):
+        for booking in db.course_bookings.find(
+            {"schedule_id": {"$in": schedules_ids}, "available": True},
+            {"schedule_id": 1, "room_id": 1},
+        ):
+            schedule = schedules[booking["schedule_id"]]
+            intervals.append(
+                (
+                    booking["room_id"],
+                    schedule["start_datetime"],
+                    schedule["end_datetime"],
+                )
+            )
+    for event in db.event_bookings.find(overlapping, {"room_id": 1, **projection}):
+        intervals.append(
+            (event["room_id"], event["start_datetime"], event["end_datetime"])
+        )
+    return intervals
+
+
+def occupancy_bitmaps(rooms_ids, intervals, start, days):
+    """
+    Rasterize the bookings on the slots of the days, with a difference array
+    per room (+1 on the first slot of a booking, -1 after its last one)
+    Input:
+        - rooms_ids: the rooms, in the order of the output
+        - intervals: (room_id, start_datetime, end_datetime) of the bookings
+        - start: the first day (midnight)
+        - days: the number of days
+    Output:
+        - slots: uint8 array (rooms, days, SLOTS_PER_DAY / 8) of the packed
+        occupied slots
+    """
+    rooms_index = {room_id: i for i, room_id in enumerate(rooms_ids)}
+    total_slots = days * SLOTS_PER_DAY
+    counts = np.zeros((len(rooms_ids), total_slots + 1), dtype=np.int32)
+
+    intervals = [interval for interval in intervals if interval[0] in rooms_index]
+    if intervals:
+        rooms_ids_column, starts, ends = zip(*intervals)
+        rooms = np.array([rooms_index[room_id] for room_id in rooms_ids_column])
+        origin = np.datetime64(start, "m")
+        starts = (np.array(starts, dtype="datetime64[m]") - origin).astype(np.int64)
+        ends = (np.array(ends, dtype="datetime64[m]") - origin).astype(np.int64)
+        first = np.clip(starts // SLOT_MINUTES, 0, total_slots)
+        last = np.clip(-(-ends // SLOT_MINUTES), 0, total_slots)
+        booked = first < last
+        np.add.at(counts, (rooms[booked], first[booked]), 1)
+        np.add.at(counts, (rooms[booked], last[booked]), -1)
+
+    occupied = np.cumsum(counts[:, :total_slots], axis=1) > 0
+    return np.packbits(
+        occupied.reshape(len(rooms_ids), days, SLOTS_PER_DAY),
+        axis=-1,
+        bitorder="little",
+    )
+
+
+def build_room_occupancy(db, today=None):
+    """
+    Materialize the occupancy of every room and day of the current or next
+    semester (and of the next OCCUPANCY_HORIZON_DAYS) in room_occupancy, only
+    the days whose slots changed are written and the days before are deleted
+    Output:
+        - counts: dict of inserted, matched, modified and failed writes
+    """
+    start, days = occupancy_window(db, today)
+    end = start + timedelta(days=days)
+    print(f"Building rooms occupancy from {start:%Y-%m-%d} to {end:%Y-%m-%d}...")
+
+    rooms_ids = [room["_id"] for room in db.rooms.find({}, {"_id": 1})]
+    slots = occupancy_bitmaps(rooms_ids, booked_intervals(db, start, end), start, days)
+
+    existing = {
+        (document["date"], document["room_id"]): bytes(document["slots"])
+        for document in db.room_occupancy.find(
+            {"date": {"$gte": start, "$lt": end}}, {"_id": 0}
+        )
+    }
+    dates = [start + timedelta(days=day) for day in range(days)]
+    updated_at = datetime.now()
+    writer = BulkWriter(db)
+    for i, room_id in enumerate(rooms_ids):
+        for day, date in enumerate(dates):
+            day_slots = slots[i, day].tobytes()
+            if existing.get((date, room_id)) != day_slots:
+                writer.upsert(
+                    "room_occupancy",
+                    {
+                        "date": date,
+                        "room_id": room_id,
+                        "slots": Binary(day_slots),
+                        "updated_at": updated_at,
+                    },
+                    set_fields=("slots", "updated_at"),
+                )
+    # The days before the window are no longer read
+    writer.delete_many("room_occupancy", {"date": {"$lt": start}})
+    counts = writer.flush()
+    print(
+        f"- {counts['inserted']} rooms days created, {counts['modified']} updated, "
+        f"{counts['deleted']} past days deleted ({counts['failed']} failed)"
+    )
+    return counts
+
+
+### QUERY ###
+def slots_mask(first_minute, last_minute):
+    """
+    Output:
+        - mask: the bits of the slots overlapping [first_minute, last_minute)
+        of a day
+    """
+    first = first_minute // SLOT_MINUTES
+    last = -(-last_minute // SLOT_MINUTES)
+    return ((1 << last) - 1) ^ ((1 << first) - 1)
+
+
+def is_room_free(db, room_id, start, end):
+    """
+    Whether a room is free from start to end, with one indexed read of
+    room_occupancy per day of the range
+    Output:
+        - free: True or False, None if a day is not materialized
+    """
+    day = midnight(start)
+    while day < end:
+        document = db.room_occupancy.find_one(
+            {"date": day, "room_id": room_id}, {"slots": 1}
+        )
+        if document is None:
+            return None
+        next_day = day + timedelta(days=1)
+        first_minute = (max(start, day) - day) // timedelta(minutes=1)
+        last_minute = (min(end, next_day) - day) // timedelta(minutes=1)
+        slots = int.from_bytes(document["slots"], "little")
+        if slots & slots_mask(first_minute, last_minute):
+            return False
+        day = next_day
+    return True
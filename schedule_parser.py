@@ -0,0 +1,322 @@
+import html
+import re
+import threading
+from datetime import datetime, timedelta
+
+from bs4 import BeautifulSoup
+
+from config import (
+    MAP_ROOMS,
+    ROOMS_FILTER,
+)
+from occurrences import OccurrenceStore
+from profiling import start_worker_profiler
+
+### PARSE COURSE SCHEDULE ###
+IFRAME_SRC_RE = re.compile(rb"<iframe[^>]*\ssrc=\"([^\"]+)\"")
+
+# Connect and read timeouts of the courses pages requests (seconds)
+HTTP_TIMEOUT = (10, 60)
+
+_http_local = threading.local()
+
+
+def http_get(url, timeout=HTTP_TIMEOUT):
+    """
+    GET with one keep-alive session per thread
+    """
+    # Not imported by the parse workers started with the spawn or forkserver
+    # methods, only by the download threads
+    from instrumentation import http_session
+
+    session = getattr(_http_local, "session", None)
+    if session is None:
+        session = _http_local.session = http_session()
+    return session.get(url, timeout=timeout)
+
+
+def is_weekly_page(page):
+    return b"coursebook-week-caption" in page
+
+
+def fetch_course_pages(url):
+    """
+    I/O part of the course schedule: download the course page and, for the
+    doctoral school courses, the schedule iframe
+    Input:
+        - url: the edu url of the course
+    Output:
+        - page: the content of the course page (None if not found)
+        - iframe_page: the content of the EDOC schedule iframe (None for the
+        weekly schedules)
+    """
+    response = http_get(url)
+    if response.status_code == 404:
+        print(url)
+        return None, None
+
+    page = response.content
+    if is_weekly_page(page):
+        return page, None
+
+    match = IFRAME_SRC_RE.search(page)
+    if match is None:
+        return page, None
+    iframe_url = html.unescape(match.group(1).decode())
+    return page, http_get(iframe_url).content
+
+
+def parse_course_page(page, iframe_page=None):
+    """
+    CPU part of the course schedule: parse the pages downloaded by
+    fetch_course_pages
+    Output:
+        - schedule: the weekly schedule, or the EDOC occurrences
+        - edoc: True if the course is from the doctoral school
+    """
+    soup = BeautifulSoup(page, "html.parser")
+
+    schedule = soup.find("div", class_="coursebook-week-caption sr-only")
+
+    edoc = False
+    if schedule is None:
+        schedule_parsed = parse_schedule_EDOC(soup, iframe_page)
+        edoc = True
+    else:
+        schedule_parsed = parse_schedule(soup)
+
+    if schedule_parsed is None:
+        return None, edoc
+
+    return schedule_parsed, edoc
+
+
+def get_course_schedule(url):
+    page, iframe_page = fetch_course_pages(url)
+    if page is None:
+        return
+
+    return parse_course_page(page, iframe_page)
+
+
+### PARSE SCHEDULE DOCTORAL SCHOOL ###
+def parse_schedule_EDOC(soup, iframe_page=None):
+    # Ecole doctorale
+    schedule = dict()
+
+    if iframe_page is None:
+        iframe = soup.find("iframe")
+        if iframe is None:
+            return None
+        iframe_page = http_get(iframe.attrs["src"]).content
+    iframe_soup = BeautifulSoup(iframe_page, "html.parser")
+    if iframe_soup.find("table") is None:
+        # print(f'\033[91m SKIP (no schedule) \033[0m')
+        return None
+
+    rows = iframe_soup.findAll("tr")
+    creneaux = []
+
+    for i, row in enumerate(rows):
+        if i == 0:
+            continue
+        date: datetime | None = None
+        if row.find("th") is not None:
+            # find a dd.mm.yyyy date
+            date_str = re.findall(r"\d{2}.\d{2}.\d{4}", row.find("th").text)
+            if len(date_str) > 0:
+                date = datetime.strptime(date_str[0], "%d.%m.%Y")
+        elif (
+            row.get("class") is not None
+            and "grisleger" in row.get("class")
+            and date is not None
+        ):
+            time = [x.split(":")[0] for x in row.findAll("td")[0].text.split("-")]
+
+            start_hour = int(time[0])
+            duration = int(time[1]) - int(time[0])
+
+            rooms_found = [room.text for room in row.findAll("td")[1].findAll("a")]
+
+            rooms = []
+            for room in rooms_found:
+                if room in MAP_ROOMS:
+                    if isinstance(MAP_ROOMS[room], list):
+                        rooms += [x for x in MAP_ROOMS[room]]
+                    else:
+                        rooms.append(MAP_ROOMS[room])
+                elif room not in ROOMS_FILTER:
+                    rooms.append(room)
+            label = row.findAll("td")[2].text
+            if label == "L":
+                label = "cours"
+            elif label == "E":
+                label = "exercice"
+            elif label == "P":
+                label = "projet"
+            else:
+                print(label)
+
+            # create datetime object from date string dd.mm.yyyy and time string hh
+            start_datetime = date.replace(
+                hour=start_hour, minute=0, second=0, microsecond=0
+            )
+            creneau = {
+                "start_datetime": start_datetime,
+                "end_datetime": start_datetime + timedelta(hours=duration),
+                "label": label,
+                "rooms": rooms,
+            }
+            if len(rooms) > 0:
+                creneaux.append(creneau)
+            creneau = {}
+
+    if len(creneaux) == 0:
+        # print(f'\033[91m SKIP (no creneaux) \033[0m')
+        return None
+
+    schedule = []
+    for creneau in creneaux:
+        found = False
+        for i, s in enumerate(schedule):
+            if (
+                s["start_datetime"] == creneau["start_datetime"]
+                and s["end_datetime"] == creneau["end_datetime"]
+                and s["label"] == creneau["label"]
+            ):
+                schedule[i]["rooms"] = schedule[i]["rooms"] + creneau["rooms"]
+                found = True
+                break
+        if not found:
+            schedule.append(creneau)
+
+    return schedule
+
+
+def parse_schedule(soup):
+    creneaux = soup.find("div", class_="coursebook-week-caption sr-only").findAll("p")
+
+    schedule = []
+    for creneau in creneaux:
+        # Extracting the full text from the paragraph
+        full_text = creneau.get_text().replace("\xa0", " ")
+
+        day = full_text.split(",")[0]
+
+        # Mapping days to weekday numbers
+        days_map = {
+            "Lundi": 0,
+            "Mardi": 1,
+            "Mercredi": 2,
+            "Jeudi": 3,
+            "Vendredi": 4,
+            "Samedi": 5,
+            "Dimanche": 6,
+        }
+        day = days_map[day]
+
+        # Extracting start hour and duration
+        time_match = re.search(r"(\d{1,2}h) - (\d{1,2}h)", full_text)
+        start_hour, end_hour = time_match.groups() if time_match else (None, None)
+        duration = (
+            int(end_hour[:-1]) - int(start_hour[:-1])
+            if start_hour and end_hour
+            else None
+        )
+        start_hour = int(start_hour[:-1]) if start_hour else None
+
+        # Extracting label
+        first_room = creneau.find("a")
+        if first_room:
+            label = creneau.find("a").previousSibling.text.split(": ")[1].strip()
+        else:
+            label = creneau.text.split(": ")[1].strip()
+
+        if label == "Cours":
+            label = "cours"
+        elif label == "Exercice, TP":
+            label = "exercice"
+        elif label == "Projet, autre":
+            label = "projet"
+
+        # Extracting rooms
+        rooms_found = [link.get_text() for link in creneau.findAll("a", href=True)]
+        rooms = []
+        for room in rooms_found:
+            if room in MAP_ROOMS:
+                if isinstance(MAP_ROOMS[room], list):
+                    rooms += [x for x in MAP_ROOMS[room]]
+                else:
+                    rooms.append(MAP_ROOMS[room])
+            elif room not in ROOMS_FILTER:
+                rooms.append(room)
+
+        schedule.append(
+            {
+                "day": day,
+                "start_hour": start_hour,
+                "duration": duration,
+                "label": label,
+                "rooms": rooms,
+            }
+        )
+
+    return schedule
+
+
+def create_semester_schedule(schedule, db_semester):
+    """
+    Input:
+        - schedule: list of weekly events (day, start_hour, duration, label, rooms)
+        - db_semester: semester document (start_date, end_date, skip_dates)
+    Output:
+        - semester_schedule: list of the events occurrences over the semester
+    """
+    semester_schedule = OccurrenceStore.from_weekly(
+        schedule, db_semester
+    ).to_schedules()
+    for event in semester_schedule:
+        del event["course_id"]
+    return semester_schedule
+
+
+# Read-only context of the parse workers, sent once per process by
+# init_schedule_worker instead of once per course
+_worker_context = {}
+
+
+def init_schedule_worker(semester_codes, semester):
+    start_worker_profiler()
+    _worker_context["semester_codes"] = semester_codes
+    _worker_context["semester"] = semester
+
+
+def process_course_schedules(course_id, code, page, iframe_page=None):
+    """
+    Parse the pages of a course into its occurrences over the semester
+    (runs in the parse workers, see init_schedule_worker)
+    Output:
+        - store: OccurrenceStore of the course, None if no schedule
+    """
+    schedule, edoc = parse_course_page(page, iframe_page)
+    if schedule is None:
+        return None
+
+    if edoc is False:
+        if code not in _worker_context["semester_codes"]:
+            return None
+        # Pickled back to the parent process as a compact store
+        return OccurrenceStore.from_weekly(
+            schedule, _worker_context["semester"], course_id
+        )
+
+    # Add course_id to schedule
+    for event in schedule:
+        event["course_id"] = course_id
+
+    # Pickled back to the parent process as a compact store
+    return OccurrenceStore.from_schedules(schedule)
+
+
+def process_course_schedules_start(args):
+    return process_course_schedules(*args)
@@ -0,0 +1,186 @@
+import collections
+import concurrent.futures
+import multiprocessing
+
+from tqdm import tqdm
+
+from config import STREAM_CHUNK_SIZE
+from db_sync import (
+    create_courses_bookings,
+    find_semester_courses,
+    get_run_semester,
+    update_schedules,
+)
+from db_utils import RunContext
+from instrumentation import current_rss_mb
+from plan_rooms import create_rooms
+from schedule_parser import (
+    fetch_course_pages,
+    init_schedule_worker,
+    is_weekly_page,
+    process_course_schedules,
+)
+
+
+### SCRAPE COURSES SCHEDULES ###
+def schedule_courses(
+    courses, semester_codes, semester, window=None, io_threads=None, failed=None
+):
+    """
+    Two stages pipeline: a pool of threads downloads the courses pages and
+    hands them to a pool of processes that only parses the HTML. Yields
+    (course_id, store) in the courses order, at most window courses are in
+    flight so a slow consumer holds back the scraping. A course whose download
+    or parsing fails is printed and skipped.
+    Input:
+        - courses: the courses documents (_id, code, edu_url)
+        - semester_codes: set of the codes of the semester courses
+        - semester: the semester document
+        - window: the number of courses in flight (default 2 * io_threads)
+        - io_threads: the number of download threads (default 4 * cpu count)
+        - failed: list the ids of the skipped courses are appended to
+        (optional)
+    """
+    num_processes = multiprocessing.cpu_count()
+    if io_threads is None:
+        io_threads = 4 * num_processes
+    if window is None:
+        window = 2 * io_threads
+
+    with (
+        multiprocessing.Pool(
+            num_processes,
+            initializer=init_schedule_worker,
+            initargs=(semester_codes, semester),
+        ) as pool,
+        concurrent.futures.ThreadPoolExecutor(max_workers=io_threads) as executor,
+    ):
+
+        def fetch_and_parse(course):
+            course_edu_url = course.get("edu_url")
+            if course_edu_url is None:
+                return None
+
+            page, iframe_page = fetch_course_pages(course_edu_url)
+            if page is None:
+                print(f"No schedule found for {course_edu_url}")
+                return None
+
+            # Weekly schedules are only kept for the semester courses, no
+            # need to ship the page to a worker
+            if (
+                iframe_page is None
+                and is_weekly_page(page)
+                and course.get("code") not in semester_codes
+            ):
+                return None
+
+            return pool.apply(
+                process_course_schedules,
+                (course["_id"], course.get("code"), page, iframe_page),
+            )
+
+        courses_iter = iter(courses)
+        pending = collections.deque()
+
+        def submit():
+            course = next(courses_iter, None)
+            if course is not None:
+                pending.append((course, executor.submit(fetch_and_parse, course)))
+
+        for _ in range(window):
+            submit()
+
+        while pending:
+            course, future = pending.popleft()
+            submit()
+            try:
+                store = future.result()
+            except Exception as exc:
+                print(f"Course {course.get('edu_url')} generated an exception: {exc}")
+                if failed is not None:
+                    failed.append(course["_id"])
+                continue
+            yield course["_id"], store
+
+
+def iter_courses_schedules(db, ctx=None, window=None, io_threads=None):
+    """
+    Process the courses schedules of the current or next semester, yielding
+    (course_id, schedule) for every course as soon as it is done (see
+    schedule_courses). The courses that failed are kept in
+    ctx.memo["failed_courses_ids"], their schedules are not reconciled.
+    """
+    if ctx is None:
+        ctx = RunContext(db)
+
+    semester = get_run_semester(ctx)
+    db_courses_semester, db_courses_year, _ = find_semester_courses(db, ctx)
+    db_courses_semester_codes = {course.get("code") for course in db_courses_semester}
+    db_courses = db_courses_semester + db_courses_year
+
+    print(f"- {len(db_courses)} courses found")
+
+    for course_id, store in tqdm(
+        schedule_courses(
+            db_courses,
+            db_courses_semester_codes,
+            semester,
+            window,
+            io_threads,
+            failed=ctx.memo.setdefault("failed_courses_ids", []),
+        ),
+        total=len(db_courses),
+        desc="Processing courses schedules",
+    ):
+        yield course_id, store.to_schedules() if store is not None else []
+
+
+def find_courses_schedules(db, ctx=None):
+    schedules = []
+    for _, schedule in iter_courses_schedules(db, ctx):
+        schedules += schedule
+
+    return schedules
+
+
+def sync_courses_schedules(db, ctx=None, chunk_size=STREAM_CHUNK_SIZE, max_rss_mb=None):
+    """
+    Streaming version of find_courses_schedules, create_rooms, update_schedules
+    and create_courses_bookings: the courses schedules are reconciled with the
+    db in chunks of chunk_size courses as they are scraped, so memory does not
+    grow with the whole semester
+    Input:
+        - chunk_size: the number of courses reconciled at once
+        - max_rss_mb: flush the current chunk early when the process RSS (MB)
+        goes above it
+    """
+    if ctx is None:
+        ctx = RunContext(db)
+
+    # Update the existing rooms once, the chunks only create the new ones
+    create_rooms(db, update=True, ctx=ctx)
+
+    chunk_courses_ids = []
+    chunk_schedules = []
+
+    def sync_chunk():
+        create_rooms(db, chunk_schedules, create_only=True, ctx=ctx)
+        update_schedules(db, chunk_schedules, ctx, courses_ids=chunk_courses_ids)
+        create_courses_bookings(
+            db, chunk_schedules, ctx=ctx, courses_ids=chunk_courses_ids
+        )
+        chunk_courses_ids.clear()
+        chunk_schedules.clear()
+
+    for course_id, schedule in iter_courses_schedules(db, ctx):
+        chunk_courses_ids.append(course_id)
+        chunk_schedules.extend(schedule)
+
+        if len(chunk_courses_ids) >= chunk_size or (
+            max_rss_mb is not None and current_rss_mb() > max_rss_mb
+        ):
+            sync_chunk()
+
+    if chunk_courses_ids:
+        sync_chunk()
@@ -8,6 +8,21 @@ class Settings(BaseSettings):
     DB_NAME: str = ""
     SECRET_KEY: str = ""
 
+    # Connection profile (see db_utils.init_and_connect)
+    DB_MAX_POOL_SIZE: int = 100
+    DB_MIN_POOL_SIZE: int = 0
+    # Wire compressors by preference, negotiated with the server. The ones
+    # not installed are skipped: zstd and snappy need the pymongo[zstd] and
+    # pymongo[snappy] extras, not dependencies of the scraper
+    DB_COMPRESSORS: str = "zlib"
+    DB_ZLIB_COMPRESSION_LEVEL: int = 6
+    # Write concern of the client, and of the bulk writes of the reconciled
+    # schedules and bookings (see db_utils.BULK_WRITE_CONCERN_COLLECTIONS),
+    # idempotent since the next run writes them again
+    DB_WRITE_CONCERN: str = "majority"
+    DB_BULK_WRITE_CONCERN: str = "1"
+    DB_READ_CONCERN: str = "local"
+
     @property
     def connection_string(self):
-        return f"mongodb+srv://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_URL}/?retryWrites=true&w=majority"
+        return f"mongodb+srv://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_URL}/?retryWrites=true"
@@ -0,0 +1,383 @@
+import contextlib
+import importlib.util
+import io
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from bson import ObjectId
+
+import db_sync
+from db_utils import RunContext
+
+
+@unittest.skipUnless(importlib.util.find_spec("mongomock"), "needs mongomock")
+class ExpectedChangeRatioTest(unittest.TestCase):
+    def setUp(self):
+        import mongomock
+
+        self.db = mongomock.MongoClient().db
+        self.today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def add_schedule(self, course_id, start_datetime, available=True):
+        self.db.course_schedules.insert_one(
+            {
+                "course_id": course_id,
+                "start_datetime": start_datetime,
+                "end_datetime": start_datetime + timedelta(hours=2),
+                "available": available,
+            }
+        )
+
+    def expected_change_ratio(self, courses_ids):
+        with mock.patch.object(
+            db_sync, "reconciled_courses_ids", return_value=courses_ids
+        ):
+            return db_sync.expected_change_ratio(self.db, RunContext(self.db))
+
+    def test_without_semester(self):
+        self.assertEqual(self.expected_change_ratio([ObjectId()]), 0.0)
+
+    def test_never_scheduled_courses_are_left_out(self):
+        self.db.semesters.insert_one(
+            {
+                "name": "Current",
+                "type": "fall",
+                "start_date": self.today - timedelta(days=30),
+                "end_date": self.today + timedelta(days=70),
+                "available": True,
+            }
+        )
+        unchanged, changing, never_scheduled = ObjectId(), ObjectId(), ObjectId()
+        self.add_schedule(unchanged, self.today + timedelta(days=1))
+        # Only scheduled in a previous semester
+        self.add_schedule(changing, self.today - timedelta(days=365))
+
+        self.assertEqual(
+            self.expected_change_ratio([unchanged, changing, never_scheduled]), 0.5
+        )
+        self.assertEqual(self.expected_change_ratio([never_scheduled]), 0.0)
+
+
+class ParseStudyplanSemesterTest(unittest.TestCase):
+    def test_promo(self):
+        self.assertEqual(
+            db_sync.parse_studyplan_semester(
+                "Informatique", "2025-2026 Bachelor semestre 3"
+            ),
+            ("Informatique - Bachelor semestre 3", "Bachelor semestre 3", "fall"),
+        )
+
+    def test_without_promo(self):
+        self.assertEqual(
+            db_sync.parse_studyplan_semester(
+                "EDOC", "2025-2026 Cours généraux et externes EDOC"
+            ),
+            ("EDOC", "Cours généraux et externes EDOC", "year"),
+        )
+
+    def test_type_from_section(self):
+        self.assertEqual(
+            db_sync.parse_studyplan_semester(
+                "Cours généraux et externes EDOC", "2025-2026 Autre"
+            ),
+            ("Cours généraux et externes EDOC", "Autre", "year"),
+        )
+        self.assertEqual(
+            db_sync.parse_studyplan_semester("Inconnue", "2025-2026 Autre"),
+            ("Inconnue", "Autre", None),
+        )
+
+
+@unittest.skipUnless(importlib.util.find_spec("mongomock"), "needs mongomock")
+class StudyplanResolverTest(unittest.TestCase):
+    def setUp(self):
+        import mongomock
+
+        self.db = mongomock.MongoClient().db
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.semesters = {}
+        for name, semester_type, start in (
+            ("Past", "fall", -400),
+            ("Current", "fall", -30),
+            ("Next", "spring", 120),
+            ("Year", "year", -30),
+        ):
+            self.semesters[name] = self.db.semesters.insert_one(
+                {
+                    "name": name,
+                    "type": semester_type,
+                    "start_date": today + timedelta(days=start),
+                    "end_date": today + timedelta(days=start + 100),
+                    "available": True,
+                }
+            ).inserted_id
+        self.units = {
+            name: self.db.units.insert_one(
+                {"name": name, "available": True}
+            ).inserted_id
+            for name in (
+                "Informatique - Bachelor semestre 3",
+                "Mineur - Semestre printemps",
+                "EDOC",
+            )
+        }
+        self.studyplans = {
+            (unit, semester): self.db.studyplans.insert_one(
+                {
+                    "unit_id": self.units[unit],
+                    "semester_id": self.semesters[semester],
+                    "available": True,
+                }
+            ).inserted_id
+            for unit, semester in (
+                ("Informatique - Bachelor semestre 3", "Current"),
+                ("Informatique - Bachelor semestre 3", "Past"),
+                ("Mineur - Semestre printemps", "Next"),
+            )
+        }
+        self.ctx = RunContext(self.db)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.resolver = db_sync.get_run_resolver(self.ctx)
+
+    def test_resolve(self):
+        self.assertEqual(
+            self.resolver.resolve("Informatique", "2025-2026 Bachelor semestre 3"),
+            (
+                self.units["Informatique - Bachelor semestre 3"],
+                self.semesters["Current"],
+                self.studyplans[("Informatique - Bachelor semestre 3", "Current")],
+            ),
+        )
+        self.assertEqual(
+            self.resolver.resolve("Mineur", "2025-2026 Semestre printemps"),
+            (
+                self.units["Mineur - Semestre printemps"],
+                self.semesters["Next"],
+                self.studyplans[("Mineur - Semestre printemps", "Next")],
+            ),
+        )
+
+    def test_not_found(self):
+        # No studyplan of the unit in the year
+        self.assertEqual(
+            self.resolver.resolve("EDOC", "2025-2026 Cours généraux et externes EDOC"),
+            (self.units["EDOC"], self.semesters["Year"], None),
+        )
+        self.assertEqual(
+            self.resolver.resolve("Inconnue", "2025-2026 Autre"), (None, None, None)
+        )
+
+    def test_only_run_semesters_studyplans(self):
+        self.assertEqual(
+            set(self.resolver.studyplans.values()),
+            {
+                self.studyplans[("Informatique - Bachelor semestre 3", "Current")],
+                self.studyplans[("Mineur - Semestre printemps", "Next")],
+            },
+        )
+
+    def test_cached_per_run(self):
+        with (
+            mock.patch.object(db_sync, "get_current_or_next_semester") as get_semester,
+            mock.patch.object(type(self.db.units), "find") as find,
+        ):
+            resolver = db_sync.get_run_resolver(self.ctx)
+            resolver.resolve("Informatique", "2025-2026 Bachelor semestre 3")
+            resolver.resolve("Mineur", "2025-2026 Semestre printemps")
+
+        self.assertIs(resolver, self.resolver)
+        get_semester.assert_not_called()
+        find.assert_not_called()
+
+
+class ReconciledCoursesIdsTest(unittest.TestCase):
+    def test_skipped_courses(self):
+        semester, year, man, failed = (ObjectId() for _ in range(4))
+        ctx = RunContext(None)
+        ctx.memo["semester_courses"] = (
+            [{"_id": semester}, {"_id": man}, {"_id": failed}],
+            [{"_id": year}],
+            [man],
+        )
+
+        self.assertEqual(
+            db_sync.reconciled_courses_ids(None, ctx), [semester, failed, year]
+        )
+        # The courses that could not be scraped keep their schedules
+        ctx.memo["failed_courses_ids"] = [failed]
+        self.assertEqual(db_sync.reconciled_courses_ids(None, ctx), [semester, year])
+        self.assertEqual(
+            db_sync.reconciled_courses_ids(None, ctx, [failed, year]), [year]
+        )
+
+
+@unittest.skipUnless(importlib.util.find_spec("mongomock"), "needs mongomock")
+class SyncTeachersTest(unittest.TestCase):
+    def setUp(self):
+        import mongomock
+
+        self.db = mongomock.MongoClient().db
+
+    def test_teachers_without_url_are_matched_by_name(self):
+        self.db.teachers.insert_many(
+            [
+                {"name": "Ada", "people_url": None, "available": True},
+                {"name": "Alan", "people_url": None, "available": True},
+                {"name": "Old", "people_url": "/old", "available": False},
+            ]
+        )
+        self.db.courses.insert_one({"code": "CS-101", "available": True})
+        courses = [
+            {
+                "code": "CS-101",
+                "teachers": [("Alan", None), ("Grace", None), ("New", "/old")],
+            }
+        ]
+
+        db_sync.sync_teachers(self.db, courses, RunContext(self.db))
+
+        teachers_ids = {
+            teacher["name"]: teacher["_id"] for teacher in self.db.teachers.find()
+        }
+        self.assertEqual(
+            self.db.courses.find_one({"code": "CS-101"})["teachers"],
+            [teachers_ids["Alan"], teachers_ids["Grace"], teachers_ids["New"]],
+        )
+
+    def sync_teachers(self, courses):
+        with contextlib.redirect_stdout(io.StringIO()):
+            db_sync.sync_teachers(self.db, courses, RunContext(self.db))
+        return self.db.courses.find_one({"code": "CS-101"})["teachers"]
+
+    def test_changed_people_url(self):
+        ada = self.db.teachers.insert_one(
+            {"name": "Ada", "people_url": "/ada-old", "available": True}
+        ).inserted_id
+        self.db.courses.insert_one({"code": "CS-101", "available": True})
+
+        teachers = self.sync_teachers(
+            [{"code": "CS-101", "teachers": [("Ada", "/ada")]}]
+        )
+
+        self.assertEqual(teachers, [ada])
+        self.assertEqual(self.db.teachers.count_documents({}), 1)
+        self.assertEqual(self.db.teachers.find_one(ada)["people_url"], "/ada")
+
+    def test_unavailable_teacher(self):
+        ada = self.db.teachers.insert_one(
+            {"name": "Ada", "people_url": "/ada-old", "available": False}
+        ).inserted_id
+        alan = self.db.teachers.insert_one(
+            {"name": "Alan", "people_url": "/alan", "available": False}
+        ).inserted_id
+        self.db.courses.insert_one({"code": "CS-101", "available": True})
+
+        # Matched by the upserts of the new teachers, which insert nothing
+        teachers = self.sync_teachers(
+            [{"code": "CS-101", "teachers": [("Ada", "/ada"), ("Alan", None)]}]
+        )
+
+        self.assertEqual(teachers, [ada, alan])
+        self.assertEqual(self.db.teachers.count_documents({}), 2)
+        self.assertEqual(self.db.teachers.find_one(ada)["people_url"], "/ada")
+        self.assertEqual(self.db.teachers.find_one(alan)["people_url"], "/alan")
+
+
+@unittest.skipUnless(importlib.util.find_spec("mongomock"), "needs mongomock")
+class RefreshCoursesSchedulesTest(unittest.TestCase):
+    def setUp(self):
+        import mongomock
+
+        self.db = mongomock.MongoClient().db
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.db.semesters.insert_one(
+            {
+                "name": "Current",
+                "type": "fall",
+                "start_date": today - timedelta(days=30),
+                "end_date": today + timedelta(days=70),
+                "available": True,
+            }
+        )
+        self.room_id = self.db.rooms.insert_one(
+            {"name": "BC 01", "available": True}
+        ).inserted_id
+        self.course_id = ObjectId()
+        self.past = self.insert_schedule(today - timedelta(days=365))
+        self.gone = self.insert_schedule(today + timedelta(days=1, hours=8))
+        self.kept = self.insert_schedule(today + timedelta(days=2, hours=8))
+        self.incoming = [
+            {
+                "course_id": self.course_id,
+                "start_datetime": start,
+                "end_datetime": start + timedelta(hours=2),
+                "label": "cours",
+                "rooms": ["BC 01"],
+            }
+            for start in (
+                today + timedelta(days=2, hours=8),
+                today + timedelta(days=3, hours=8),
+            )
+        ]
+
+    def insert_schedule(self, start):
+        schedule_id = self.db.course_schedules.insert_one(
+            {
+                "course_id": self.course_id,
+                "start_datetime": start,
+                "end_datetime": start + timedelta(hours=2),
+                "label": "cours",
+                "available": True,
+            }
+        ).inserted_id
+        self.db.course_bookings.insert_one(
+            {"schedule_id": schedule_id, "room_id": self.room_id, "available": True}
+        )
+        return schedule_id
+
+    def refresh(self, mode):
+        import mongomock
+
+        with (
+            # mongomock has no collection options (validator)
+            mock.patch.object(
+                mongomock.collection.Collection, "options", create=True
+            ) as options,
+            mock.patch.object(
+                db_sync, "reconciled_courses_ids", return_value=[self.course_id]
+            ),
+            contextlib.redirect_stdout(io.StringIO()),
+            contextlib.redirect_stderr(io.StringIO()),
+        ):
+            options.return_value = {}
+            db_sync.refresh_courses_schedules(
+                self.db, self.incoming, RunContext(self.db), mode=mode
+            )
+
+    def available(self, schedule_id):
+        return self.db.course_schedules.find_one({"_id": schedule_id})["available"]
+
+    def test_modes(self):
+        for mode in ("diff", "rebuild"):
+            with self.subTest(mode=mode):
+                self.setUp()
+                self.refresh(mode)
+
+                # The schedules of previous semesters are left out
+                self.assertTrue(self.available(self.past))
+                self.assertTrue(
+                    self.db.course_bookings.find_one({"schedule_id": self.past})[
+                        "available"
+                    ]
+                )
+                self.assertFalse(self.available(self.gone))
+                self.assertTrue(self.available(self.kept))
+                self.assertEqual(self.db.course_schedules.count_documents({}), 4)
+                self.assertEqual(
+                    self.db.course_bookings.count_documents({"available": True}), 3
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
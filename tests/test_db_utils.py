@@ -0,0 +1,212 @@
+import contextlib
+import importlib.util
+import io
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from bson import ObjectId
+
+from db_utils import COLLECTIONS, SCHEMA_META_ID, BulkWriter, RunContext, init
+
+
+@unittest.skipUnless(importlib.util.find_spec("mongomock"), "needs mongomock")
+class BulkWriterTest(unittest.TestCase):
+    def setUp(self):
+        import mongomock
+
+        self.db = mongomock.MongoClient().db
+        self.db.teachers.create_index("name", unique=True)
+        self.db.teachers.insert_many([{"name": "T1"}, {"name": "T4"}])
+        patcher = mock.patch.object(
+            mongomock.collection.Collection,
+            "bulk_write",
+            autospec=True,
+            side_effect=mongomock.collection.Collection.bulk_write,
+        )
+        self.bulk_write = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_chunks(self):
+        writer = BulkWriter(self.db, chunk_size=3)
+        for i in range(7):
+            writer.upsert("teachers", {"name": f"N{i}"})
+        writer.set_fields("teachers", [f"id{i}" for i in range(5)], {"x": 1})
+        writer.delete("teachers", "name", [f"D{i}" for i in range(4)])
+
+        self.assertEqual(writer.pending("teachers"), 7 + 2 + 2)
+        counts = writer.flush()
+
+        # 11 operations, in chunks of 3
+        self.assertEqual(
+            [len(call.args[1]) for call in self.bulk_write.call_args_list],
+            [3, 3, 3, 2],
+        )
+        self.assertEqual(counts["inserted"], 7)
+        self.assertEqual(writer.pending(), 0)
+        self.assertEqual(writer.flush()["inserted"], 0)
+
+    def test_upserted_ids(self):
+        writer = BulkWriter(self.db, chunk_size=2)
+        documents = [{"name": f"N{i}"} for i in range(5)]
+        for document in documents:
+            writer.upsert("teachers", document)
+
+        counts = writer.flush("teachers")
+
+        self.assertEqual(counts["inserted"], 5)
+        ids = {t["name"]: t["_id"] for t in self.db.teachers.find()}
+        self.assertEqual(
+            [d["_id"] for d in documents], [ids[f"N{i}"] for i in range(5)]
+        )
+
+    def test_upserted_ids_by_index(self):
+        # mongomock numbers the upserts among themselves, the server by their
+        # index in the request
+        upserted_id = ObjectId()
+        self.bulk_write.side_effect = None
+        self.bulk_write.return_value.bulk_api_result = {
+            "nUpserted": 1,
+            "nMatched": 1,
+            "upserted": [{"index": 1, "_id": upserted_id}],
+        }
+        writer = BulkWriter(self.db)
+        documents = [{"name": "T1"}, {"name": "N1"}]
+        for document in documents:
+            writer.upsert("teachers", document)
+
+        counts = writer.flush("teachers")
+
+        self.assertEqual(counts["inserted"], 1)
+        self.assertEqual(counts["matched"], 1)
+        self.assertNotIn("_id", documents[0])
+        self.assertEqual(documents[1]["_id"], upserted_id)
+
+    def test_failed_writes(self):
+        writer = BulkWriter(self.db, chunk_size=2)
+        applied = []
+        writer.update("teachers", {"name": "T1"}, {"$set": {"name": "T4"}})
+        writer.update(
+            "teachers",
+            {"name": "T4"},
+            {"$set": {"x": 1}},
+            applied=lambda: applied.append("T4"),
+        )
+        writer.update(
+            "teachers",
+            {"name": "T1"},
+            {"$set": {"x": 1}},
+            applied=lambda: applied.append("T1"),
+        )
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            counts = writer.flush()
+
+        self.assertEqual(counts["failed"], 1)
+        self.assertEqual(counts["modified"], 2)
+        self.assertEqual(applied, ["T4", "T1"])
+
+
+@unittest.skipUnless(importlib.util.find_spec("mongomock"), "needs mongomock")
+class RunContextTest(unittest.TestCase):
+    def setUp(self):
+        import mongomock
+
+        self.db = mongomock.MongoClient().db
+        self.db.courses.create_index("code", unique=True)
+        self.db.courses.insert_many(
+            [{"code": "A", "available": True}, {"code": "B", "available": True}]
+        )
+
+    def test_failed_updates_are_not_cached(self):
+        ctx = RunContext(self.db)
+        courses = ctx.index("courses", "code")
+        ctx.update("courses", courses["A"], {"name": "Alpha"})
+        # Duplicate code, rejected by the unique index
+        ctx.update("courses", courses["B"], {"code": "A"})
+
+        self.assertNotIn("name", courses["A"])
+        counts = ctx.flush("courses")
+
+        self.assertEqual(counts["failed"], 1)
+        self.assertEqual(courses["A"]["name"], "Alpha")
+        self.assertEqual(courses["B"]["code"], "B")
+
+    def test_load_filter(self):
+        ctx = RunContext(self.db)
+        ctx.load("courses", {"code": "A"})
+
+        self.assertEqual([course["code"] for course in ctx.find("courses")], ["A"])
+
+
+@unittest.skipUnless(importlib.util.find_spec("mongomock"), "needs mongomock")
+class InitTest(unittest.TestCase):
+    def setUp(self):
+        import mongomock
+
+        self.db = mongomock.MongoClient().db
+        # mongomock has no collMod
+        patcher = mock.patch.object(mongomock.database.Database, "command")
+        self.command = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def collmod_collections(self):
+        collections = [call.args[1] for call in self.command.call_args_list]
+        self.command.reset_mock()
+        return collections
+
+    def init(self, force=False):
+        with contextlib.redirect_stdout(io.StringIO()):
+            init(self.db, force=force)
+        return self.db.schema_meta.find_one({"_id": SCHEMA_META_ID})["collections"]
+
+    def test_skips_unchanged_schema(self):
+        applied = self.init()
+        self.assertEqual(sorted(self.collmod_collections()), sorted(COLLECTIONS))
+
+        self.assertEqual(self.init(), applied)
+        self.assertEqual(self.collmod_collections(), [])
+
+        # Only the collection whose hash changed
+        self.db.schema_meta.update_one(
+            {"_id": SCHEMA_META_ID}, {"$set": {"collections.rooms": "outdated"}}
+        )
+        self.assertEqual(self.init(), applied)
+        self.assertEqual(self.collmod_collections(), ["rooms"])
+
+    def test_force(self):
+        applied = self.init()
+        self.collmod_collections()
+
+        self.assertEqual(self.init(force=True), applied)
+        self.assertEqual(sorted(self.collmod_collections()), sorted(COLLECTIONS))
+
+    def test_duplicated_event_bookings(self):
+        event = {
+            "room_id": ObjectId(),
+            "start_datetime": datetime(2025, 10, 6, 8),
+            "end_datetime": datetime(2025, 10, 6, 10),
+            "name": "Defense",
+        }
+        self.db.event_bookings.insert_many(
+            [
+                {**event, "available": False},
+                {**event, "available": True},
+                {**event, "available": True},
+                {**event, "name": "Other", "available": True},
+            ]
+        )
+
+        applied = self.init()
+
+        self.assertIn("event_bookings", applied)
+        self.assertIn("event_booking_room", self.db.event_bookings.index_information())
+        self.assertEqual(self.db.event_bookings.count_documents({}), 2)
+        self.assertEqual(self.db.event_bookings.count_documents({"name": "Defense"}), 1)
+        self.assertTrue(
+            self.db.event_bookings.find_one({"name": "Defense"})["available"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from free_rooms import FreeRoomsIndex
+
+ORIGIN = datetime(2025, 10, 6)
+
+
+def at(hours):
+    return ORIGIN + timedelta(hours=hours)
+
+
+def room(i, capacity=None, building=None):
+    return {"_id": i, "name": f"R{i}", "capacity": capacity, "building": building}
+
+
+class FreeRoomsIndexTest(unittest.TestCase):
+    def test_free_mask_matches_brute_force(self):
+        rng = random.Random(0)
+        rooms = [room(i) for i in range(20)]
+        intervals = []
+        for _ in range(300):
+            start = at(rng.randrange(0, 24 * 7 * 4) / 4)
+            intervals.append(
+                (
+                    rng.randrange(21),
+                    start,
+                    start + timedelta(minutes=rng.randrange(1, 240)),
+                )
+            )
+        index = FreeRoomsIndex(rooms, intervals, ORIGIN)
+        candidates = np.arange(len(rooms))
+
+        for _ in range(500):
+            start = at(rng.randrange(-8, 24 * 7 * 4 + 8) / 4)
+            end = start + timedelta(minutes=rng.randrange(1, 300))
+            expected = [
+                not any(
+                    room_id == i and booking_start < end and booking_end > start
+                    for room_id, booking_start, booking_end in intervals
+                )
+                for i in range(len(rooms))
+            ]
+            with self.subTest(start=start, end=end):
+                self.assertEqual(
+                    index.free_mask(candidates, start, end).tolist(), expected
+                )
+
+    def test_touching_bookings(self):
+        index = FreeRoomsIndex(
+            [room(0)], [(0, at(8), at(10)), (0, at(10), at(12))], ORIGIN
+        )
+
+        self.assertEqual(index.starts.tolist(), [8 * 3600])
+        self.assertEqual(index.ends.tolist(), [12 * 3600])
+        self.assertEqual(index.find_free_rooms(at(12), at(13)), [index.rooms[0]])
+        self.assertEqual(index.find_free_rooms(at(7), at(8)), [index.rooms[0]])
+        self.assertEqual(index.find_free_rooms(at(11), at(11.5)), [])
+
+    def test_filters(self):
+        rooms = [room(0, 20, "BC"), room(1, 100, "BC"), room(2, 200, "CM")]
+        index = FreeRoomsIndex(rooms, [(2, at(8), at(10))], ORIGIN)
+
+        free = index.find_free_rooms(at(9), at(10), min_capacity=50)
+        self.assertEqual([r["name"] for r in free], ["R1"])
+        free = index.find_free_rooms(at(11), at(12), min_capacity=50, building="CM")
+        self.assertEqual([r["name"] for r in free], ["R2"])
+
+    def test_next_free_slot(self):
+        index = FreeRoomsIndex(
+            [room(0), room(1)],
+            [(0, at(8), at(10)), (0, at(10.5), at(12)), (0, at(13), at(14))],
+            ORIGIN,
+        )
+
+        # Free now, until the next booking
+        self.assertEqual(index.next_free_slot("R0", at(7)), (at(7), at(8)))
+        # Booked now, free after it
+        self.assertEqual(index.next_free_slot("R0", at(9)), (at(10), at(10.5)))
+        # The first gap long enough
+        self.assertEqual(
+            index.next_free_slot("R0", at(9), duration=timedelta(hours=1)),
+            (at(12), at(13)),
+        )
+        self.assertEqual(
+            index.next_free_slot("R0", at(9), duration=timedelta(hours=2)),
+            (at(14), None),
+        )
+        # No bookings
+        self.assertEqual(index.next_free_slot("R1", at(9)), (at(9), None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import random
+import unittest
+
+import numpy as np
+
+from nearest_rooms import RoomsGrid
+
+# Around the EPFL campus
+LATITUDE, LONGITUDE = 46.52, 6.565
+
+
+def point(latitude, longitude):
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+class RoomsGridTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(0)
+        self.rooms = [
+            {
+                "name": f"R{i}",
+                "coordinates": point(
+                    LATITUDE + rng.uniform(-0.005, 0.005),
+                    LONGITUDE + rng.uniform(-0.008, 0.008),
+                ),
+            }
+            for i in range(300)
+        ]
+        # Without coordinates, and legacy [latitude, longitude] ones
+        self.rooms[10]["coordinates"] = None
+        self.rooms[20]["coordinates"] = [LATITUDE, LONGITUDE]
+        self.grid = RoomsGrid(self.rooms)
+        self.rng = rng
+
+    def brute_force(self, latitude, longitude, count, mask):
+        x, y = self.grid.project(latitude, longitude)
+        distances = np.hypot(self.grid.xs - x, self.grid.ys - y)
+        rooms = [
+            i
+            for i in np.argsort(distances, kind="stable")
+            if mask[i] and not np.isnan(distances[i])
+        ]
+        return rooms[:count], distances[rooms[:count]]
+
+    def test_matches_brute_force(self):
+        for _ in range(200):
+            latitude = LATITUDE + self.rng.uniform(-0.01, 0.01)
+            longitude = LONGITUDE + self.rng.uniform(-0.015, 0.015)
+            count = self.rng.randint(1, 10)
+            mask = np.array([self.rng.random() < 0.3 for _ in self.rooms])
+
+            rooms, distances = self.grid.nearest(latitude, longitude, count, mask)
+            expected_rooms, expected_distances = self.brute_force(
+                latitude, longitude, count, mask
+            )
+            with self.subTest(latitude=latitude, longitude=longitude, count=count):
+                self.assertEqual(rooms.tolist(), [int(i) for i in expected_rooms])
+                np.testing.assert_allclose(distances, expected_distances)
+
+    def test_skips_unlocated_rooms(self):
+        mask = np.ones(len(self.rooms), dtype=bool)
+
+        rooms, _ = self.grid.nearest(LATITUDE, LONGITUDE, len(self.rooms), mask)
+
+        self.assertEqual(len(rooms), len(self.rooms) - 2)
+        self.assertNotIn(10, rooms)
+        self.assertNotIn(20, rooms)
+
+    def test_fewer_rooms_than_count(self):
+        mask = np.zeros(len(self.rooms), dtype=bool)
+        mask[[5, 7]] = True
+
+        rooms, _ = self.grid.nearest(LATITUDE, LONGITUDE, 5, mask)
+
+        self.assertEqual(sorted(rooms.tolist()), [5, 7])
+
+    def test_no_located_rooms(self):
+        grid = RoomsGrid([{"name": "R0", "coordinates": [LATITUDE, LONGITUDE]}])
+
+        rooms, distances = grid.nearest(LATITUDE, LONGITUDE, 1, np.ones(1, dtype=bool))
+
+        self.assertEqual(len(rooms), 0)
+        self.assertEqual(len(distances), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
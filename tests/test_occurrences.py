@@ -0,0 +1,159 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from occurrences import OccurrenceStore
+from schedule_parser import create_semester_schedule
+
+
+def schedule(course_id, start_datetime, hours, label, rooms):
+    return {
+        "start_datetime": start_datetime,
+        "end_datetime": start_datetime + timedelta(hours=hours),
+        "label": label,
+        "rooms": rooms,
+        "course_id": course_id,
+    }
+
+
+class OccurrenceStoreTest(unittest.TestCase):
+    def setUp(self):
+        first, second = ObjectId(), ObjectId()
+        monday = datetime(2025, 9, 8, 8, 15)
+        self.schedules = [
+            schedule(first, monday, 2, "cours", ["BC 01", "BC 02"]),
+            schedule(first, monday + timedelta(days=2), 1, "exercice", []),
+            schedule(second, monday + timedelta(hours=4), 2, "cours", ["CM 1"]),
+            schedule(second, monday + timedelta(days=7), 3, None, ["BC 02"]),
+        ]
+
+    def test_from_schedules_round_trip(self):
+        store = OccurrenceStore.from_schedules(self.schedules)
+
+        self.assertEqual(len(store), 4)
+        self.assertEqual(store.rooms, ["BC 01", "BC 02", "CM 1"])
+        self.assertEqual(store.to_schedules(), self.schedules)
+
+    def test_empty(self):
+        self.assertEqual(OccurrenceStore.from_schedules([]).to_schedules(), [])
+        self.assertEqual(len(OccurrenceStore.concatenate([])), 0)
+
+    def test_concatenate_remaps_tables(self):
+        stores = [
+            OccurrenceStore.from_schedules(self.schedules[:2]),
+            OccurrenceStore(),
+            OccurrenceStore.from_schedules(self.schedules[2:]),
+        ]
+
+        store = OccurrenceStore.concatenate(stores)
+
+        self.assertEqual(store.to_schedules(), self.schedules)
+        # The tables are shared between the stores
+        self.assertEqual(store.rooms, ["BC 01", "BC 02", "CM 1"])
+        self.assertEqual(store.labels, ["cours", "exercice", None])
+
+    def test_take(self):
+        store = OccurrenceStore.from_schedules(self.schedules)
+        order = [3, 0, 2]
+
+        self.assertEqual(
+            store.take(order).to_schedules(), [self.schedules[i] for i in order]
+        )
+        self.assertEqual(store.take([]).to_schedules(), [])
+
+
+def baseline_semester_schedule(schedule, db_semester):
+    """
+    The day by day expansion that OccurrenceStore.from_weekly replaces
+    """
+    skip_dates = db_semester.get("skip_dates") or []
+    semester_schedule = []
+    current_date = db_semester["start_date"]
+    while current_date <= db_semester["end_date"]:
+        if current_date not in skip_dates:
+            for event in schedule:
+                if event["day"] != current_date.weekday():
+                    continue
+                start_datetime = current_date + timedelta(hours=event["start_hour"])
+                semester_schedule.append(
+                    {
+                        "start_datetime": start_datetime,
+                        "end_datetime": start_datetime
+                        + timedelta(hours=int(event["duration"])),
+                        "label": event["label"],
+                        "rooms": event["rooms"],
+                    }
+                )
+        current_date += timedelta(days=1)
+    return semester_schedule
+
+
+# Semesters crossing a DST change in Europe/Zurich (2025-10-26, 2026-03-29)
+SEMESTERS = [
+    {
+        "start_date": datetime(2025, 9, 8),
+        "end_date": datetime(2025, 12, 19),
+        # The autumn break week and a holiday
+        "skip_dates": [datetime(2025, 10, 20) + timedelta(days=i) for i in range(5)]
+        + [datetime(2025, 9, 22)],
+    },
+    {
+        "start_date": datetime(2026, 2, 16),
+        "end_date": datetime(2026, 5, 29),
+        # The Easter week, right after the DST change
+        "skip_dates": [datetime(2026, 3, 30) + timedelta(days=i) for i in range(7)],
+    },
+    {
+        "start_date": datetime(2026, 3, 23),
+        "end_date": datetime(2026, 4, 5),
+    },
+]
+
+
+class FromWeeklyTest(unittest.TestCase):
+    def random_schedule(self, rng):
+        return [
+            {
+                "day": rng.randrange(7),
+                "start_hour": rng.randrange(8, 20),
+                "duration": rng.randint(1, 4),
+                "label": rng.choice(["cours", "exercice", "projet", None]),
+                "rooms": rng.sample(["BC 01", "CE 1 1", "CM 1", "INM 200"], 2)[
+                    : rng.randrange(3)
+                ],
+            }
+            for _ in range(rng.randrange(6))
+        ]
+
+    def test_matches_baseline(self):
+        rng = random.Random(0)
+        for semester in SEMESTERS:
+            for _ in range(50):
+                schedule = self.random_schedule(rng)
+                with self.subTest(semester=semester["start_date"], schedule=schedule):
+                    self.assertEqual(
+                        create_semester_schedule(schedule, semester),
+                        baseline_semester_schedule(schedule, semester),
+                    )
+
+    def test_skipped_weeks(self):
+        semester = SEMESTERS[1]
+        schedule = [
+            {"day": 0, "start_hour": 8, "duration": 2, "label": "cours", "rooms": []}
+        ]
+        starts = [
+            event["start_datetime"]
+            for event in create_semester_schedule(schedule, semester)
+        ]
+
+        self.assertEqual(len(starts), 14)
+        self.assertNotIn(datetime(2026, 3, 30, 8), starts)
+        # Same wall-clock time on both sides of the DST change
+        self.assertIn(datetime(2026, 3, 23, 8), starts)
+        self.assertIn(datetime(2026, 4, 6, 8), starts)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import itertools
+import random
+import unittest
+
+import numpy as np
+
+from plan_rooms import simplify_line, simplify_ring
+
+TOLERANCE = 0.2
+
+
+def line_distances(points, first, last):
+    """
+    Output:
+        - distances: distance of each of the points to the line (first, last)
+    """
+    direction = last - first
+    inner = points - first
+    return np.abs(direction[0] * inner[:, 1] - direction[1] * inner[:, 0]) / np.hypot(
+        *direction
+    )
+
+
+def noisy_rectangle(rng, width, height, points_per_side):
+    corners = np.array([[0, 0], [width, 0], [width, height], [0, height], [0, 0]])
+    sides = [
+        corners[i]
+        + np.linspace(0, 1, points_per_side, endpoint=False)[:, None]
+        * (corners[i + 1] - corners[i])
+        for i in range(4)
+    ]
+    ring = np.vstack(sides)
+    ring[1:] += rng.uniform(-TOLERANCE / 4, TOLERANCE / 4, ring[1:].shape)
+    return np.vstack((ring, ring[:1])) + [2_533_000, 1_152_000]
+
+
+class SimplifyTest(unittest.TestCase):
+    def test_simplify_line_within_tolerance(self):
+        rng = np.random.default_rng(0)
+        line = np.cumsum(rng.uniform(-1, 1, (200, 2)), axis=0)
+
+        simplified = simplify_line(line, TOLERANCE)
+
+        np.testing.assert_array_equal(simplified[[0, -1]], line[[0, -1]])
+        # Every dropped point is within the tolerance of the line of the kept
+        # points around it
+        kept = [i for i, point in enumerate(line) if (simplified == point).all(1).any()]
+        for first, last in itertools.pairwise(kept):
+            distances = line_distances(line[first + 1 : last], line[first], line[last])
+            self.assertTrue((distances <= TOLERANCE + 1e-9).all())
+
+    def test_rectangle(self):
+        rng = np.random.default_rng(0)
+        ring = noisy_rectangle(rng, 8, 5, 20)
+
+        simplified = simplify_ring(ring, TOLERANCE)
+
+        self.assertEqual(len(simplified), 5)
+        np.testing.assert_array_equal(simplified[0], simplified[-1])
+
+    def test_stays_closed(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            ring = noisy_rectangle(
+                np.random.default_rng(rng.randrange(2**32)),
+                rng.uniform(0.1, 10),
+                rng.uniform(0.1, 10),
+                rng.randint(1, 10),
+            )
+            # Sometimes given open
+            if rng.random() < 0.5:
+                ring = ring[:-1]
+            tolerance = rng.choice([0, TOLERANCE, 5, 100])
+
+            simplified = simplify_ring(ring, tolerance)
+
+            with self.subTest(points=len(ring), tolerance=tolerance):
+                np.testing.assert_array_equal(simplified[0], simplified[-1])
+                self.assertGreaterEqual(len(simplified), 4)
+
+    def test_collapsing_ring_kept(self):
+        # Collinear points, the simplified ring would be a back and forth
+        ring = np.array([[0, 0], [1, 0], [2, 0], [3, 0], [2, 0], [1, 0]], dtype=float)
+
+        simplified = simplify_ring(ring, TOLERANCE)
+
+        np.testing.assert_array_equal(simplified, np.vstack((ring, ring[:1])))
+
+    def test_small_ring(self):
+        triangle = np.array([[0, 0], [1, 0], [0, 1]], dtype=float)
+
+        simplified = simplify_ring(triangle, 100)
+
+        np.testing.assert_array_equal(simplified, np.vstack((triangle, triangle[:1])))
+
+
+if __name__ == "__main__":
+    unittest.main()
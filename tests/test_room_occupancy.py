@@ -0,0 +1,152 @@
+import importlib.util
+import unittest
+from datetime import datetime, timedelta
+
+from bson import Binary
+
+from room_occupancy import (
+    SLOT_MINUTES,
+    SLOTS_PER_DAY,
+    is_room_free,
+    occupancy_bitmaps,
+    slots_mask,
+)
+
+START = datetime(2025, 10, 6)
+
+
+def occupied_slots(slots):
+    """
+    Output:
+        - slots: indices of the set bits of a packed day
+    """
+    bits = int.from_bytes(slots.tobytes(), "little")
+    return [i for i in range(SLOTS_PER_DAY) if bits >> i & 1]
+
+
+class OccupancyBitmapsTest(unittest.TestCase):
+    def test_slot_boundaries(self):
+        slots = occupancy_bitmaps(
+            ["room"],
+            [
+                # Exactly slots 32 and 33
+                ("room", START + timedelta(hours=8), START + timedelta(hours=8.5)),
+                # Within slot 40 only
+                (
+                    "room",
+                    START + timedelta(hours=10, minutes=1),
+                    START + timedelta(hours=10, minutes=14),
+                ),
+                # Empty
+                ("room", START + timedelta(hours=12), START + timedelta(hours=12)),
+                # Another room
+                ("other", START, START + timedelta(hours=1)),
+            ],
+            START,
+            1,
+        )
+
+        self.assertEqual(slots.shape, (1, 1, SLOTS_PER_DAY // 8))
+        self.assertEqual(occupied_slots(slots[0, 0]), [32, 33, 40])
+
+    def test_across_midnight(self):
+        slots = occupancy_bitmaps(
+            ["room"],
+            [
+                (
+                    "room",
+                    START + timedelta(hours=23, minutes=30),
+                    START + timedelta(days=1, minutes=15),
+                ),
+                # Before the first day and after the last one, clipped
+                ("room", START - timedelta(hours=1), START + timedelta(minutes=15)),
+                (
+                    "room",
+                    START + timedelta(days=2, minutes=-15),
+                    START + timedelta(days=2, hours=1),
+                ),
+            ],
+            START,
+            2,
+        )
+
+        self.assertEqual(occupied_slots(slots[0, 0]), [0, 94, 95])
+        self.assertEqual(occupied_slots(slots[0, 1]), [0, 95])
+
+    def test_overlapping_bookings(self):
+        slots = occupancy_bitmaps(
+            ["room"],
+            [
+                ("room", START + timedelta(hours=8), START + timedelta(hours=10)),
+                ("room", START + timedelta(hours=9), START + timedelta(hours=9.5)),
+            ],
+            START,
+            1,
+        )
+
+        self.assertEqual(occupied_slots(slots[0, 0]), list(range(32, 40)))
+
+
+class SlotsMaskTest(unittest.TestCase):
+    def test_boundaries(self):
+        self.assertEqual(slots_mask(0, SLOT_MINUTES), 0b1)
+        self.assertEqual(slots_mask(SLOT_MINUTES, 2 * SLOT_MINUTES), 0b10)
+        # Partial slots count as overlapped
+        self.assertEqual(slots_mask(1, SLOT_MINUTES + 1), 0b11)
+        self.assertEqual(slots_mask(0, 24 * 60), (1 << SLOTS_PER_DAY) - 1)
+        self.assertEqual(slots_mask(60, 60), 0)
+
+
+@unittest.skipUnless(importlib.util.find_spec("mongomock"), "needs mongomock")
+class IsRoomFreeTest(unittest.TestCase):
+    def setUp(self):
+        import mongomock
+
+        self.db = mongomock.MongoClient().db
+        slots = occupancy_bitmaps(
+            ["room"],
+            [
+                (
+                    "room",
+                    START + timedelta(hours=23, minutes=30),
+                    START + timedelta(days=1, hours=1),
+                )
+            ],
+            START,
+            2,
+        )
+        for day in range(2):
+            self.db.room_occupancy.insert_one(
+                {
+                    "date": START + timedelta(days=day),
+                    "room_id": "room",
+                    "slots": Binary(slots[0, day].tobytes()),
+                }
+            )
+
+    def is_free(self, start, end):
+        return is_room_free(self.db, "room", START + start, START + end)
+
+    def test_free(self):
+        self.assertTrue(
+            self.is_free(timedelta(hours=8), timedelta(hours=23, minutes=30))
+        )
+        self.assertTrue(
+            self.is_free(timedelta(days=1, hours=1), timedelta(days=1, hours=2))
+        )
+
+    def test_booked_across_midnight(self):
+        self.assertFalse(
+            self.is_free(timedelta(hours=23), timedelta(hours=23, minutes=45))
+        )
+        self.assertFalse(self.is_free(timedelta(hours=22), timedelta(days=1, hours=2)))
+        self.assertFalse(self.is_free(timedelta(days=1), timedelta(days=1, minutes=1)))
+
+    def test_not_materialized(self):
+        self.assertIsNone(
+            self.is_free(timedelta(days=1, hours=8), timedelta(days=2, hours=8))
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
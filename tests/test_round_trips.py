@@ -0,0 +1,101 @@
+import contextlib
+import importlib.util
+import io
+import json
+import unittest
+
+import db_sync
+from benchmarks.reconciliation import (
+    BUDGETS_PATH,
+    generate,
+    mock_client,
+    round_trips_budget,
+    schedules,
+    setup_db,
+    setup_rooms,
+)
+from db_utils import RunContext
+from instrumentation import round_trip_budget
+from plan_rooms import create_rooms
+
+# Multiple of today's volume, small enough for mongomock
+SCALE = 0.02
+
+
+@unittest.skipUnless(importlib.util.find_spec("mongomock"), "needs mongomock")
+class RoundTripBudgetTest(unittest.TestCase):
+    """
+    The reconciliation stages within their round trips budgets (see
+    benchmarks/reconciliation_budgets.json), on a first run and on a rerun
+    of the same input
+    """
+
+    def setUp(self):
+        self.db = mock_client().get_database("round_trips")
+        self.budgets = json.loads(BUDGETS_PATH.read_text())
+        self.data = generate(SCALE)
+        with contextlib.redirect_stdout(io.StringIO()):
+            setup_db(self.db)
+            setup_rooms(self.db, self.data)
+            ctx = RunContext(self.db)
+            db_sync.sync_courses(self.db, self.data["courses"], ctx)
+
+    def assert_within_budget(self, name, stage, items):
+        for run in ("first", "rerun"):
+            with (
+                self.subTest(run=run),
+                contextlib.redirect_stdout(io.StringIO()),
+                contextlib.redirect_stderr(io.StringIO()),
+            ):
+                budget = round_trips_budget(self.budgets, name, items)
+                with round_trip_budget(name, budget) as measures:
+                    stage(RunContext(self.db))
+                self.assertIsNotNone(budget)
+                self.assertGreater(measures.round_trips, 0)
+
+    def test_update_schedules(self):
+        incoming = schedules(self.db, self.data)
+        self.assert_within_budget(
+            "update_schedules",
+            lambda ctx: db_sync.update_schedules(self.db, incoming, ctx),
+            len(incoming),
+        )
+
+    def test_create_courses_bookings(self):
+        incoming = schedules(self.db, self.data)
+        with contextlib.redirect_stdout(io.StringIO()):
+            db_sync.update_schedules(self.db, incoming, RunContext(self.db))
+        self.assert_within_budget(
+            "create_courses_bookings",
+            lambda ctx: db_sync.create_courses_bookings(self.db, incoming, ctx),
+            len(incoming),
+        )
+
+    def test_create_rooms(self):
+        incoming = schedules(self.db, self.data)
+        # Half of the rooms are new, the others get their plan.epfl.ch fields
+        self.db.rooms.delete_many({"name": {"$in": self.data["rooms"][::2]}})
+        plan_rooms = [
+            {
+                "name": name,
+                "type": "Salle de cours",
+                "link": f"https://plan.epfl.ch/?room={name}",
+                "coordinates": {"type": "Point", "coordinates": [6.56, 46.52]},
+                "capacity": 40,
+                "level": 1,
+            }
+            for name in self.data["rooms"]
+        ]
+
+        def stage(ctx):
+            ctx.memo["plan_rooms"] = plan_rooms
+            create_rooms(self.db, incoming, ctx=ctx)
+
+        self.assert_within_budget("create_rooms", stage, len(plan_rooms))
+        self.assertEqual(
+            self.db.rooms.count_documents({"capacity": 40}), len(self.data["rooms"])
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
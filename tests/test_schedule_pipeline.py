@@ -0,0 +1,78 @@
+import contextlib
+import io
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+import requests
+from bson import ObjectId
+
+import schedule_parser
+import schedule_pipeline
+
+WEEKLY_PAGE = (
+    Path(__file__).parent.parent
+    / "benchmarks"
+    / "corpus"
+    / "edu"
+    / "cs-101_weekly.html"
+).read_bytes()
+
+SEMESTER = {"start_date": datetime(2025, 9, 8), "end_date": datetime(2025, 12, 19)}
+
+
+def fetch_course_pages(url):
+    if url == "timeout":
+        raise requests.Timeout(f"{url} timed out")
+    return WEEKLY_PAGE, None
+
+
+class ScheduleCoursesTest(unittest.TestCase):
+    def test_failed_courses_are_skipped(self):
+        courses = [
+            {"_id": ObjectId(), "code": f"CS-{i}", "edu_url": url}
+            for i, url in enumerate(["first", "timeout", "last"])
+        ]
+        failed = []
+
+        with (
+            mock.patch.object(
+                schedule_pipeline, "fetch_course_pages", fetch_course_pages
+            ),
+            contextlib.redirect_stdout(io.StringIO()) as stdout,
+        ):
+            stores = list(
+                schedule_pipeline.schedule_courses(
+                    courses,
+                    {course["code"] for course in courses},
+                    SEMESTER,
+                    io_threads=2,
+                    failed=failed,
+                )
+            )
+
+        self.assertEqual(
+            [course_id for course_id, _ in stores],
+            [courses[0]["_id"], courses[2]["_id"]],
+        )
+        self.assertTrue(all(len(store) > 0 for _, store in stores))
+        self.assertEqual(failed, [courses[1]["_id"]])
+        self.assertIn("Course timeout generated an exception", stdout.getvalue())
+
+
+class HttpGetTest(unittest.TestCase):
+    def test_timeout(self):
+        session = mock.Mock()
+        with mock.patch.object(
+            schedule_parser._http_local, "session", session, create=True
+        ):
+            schedule_parser.http_get("https://edu.epfl.ch/")
+
+        session.get.assert_called_once_with(
+            "https://edu.epfl.ch/", timeout=schedule_parser.HTTP_TIMEOUT
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,19 +4,18 @@ from datetime import datetime
 import fire
 from dotenv import load_dotenv
 
-from db_utils import init_and_connect
-from settings import Settings
-from utils import (
-    add_teachers_to_courses,
-    create_courses,
+from db_sync import (
     create_new_semester,
     create_planned_in,
     create_studyplans,
-    create_teachers,
     create_units,
-    filter_duplicates_courses,
-    parse_all_courses,
+    sync_courses,
+    sync_teachers,
 )
+from db_utils import RunContext, init_and_connect
+from edu import filter_duplicates_courses, parse_all_courses
+from instrumentation import RunReport
+from settings import Settings
 
 load_dotenv()
 
@@ -26,29 +25,43 @@ logger = logging.getLogger(__name__)
 # Connect to MongoDB
 
 
-def main() -> None:
+def main(
+    report: str | None = None, profile: bool = False, force_init: bool = False
+) -> None:
+    """
+    Args:
+        report: path of the JSON run report (default in run_reports/)
+        profile: profile every stage and write its flamegraph in profiles/
+        force_init: apply the validators and indexes of all the collections,
+            even the ones unchanged since the last run
+    """
     settings = Settings()
-    db = init_and_connect(settings)
+    run_report = RunReport("update_courses", profile=profile)
+    with run_report.stage("connect"):
+        db = init_and_connect(settings, force_init=force_init)
+    ctx = RunContext(db)
 
     # Parse all courses from edu.epfl.ch
     logger.info("Parsing all courses...")
-    courses = parse_all_courses()
+    with run_report.stage("parse_all_courses") as stage:
+        courses = parse_all_courses()
+        stage.items_out = len(courses)
 
     # Filter duplicates
     logger.info("Filtering duplicates...")
-    unique_courses = filter_duplicates_courses(courses)
+    with run_report.stage("filter_duplicates", items_in=len(courses)) as stage:
+        unique_courses = filter_duplicates_courses(courses)
+        stage.items_out = len(unique_courses)
 
-    # Create courses in DB
-    logger.info("Creating courses...")
-    create_courses(db, unique_courses)
+    # Create or update courses in DB
+    logger.info("Syncing courses...")
+    with run_report.stage("sync_courses", items_in=len(unique_courses)):
+        sync_courses(db, unique_courses, ctx)
 
-    # Create teachers in DB
-    logger.info("Creating teachers...")
-    create_teachers(db, unique_courses)
-
-    # Assign teachers to courses
-    logger.info("Assigning teachers to courses...")
-    add_teachers_to_courses(db, unique_courses)
+    # Create teachers in DB and assign them to courses
+    logger.info("Syncing teachers...")
+    with run_report.stage("sync_teachers", items_in=len(unique_courses)):
+        sync_teachers(db, unique_courses, ctx)
 
     # Create semesters
 
@@ -104,48 +117,56 @@ def main() -> None:
     ]
 
     # Fall 2025-2026
+    # (created before any stage looks up the current semesters through ctx)
     logger.info("Creating semesters...")
-    create_new_semester(
-        db,
-        name="Semestre d'automne 2025-2026",
-        start_date=datetime(2025, 9, 8),
-        end_date=datetime(2025, 12, 21),
-        skip_dates=skip_dates,
-        type="fall",
-        available=True,
-    )
-    # Spring 2025-2026
-    create_new_semester(
-        db,
-        name="Semestre de printemps 2025-2026",
-        start_date=datetime(2026, 2, 16),
-        end_date=datetime(2026, 5, 31),
-        skip_dates=skip_dates,
-        type="spring",
-        available=True,
-    )
-    # Year 2025-2026
-    create_new_semester(
-        db,
-        name="2025-2026",
-        start_date=datetime(2025, 9, 8),
-        end_date=datetime(2026, 5, 31),
-        skip_dates=skip_dates,
-        type="year",
-        available=True,
-    )
+    with run_report.stage("create_semesters", items_in=3):
+        create_new_semester(
+            db,
+            name="Semestre d'automne 2025-2026",
+            start_date=datetime(2025, 9, 8),
+            end_date=datetime(2025, 12, 21),
+            skip_dates=skip_dates,
+            type="fall",
+            available=True,
+        )
+        # Spring 2025-2026
+        create_new_semester(
+            db,
+            name="Semestre de printemps 2025-2026",
+            start_date=datetime(2026, 2, 16),
+            end_date=datetime(2026, 5, 31),
+            skip_dates=skip_dates,
+            type="spring",
+            available=True,
+        )
+        # Year 2025-2026
+        create_new_semester(
+            db,
+            name="2025-2026",
+            start_date=datetime(2025, 9, 8),
+            end_date=datetime(2026, 5, 31),
+            skip_dates=skip_dates,
+            type="year",
+            available=True,
+        )
+
     # Create units
     logger.info("Creating units...")
-    create_units(db, unique_courses)
+    with run_report.stage("create_units", items_in=len(unique_courses)):
+        create_units(db, unique_courses, ctx)
 
     # Create study plans
     logger.info("Creating study plans...")
-    create_studyplans(db, unique_courses)
+    with run_report.stage("create_studyplans", items_in=len(unique_courses)):
+        create_studyplans(db, unique_courses, ctx)
 
     # Create planned in (courses in study plans)
     logger.info("Creating planned in...")
-    create_planned_in(db, unique_courses)
+    with run_report.stage("create_planned_in", items_in=len(unique_courses)):
+        create_planned_in(db, unique_courses, ctx)
 
+    run_report.print_summary()
+    logger.info(f"Run report: {run_report.write(report)}")
     logger.info("=== Done ===")
 
 
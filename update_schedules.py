@@ -3,41 +3,123 @@ import logging
 import fire
 from dotenv import load_dotenv
 
-from db_utils import init_and_connect
-from settings import Settings
-from utils import (
-    create_courses_bookings,
-    create_rooms,
-    find_courses_schedules,
-    update_schedules,
-)
+from config import STREAM_CHUNK_SIZE
 
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Ways of writing the schedules and bookings (see refresh_courses_schedules)
+MODES = ("auto", "diff", "rebuild")
+
+
+def main(
+    stream: bool = True,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    max_rss_mb: float | None = None,
+    mode: str = "auto",
+    report: str | None = None,
+    profile: bool = False,
+    force_init: bool = False,
+) -> None:
+    """
+    Args:
+        stream: reconcile the schedules in chunks of courses while scraping
+            instead of scraping the whole semester first
+        chunk_size: number of courses per chunk when streaming
+        max_rss_mb: memory ceiling (MB) flushing the current chunk early
+        mode: "diff" reconciles in place, "rebuild" swaps in rebuilt schedules
+            and bookings collections, "auto" picks the cheapest (a semester
+            expected to change a lot is scraped whole instead of streamed)
+        report: path of the JSON run report (default in run_reports/)
+        profile: profile every stage and write its flamegraph in profiles/
+        force_init: apply the validators and indexes of all the collections,
+            even the ones unchanged since the last run
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {', '.join(MODES)}, not {mode!r}")
+
+    # Imported here and not at the top: the parse workers import this module
+    # again when they are started by spawn or forkserver, and only need the
+    # parser and numpy
+    from db_sync import (
+        REBUILD_CHANGE_RATIO,
+        create_courses_bookings,
+        expected_change_ratio,
+        refresh_courses_schedules,
+        update_schedules,
+    )
+    from db_utils import RunContext, init_and_connect
+    from instrumentation import RunReport, peak_rss_mb
+    from plan_rooms import create_rooms, update_rooms_geometry
+    from room_occupancy import build_room_occupancy
+    from schedule_pipeline import find_courses_schedules, sync_courses_schedules
+    from settings import Settings
 
-def main() -> None:
     settings = Settings()
+    run_report = RunReport("update_schedules", profile=profile)
+
+    with run_report.stage("connect"):
+        db = init_and_connect(settings, force_init=force_init)
+    ctx = RunContext(db)
+
+    if stream and mode == "auto":
+        with run_report.stage("expected_change_ratio"):
+            ratio = expected_change_ratio(db, ctx)
+        logger.info(f"Expected change ratio: {ratio:.0%}")
+        stream = ratio < REBUILD_CHANGE_RATIO
+
+    if stream and mode != "rebuild":
+        logger.info("Syncing schedules, rooms and bookings...")
+        with run_report.stage("sync_courses_schedules"):
+            sync_courses_schedules(
+                db, ctx, chunk_size=chunk_size, max_rss_mb=max_rss_mb
+            )
+    else:
+        # Get schedules from edu.epfl.ch for the current or next semester
+        logger.info("Getting schedules...")
+        with run_report.stage("find_courses_schedules") as stage:
+            schedules = find_courses_schedules(db, ctx)
+            stage.items_out = len(schedules)
+
+        # Create rooms in DB
+        logger.info("Creating rooms...")
+        with run_report.stage("create_rooms", items_in=len(schedules)):
+            create_rooms(db, schedules, ctx=ctx)
 
-    db = init_and_connect(settings)
-    # Get schedules from edu.epfl.ch for the current or next semester
-    logger.info("Getting schedules...")
-    schedules = find_courses_schedules(db)
+        if mode == "diff":
+            # Update schedules in DB
+            logger.info("Updating schedules...")
+            with run_report.stage("update_schedules", items_in=len(schedules)):
+                update_schedules(db, schedules, ctx)
 
-    # Create rooms in DB
-    logger.info("Creating rooms...")
-    create_rooms(db, schedules)
+            # Create bookings
+            logger.info("Creating bookings...")
+            with run_report.stage("create_courses_bookings", items_in=len(schedules)):
+                create_courses_bookings(db, schedules=schedules, ctx=ctx)
+        else:
+            # Rebuild or update schedules and bookings, by cost estimate
+            logger.info("Refreshing schedules and bookings...")
+            with run_report.stage("refresh_courses_schedules", items_in=len(schedules)):
+                refresh_courses_schedules(db, schedules, ctx, mode=mode)
 
-    # Update schedules in DB
-    logger.info("Updating schedules...")
-    update_schedules(db, schedules)
+    # Footprints of the rooms and buildings bundles of the map
+    logger.info("Updating rooms geometry...")
+    with run_report.stage("update_rooms_geometry"):
+        update_rooms_geometry(db, ctx)
 
-    # Create bookings
-    logger.info("Creating bookings...")
-    create_courses_bookings(db, schedules=schedules)
+    # Materialize the rooms occupancy of the new schedules and bookings
+    logger.info("Building rooms occupancy...")
+    with run_report.stage("build_room_occupancy"):
+        build_room_occupancy(db)
 
+    run_report.print_summary()
+    logger.info(f"Run report: {run_report.write(report)}")
+    logger.info(
+        f"Peak RSS: {peak_rss_mb():.0f} MB "
+        f"(largest worker {peak_rss_mb(children=True):.0f} MB)"
+    )
     logger.info("===== Done =====")
 
 